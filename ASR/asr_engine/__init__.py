@@ -0,0 +1,8 @@
+"""
+Shared ASR engine components used by the servers and scripts under ASR/.
+Servers outside ASR/ (host-parakeet-finetuned) install it as a package
+from ASR/pyproject.toml.
+
+Submodules are imported explicitly by callers so that optional heavy
+dependencies are only pulled in where they are needed.
+"""
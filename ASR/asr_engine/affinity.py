@@ -0,0 +1,171 @@
+"""
+CPU affinity and thread budget for the inference worker.
+
+Without a budget, PyTorch intra-op and inter-op pools, numba/OpenMP in the
+audio libraries and the Flask request threads all size themselves to every
+core and then contend for them. Adding concurrent requests then lowers
+throughput. plan_cpus() splits the CPUs this process may use:
+
+  shared      a few cores for Flask threads, the preprocess and decoder pools
+  inference   the rest, for the torch intra-op pool of the one inference
+              worker, from a single NUMA node when they fit in one
+
+There is a single inference worker. Every request runs on one NeMoASRModel
+whose lock admits one transcription at a time (asr_engine.model), so a
+second worker would only wait on it; the model gets its parallelism from
+intra-op threads instead. ASR_INFERENCE_THREADS sets them (default: every
+core not reserved); benchmark_thread_scaling.py finds the best value.
+
+configure() is called once at startup, before the preprocess pool forks. It
+sets the thread environment and the torch pool sizes to that budget, and
+pins the main thread, and with it everything it starts later, to the shared
+cores. The inference worker pins itself to its set through pin_worker(),
+which the scheduler calls as its thread starts.
+"""
+import os
+import glob
+import logging
+
+logger = logging.getLogger(__name__)
+
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMBA_NUM_THREADS')
+
+
+def parse_cpulist(text):
+    """'0-3,8,10-11' -> [0, 1, 2, 3, 8, 10, 11]"""
+    cpus = []
+    for part in (text or '').strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            lo, hi = part.split('-', 1)
+            cpus.extend(range(int(lo), int(hi) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def available_cpus():
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def numa_nodes(cpus=None):
+    """CPUs per NUMA node (restricted to cpus); a single node when sysfs has no topology"""
+    cpus = set(cpus if cpus is not None else available_cpus())
+    nodes = []
+    for path in sorted(glob.glob('/sys/devices/system/node/node[0-9]*/cpulist'),
+                       key=lambda p: int(os.path.basename(os.path.dirname(p))[4:])):
+        try:
+            with open(path, 'r') as fh:
+                node_cpus = [c for c in parse_cpulist(fh.read()) if c in cpus]
+        except OSError:
+            continue
+        if node_cpus:
+            nodes.append(node_cpus)
+    covered = {c for n in nodes for c in n}
+    rest = sorted(cpus - covered)
+    if rest:
+        nodes.append(rest)
+    return nodes
+
+
+def plan_cpus(threads=None, reserved=1, cpus=None):
+    """
+    {'shared': [...], 'inference': {'cpus': [...], 'numa_node': n}, 'threads': t}, or None when
+    the host has too few CPUs for the requested threads (then nothing is pinned).
+    """
+    cpus = sorted(cpus if cpus is not None else available_cpus())
+    reserved = max(0, min(reserved, len(cpus) - 1))
+    budget = len(cpus) - reserved
+    threads = threads or budget
+    if threads < 1 or threads > budget:
+        return None
+
+    # Shared cores come from the end of the last node; the inference set from the first node it fits in
+    nodes = [list(n) for n in numa_nodes(cpus)]
+    shared = []
+    while len(shared) < reserved:
+        node = next(n for n in reversed(nodes) if n)
+        shared.append(node.pop())
+    node_idx = next((i for i, n in enumerate(nodes) if len(n) >= threads), None)
+    if node_idx is None:
+        # Does not fit in any single node: take what is left in node order
+        node_idx = next(i for i, n in enumerate(nodes) if n)
+        taken = []
+        for n in nodes:
+            while n and len(taken) < threads:
+                taken.append(n.pop(0))
+    else:
+        taken = [nodes[node_idx].pop(0) for _ in range(threads)]
+    leftover = [c for n in nodes for c in n]
+    return {'shared': sorted(shared + leftover), 'inference': {'cpus': sorted(taken), 'numa_node': node_idx},
+            'threads': threads}
+
+
+def set_thread_budget(intra_op, inter_op=1):
+    """Size the torch pools and the OpenMP/BLAS/numba environment (before they spin up)"""
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(intra_op)
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(intra_op)
+    try:
+        torch.set_num_interop_threads(inter_op)
+    except RuntimeError as e:
+        # Only allowed before the first inter-op parallel work
+        logger.warning(f"Could not set inter-op threads: {e}")
+
+
+def pin_current_thread(cpus):
+    """Restrict the calling thread (Linux: pid 0 is the calling thread) to cpus"""
+    try:
+        os.sched_setaffinity(0, set(cpus))
+        return True
+    except (AttributeError, OSError) as e:
+        logger.warning(f"Could not pin thread to CPUs {cpus}: {e}")
+        return False
+
+
+class WorkerAffinity:
+    def __init__(self, plan, inter_op=1):
+        self.plan = plan
+        self.inter_op = inter_op
+
+    def configure(self):
+        """Apply the budget and pin the calling (main) thread to the shared cores"""
+        if self.plan is None:
+            logger.info("CPU affinity: not pinning (too few CPUs for the requested threads)")
+            return self
+        set_thread_budget(self.plan['threads'], self.inter_op)
+        if self.plan['shared']:
+            pin_current_thread(self.plan['shared'])
+        logger.info(f"CPU affinity: inference worker with {self.plan['threads']} threads on "
+                    f"{self.plan['inference']['cpus']}, shared cores {self.plan['shared']}")
+        return self
+
+    def pin_worker(self, index=0):
+        """Called on the inference worker thread as it starts"""
+        if self.plan is None:
+            return
+        cpus = self.plan['inference']['cpus']
+        if pin_current_thread(cpus):
+            logger.info(f"Inference worker pinned to CPUs {cpus}")
+
+    def stats(self):
+        return {'pinned': self.plan is not None, 'inter_op_threads': self.inter_op, 'plan': self.plan,
+                'numa_nodes': len(numa_nodes())}
+
+
+def build_worker_affinity():
+    """From ASR_AFFINITY (auto|off), ASR_INFERENCE_THREADS, ASR_RESERVED_CPUS, ASR_INTEROP_THREADS"""
+    mode = os.environ.get('ASR_AFFINITY', 'auto').lower()
+    plan = None
+    if mode != 'off':
+        plan = plan_cpus(threads=int(os.environ.get('ASR_INFERENCE_THREADS', '0')) or None,
+                         reserved=int(os.environ.get('ASR_RESERVED_CPUS', '1')))
+    return WorkerAffinity(plan, inter_op=int(os.environ.get('ASR_INTEROP_THREADS', '1')))
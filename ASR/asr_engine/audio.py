@@ -0,0 +1,59 @@
+"""
+Model-input audio: any supported upload to a 16 kHz mono PCM_16 WAV.
+
+Compressed containers (webm/opus, m4a, mp3, ogg) go through the decoder
+pool; everything libsndfile reads is streamed block by block. Both paths peak
+normalize to the same level, so every server, the preprocess pool and the
+benchmark scripts feed the model identical input.
+"""
+import os
+import tempfile
+
+import numpy as np
+import soundfile as sf
+
+from asr_engine.audio_decoder import decoder_pool, needs_decoder
+from asr_engine.block_reader import convert_to_wav
+from asr_engine.tracing import current_trace
+
+TARGET_SR = 16000
+NORMALIZE_TO = 0.95
+
+
+def normalize_and_write(data, output_path, sr=TARGET_SR, normalize_to=NORMALIZE_TO):
+    max_val = float(np.max(np.abs(data))) if len(data) else 0.0
+    if normalize_to and max_val > 0:
+        data = data / max_val * normalize_to
+    sf.write(output_path, data, sr, subtype='PCM_16')
+
+
+def convert_audio_to_wav(input_path, output_path, target_sr=TARGET_SR):
+    """Decode, downmix, resample and level-normalize input_path into output_path; returns the duration"""
+    trace = current_trace()
+    if needs_decoder(input_path):
+        with trace.stage('audio_decode'):
+            data = decoder_pool.decode(input_path)
+        with trace.stage('save'):
+            normalize_and_write(data, output_path, target_sr)
+        return len(data) / target_sr
+    return convert_to_wav(input_path, output_path, target_sr, normalize_to=NORMALIZE_TO)
+
+
+def convert_to_temp_wav(input_path, target_sr=TARGET_SR):
+    """convert_audio_to_wav into a new temporary file; the caller removes it"""
+    fd, path = tempfile.mkstemp(suffix='.wav')
+    os.close(fd)
+    try:
+        convert_audio_to_wav(input_path, path, target_sr)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def probe_duration(audio_path):
+    """Read the duration from the file header; None when it cannot be determined"""
+    try:
+        return float(sf.info(audio_path).duration)
+    except Exception:
+        return None
@@ -0,0 +1,160 @@
+"""
+Decode layer for compressed uploads (webm/opus from the browser, m4a, mp3, ogg).
+
+libsndfile cannot read webm or m4a, so these go through a DecoderPool that
+turns them straight into 16 kHz mono float32 PCM in memory:
+
+  pyav    in-process libav decode + resample on a fixed set of worker threads
+          (libav releases the GIL while decoding), no process per request.
+          PyAV ('av') is required for compressed uploads.
+  ffmpeg  only when chosen explicitly with ASR_DECODER_BACKEND=ffmpeg:
+          `ffmpeg ... -f f32le pipe:1`, one process per file, with concurrency
+          bounded by the pool size
+
+Every decode is accounted per container format (count, bytes, audio seconds,
+decode seconds, failures) so throughput can be read from /health.
+"""
+import os
+import time
+import shutil
+import logging
+import threading
+import subprocess
+import collections
+import concurrent.futures
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TARGET_SR = 16000
+COMPRESSED_EXTENSIONS = {'webm', 'weba', 'ogg', 'opus', 'oga', 'm4a', 'mp4', 'aac', 'mp3'}
+
+
+class DecodeError(Exception):
+    pass
+
+
+def needs_decoder(path):
+    return path.rsplit('.', 1)[-1].lower() in COMPRESSED_EXTENSIONS
+
+
+def _decode_pyav(path, target_sr):
+    import av
+    chunks = []
+    with av.open(path, mode='r') as container:
+        stream = next((s for s in container.streams if s.type == 'audio'), None)
+        if stream is None:
+            raise DecodeError(f"No audio stream in {os.path.basename(path)}")
+        stream.thread_type = 'AUTO'
+        resampler = av.AudioResampler(format='flt', layout='mono', rate=target_sr)
+        for frame in container.decode(stream):
+            for out in resampler.resample(frame):
+                chunks.append(out.to_ndarray().reshape(-1))
+        for out in resampler.resample(None):
+            chunks.append(out.to_ndarray().reshape(-1))
+    return np.concatenate(chunks).astype(np.float32, copy=False) if chunks else np.zeros(0, dtype=np.float32)
+
+
+def _decode_ffmpeg(path, target_sr, ffmpeg='ffmpeg', timeout=120):
+    cmd = [ffmpeg, '-nostdin', '-hide_banner', '-loglevel', 'error', '-i', path,
+           '-vn', '-ac', '1', '-ar', str(target_sr), '-f', 'f32le', 'pipe:1']
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+    if proc.returncode != 0:
+        raise DecodeError(proc.stderr.decode('utf-8', 'replace').strip() or f"ffmpeg exited with {proc.returncode}")
+    return np.frombuffer(proc.stdout, dtype='<f4').copy()
+
+
+class DecoderPool:
+    def __init__(self, workers=2, backend=None, target_sr=TARGET_SR):
+        self.workers = workers
+        self.target_sr = target_sr
+        # None when PyAV is missing and no backend was chosen; compressed decodes then fail
+        self.backend = backend or self._detect_backend()
+        self.ffmpeg = shutil.which('ffmpeg')
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats = collections.defaultdict(lambda: {
+            'count': 0, 'failures': 0, 'bytes': 0, 'audio_seconds': 0.0, 'decode_seconds': 0.0})
+
+    @staticmethod
+    def _detect_backend():
+        try:
+            import av  # noqa: F401
+            return 'pyav'
+        except ImportError:
+            return None
+
+    def require(self):
+        """Raise unless a decode backend is available (servers call this at startup)"""
+        if self.backend is None:
+            raise RuntimeError("PyAV is required to decode compressed uploads (pip install av); "
+                               "ASR_DECODER_BACKEND=ffmpeg spawns one ffmpeg process per file instead")
+        if self.backend == 'ffmpeg' and not self.ffmpeg:
+            raise RuntimeError("ASR_DECODER_BACKEND=ffmpeg but no ffmpeg binary is on PATH")
+        return self
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix='asr-decode')
+            return self._executor
+
+    def _decode(self, path):
+        if self.backend == 'pyav':
+            return _decode_pyav(path, self.target_sr)
+        if self.backend == 'ffmpeg' and self.ffmpeg:
+            return _decode_ffmpeg(path, self.target_sr, self.ffmpeg)
+        raise DecodeError("PyAV is not installed; install 'av' or set ASR_DECODER_BACKEND=ffmpeg")
+
+    def _timed_decode(self, path):
+        fmt = path.rsplit('.', 1)[-1].lower()
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        t0 = time.perf_counter()
+        try:
+            data = self._decode(path)
+        except Exception:
+            self.record(fmt, failed=True)
+            raise
+        self.record(fmt, size, len(data) / self.target_sr, time.perf_counter() - t0)
+        return data
+
+    def record(self, fmt, size=0, audio_seconds=0.0, decode_seconds=0.0, failed=False):
+        """Account one decode (also used for decodes done in preprocessing worker processes)"""
+        with self._lock:
+            s = self._stats[fmt]
+            if failed:
+                s['failures'] += 1
+                return
+            s['count'] += 1
+            s['bytes'] += size
+            s['audio_seconds'] += audio_seconds
+            s['decode_seconds'] += decode_seconds
+
+    def decode(self, path):
+        """Decode path to mono float32 PCM at target_sr (blocks; runs on a pool thread)"""
+        return self._get_executor().submit(self._timed_decode, path).result()
+
+    def stats(self):
+        with self._lock:
+            formats = {}
+            for fmt, s in self._stats.items():
+                formats[fmt] = dict(s)
+                formats[fmt]['audio_seconds'] = float(round(s['audio_seconds'], 3))
+                formats[fmt]['decode_seconds'] = float(round(s['decode_seconds'], 3))
+                formats[fmt]['realtime_factor'] = (
+                    float(round(s['audio_seconds'] / s['decode_seconds'], 1)) if s['decode_seconds'] else None)
+                formats[fmt]['mb_per_s'] = (
+                    float(round(s['bytes'] / (1024 * 1024) / s['decode_seconds'], 2)) if s['decode_seconds'] else None)
+        return {'backend': self.backend, 'workers': self.workers, 'formats': formats}
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+decoder_pool = DecoderPool(workers=int(os.environ.get('ASR_DECODER_WORKERS', '2')),
+                           backend=os.environ.get('ASR_DECODER_BACKEND') or None)
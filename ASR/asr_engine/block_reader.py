@@ -0,0 +1,100 @@
+"""
+Constant-memory reading of long recordings.
+
+iter_blocks() reads a file with soundfile in fixed-size blocks, downmixes
+and resamples each block to 16 kHz with a streaming resampler, so only one
+block is ever held in memory. iter_chunks() turns that block stream into the
+overlapping fixed-length windows the long-audio transcriber and the cutter
+need, holding at most one window plus one block. Peak memory therefore does
+not depend on the recording length.
+"""
+import time
+import logging
+
+import numpy as np
+import soundfile as sf
+
+from asr_engine.stream_ingest import StreamResampler
+from asr_engine.tracing import current_trace
+
+logger = logging.getLogger(__name__)
+
+TARGET_SR = 16000
+BLOCK_SECONDS = 10.0
+
+
+def iter_blocks(path, target_sr=TARGET_SR, block_seconds=BLOCK_SECONDS):
+    """Yield mono float32 blocks at target_sr"""
+    trace = current_trace()
+    with sf.SoundFile(path) as snd:
+        resampler = StreamResampler(snd.samplerate, target_sr)
+        blocksize = max(1, int(block_seconds * snd.samplerate))
+        reader = snd.blocks(blocksize=blocksize, dtype='float32', always_2d=True)
+        while True:
+            t0 = time.perf_counter()
+            block = next(reader, None)
+            if block is not None:
+                block = block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]
+            t1 = time.perf_counter()
+            trace.add('audio_decode', t1 - t0)
+            last = block is None
+            y = resampler.process(np.zeros(0, dtype=np.float32) if last else block, last=last)
+            trace.add('resample', time.perf_counter() - t1)
+            if len(y):
+                yield np.asarray(y, dtype=np.float32)
+            if last:
+                break
+
+
+def iter_chunks(path, chunk_seconds, overlap_seconds=0.0, target_sr=TARGET_SR, block_seconds=BLOCK_SECONDS):
+    """Yield (start_sample, window) like slicing the fully loaded signal with stride chunk - overlap"""
+    chunk = int(chunk_seconds * target_sr)
+    stride = max(1, chunk - int(overlap_seconds * target_sr))
+    buf = np.zeros(0, dtype=np.float32)
+    buf_start = 0  # absolute index of buf[0]
+    next_start = 0
+    last_end = 0
+    for block in iter_blocks(path, target_sr, block_seconds):
+        buf = np.concatenate([buf, block])
+        while next_start + chunk <= buf_start + len(buf):
+            offset = next_start - buf_start
+            yield next_start, buf[offset:offset + chunk]
+            last_end = next_start + chunk
+            next_start += stride
+            buf = buf[next_start - buf_start:]
+            buf_start = next_start
+    total = buf_start + len(buf)
+    if next_start < total and last_end < total:
+        yield next_start, buf[next_start - buf_start:]
+
+
+def peak_amplitude(path, block_seconds=BLOCK_SECONDS):
+    """Max |sample| of the source, read block by block"""
+    peak = 0.0
+    with sf.SoundFile(path) as snd:
+        blocksize = max(1, int(block_seconds * snd.samplerate))
+        for block in snd.blocks(blocksize=blocksize, dtype='float32'):
+            if len(block):
+                peak = max(peak, float(np.max(np.abs(block))))
+    return peak
+
+
+def convert_to_wav(input_path, output_path, target_sr=TARGET_SR, normalize_to=0.95, block_seconds=BLOCK_SECONDS):
+    """
+    Stream input_path into a mono PCM_16 WAV at target_sr; returns the duration.
+    The gain comes from the source peak (a cheap decode-only first pass), so the
+    resampled signal is clipped to [-1, 1] in case the filter overshoots slightly.
+    """
+    gain = 1.0
+    if normalize_to:
+        with current_trace().stage('probe'):
+            peak = peak_amplitude(input_path, block_seconds)
+        if peak > 0:
+            gain = normalize_to / peak
+    samples = 0
+    with sf.SoundFile(output_path, mode='w', samplerate=target_sr, channels=1, subtype='PCM_16') as out:
+        for block in iter_blocks(input_path, target_sr, block_seconds):
+            with current_trace().stage('save'):
+                out.write(np.clip(block * gain, -1.0, 1.0))
+            samples += len(block)
+    return samples / target_sr
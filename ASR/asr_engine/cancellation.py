@@ -0,0 +1,236 @@
+"""
+Cancellation of abandoned requests.
+
+Each transcription request gets a CancelToken. The scheduler binds the token
+on the inference worker, the same way it activates the request trace, so
+long-running code checks it cooperatively with
+
+    current_token().check()     # raises RequestCancelled once cancelled
+
+between chunks of a long file and between batches. When current_token()
+has no token bound it returns one that never cancels, so scripts pay
+nothing.
+
+DisconnectWatcher cancels a token when its client goes away: a browser tab
+closed or an upstream timeout. One thread polls the sockets of the requests
+waiting for inference; it only watches once the request body has been read.
+When a socket reports an error, a hangup or end of stream (POLLERR,
+POLLHUP, POLLRDHUP: reset, or the client's FIN), its token is cancelled, and
+the scheduler then drops the job if it is still queued or the worker stops
+it at the next check. An HTTP/1.1 client waiting for its response does not
+shut down its sending side, so end of stream means it left. A proxy that
+half-closes after forwarding the upload would look the same; behind one,
+set ASR_CANCEL_ON_EOF=0 and only resets and full hangups count. Platforms
+without poll() fall back to select() and a MSG_PEEK read. The socket comes
+from the server's WSGI environ ('werkzeug.socket' on the development server,
+'gunicorn.socket' under gunicorn). Requests without one are never cancelled.
+"""
+import os
+import select
+import socket
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.5
+SOCKET_KEYS = ('werkzeug.socket', 'gunicorn.socket')
+
+# Always a disconnect; POLLRDHUP (the peer's FIN) unless end-of-stream detection is turned off
+HANGUP = getattr(select, 'POLLERR', 0) | getattr(select, 'POLLHUP', 0) | getattr(select, 'POLLNVAL', 0)
+RDHUP = getattr(select, 'POLLRDHUP', 0)
+
+_current = contextvars.ContextVar('asr_cancel_token', default=None)
+
+
+class RequestCancelled(Exception):
+    pass
+
+
+class CancelToken:
+    def __init__(self):
+        self.reason = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self, reason='cancelled'):
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception as e:
+                logger.warning(f"Cancel callback failed: {e}")
+        return True
+
+    def on_cancel(self, fn):
+        """Run fn() when the token is cancelled (immediately if it already is)"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(fn)
+                return
+        fn()
+
+    def check(self):
+        if self._event.is_set():
+            raise RequestCancelled(self.reason)
+
+
+class _NullToken:
+    cancelled = False
+    reason = None
+
+    def on_cancel(self, fn):
+        pass
+
+    def check(self):
+        pass
+
+
+NULL_TOKEN = _NullToken()
+
+
+def current_token():
+    token = _current.get()
+    return token if token is not None else NULL_TOKEN
+
+
+@contextmanager
+def bind_token(token):
+    """Bind token on the current thread (e.g. an inference worker) for the duration of a job"""
+    handle = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(handle)
+
+
+def client_socket(environ):
+    for key in SOCKET_KEYS:
+        sock = environ.get(key)
+        if sock is not None and hasattr(sock, 'fileno'):
+            return sock
+    return None
+
+
+def _peer_closed(sock, eof=True):
+    """True on a socket error, or at end of stream when eof is set"""
+    try:
+        return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b'' and eof
+    except (BlockingIOError, InterruptedError):
+        return False
+    except OSError:
+        return True
+
+
+class DisconnectWatcher:
+    def __init__(self, interval=POLL_INTERVAL, enabled=True, eof=True):
+        self.interval = interval
+        self.enabled = enabled
+        self.eof = eof
+        self.disconnects = 0
+        self._lock = threading.Lock()
+        self._watched = {}  # id(token) -> (sock, token)
+        self._wake = threading.Event()
+        self._thread = None
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='asr-disconnect-watcher', daemon=True)
+            self._thread.start()
+
+    @contextmanager
+    def watch(self, environ, token):
+        """Cancel token if the client of this WSGI request disconnects while the block runs"""
+        sock = client_socket(environ) if self.enabled else None
+        if sock is None:
+            yield token
+            return
+        with self._lock:
+            self._watched[id(token)] = (sock, token)
+            self._ensure_thread()
+        self._wake.set()
+        try:
+            yield token
+        finally:
+            with self._lock:
+                self._watched.pop(id(token), None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                watched = list(self._watched.values())
+            if not watched:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            closed = self._poll(watched) if hasattr(select, 'poll') else self._select(watched)
+            if closed is None:
+                continue
+            for sock, token in watched:
+                if sock in closed and token.cancel('client disconnected'):
+                    with self._lock:
+                        self.disconnects += 1
+                    logger.info("Client disconnected; cancelling its transcription")
+            # A socket stays hung up (or readable with pipelined bytes) until its request ends,
+            # which would spin poll()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _poll(self, watched):
+        """Sockets that disconnected; None if nothing was reported"""
+        mask = HANGUP
+        if self.eof:
+            mask |= RDHUP or select.POLLIN
+        poller = select.poll()
+        for sock, _ in watched:
+            try:
+                poller.register(sock, mask)
+            except (OSError, ValueError):
+                pass
+        try:
+            events = dict(poller.poll(self.interval * 1000))
+        except OSError:
+            return None
+        if not events:
+            return None
+        closed = []
+        for sock, _ in watched:
+            try:
+                ev = events.get(sock.fileno(), 0)
+            except (OSError, ValueError):
+                ev = select.POLLNVAL
+            if ev & (HANGUP | RDHUP) or (ev & select.POLLIN and _peer_closed(sock, self.eof)):
+                closed.append(sock)
+        return closed
+
+    def _select(self, watched):
+        try:
+            readable, _, _ = select.select([s for s, _ in watched], [], [], self.interval)
+        except (OSError, ValueError):
+            readable = [s for s, _ in watched]
+        if not readable:
+            return None
+        return [s for s in readable if _peer_closed(s, self.eof)]
+
+    def stats(self):
+        with self._lock:
+            return {'enabled': self.enabled, 'eof': self.eof, 'watching': len(self._watched),
+                    'disconnects': self.disconnects}
+
+
+def build_disconnect_watcher():
+    return DisconnectWatcher(interval=float(os.environ.get('ASR_DISCONNECT_POLL', str(POLL_INTERVAL))),
+                             enabled=os.environ.get('ASR_CANCEL_ON_DISCONNECT', '1').lower() not in ('0', 'false', 'no'),
+                             eof=os.environ.get('ASR_CANCEL_ON_EOF', '1').lower() not in ('0', 'false', 'no'))
@@ -0,0 +1,113 @@
+"""
+Deadline-aware decoding: fall back to greedy when beam search would be late.
+
+Callers with a hard budget, such as interactive dictation, send
+X-Deadline-Ms: the milliseconds they will wait, counted from when the
+request arrived. Queue wait uses up part of that budget. Before decoding,
+NeMoASRModel compares the remaining budget with the predicted beam time:
+
+  predicted to miss   decode greedy straight away ('predicted')
+  otherwise           encode once, run beam search on a helper thread and
+                      wait until only the greedy time is left; if beam is
+                      still running, cancel it and decode greedy from the
+                      same encoder output ('timeout')
+
+Beam search has no cancellation hook, so CancelGate wraps the joint network's
+joint() (called for every search step). A decode thread that has been
+cancelled raises DecodeCancelled at its next step; the worker waits for it
+to exit before taking the next job, so no search outlives its request.
+Requests with a deadline are never coalesced with others, since the result
+depends on how much of the budget each one has left. Predictions use a moving average of the RTF of recent beam and greedy
+decodes. Recordings longer than the model's chunking threshold only use the
+prediction.
+"""
+import os
+import time
+import threading
+
+DEADLINE_HEADER = 'X-Deadline-Ms'
+# Initial RTF guesses until real decodes have been measured
+DEFAULT_RTF = {'beam': 0.3, 'greedy': 0.1}
+RTF_ALPHA = 0.2
+
+
+class DecodeCancelled(Exception):
+    pass
+
+
+def parse_deadline(headers, started):
+    """Absolute perf_counter deadline from X-Deadline-Ms (relative to `started`), or None"""
+    value = headers.get(DEADLINE_HEADER)
+    if not value:
+        return None
+    try:
+        ms = float(value)
+    except ValueError:
+        return None
+    return started + ms / 1000.0 if ms > 0 else None
+
+
+def remaining(deadline):
+    return deadline - time.perf_counter() if deadline is not None else None
+
+
+def decoding_kind(cfg):
+    return 'greedy' if (cfg or {}).get('strategy', '').startswith('greedy') else 'beam'
+
+
+class RTFEstimator:
+    def __init__(self, defaults=None, alpha=RTF_ALPHA, margin=1.2):
+        self.rtf = dict(defaults or DEFAULT_RTF)
+        self.alpha = alpha
+        # Predictions are scaled up by this much before they are compared with the budget
+        self.margin = margin
+        self._lock = threading.Lock()
+
+    def record(self, kind, seconds, audio_seconds):
+        if not audio_seconds or seconds is None:
+            return
+        with self._lock:
+            self.rtf[kind] = (1 - self.alpha) * self.rtf.get(kind, seconds / audio_seconds) + \
+                self.alpha * seconds / audio_seconds
+
+    def predict(self, kind, audio_seconds):
+        with self._lock:
+            return self.margin * self.rtf.get(kind, DEFAULT_RTF['beam']) * (audio_seconds or 0.0)
+
+    def stats(self):
+        with self._lock:
+            return {'rtf': {k: float(round(v, 4)) for k, v in self.rtf.items()}, 'margin': self.margin}
+
+
+class CancelGate:
+    """Makes decode threads marked as cancelled raise DecodeCancelled at their next joint step"""
+
+    def __init__(self):
+        self._cancelled = set()
+        self._lock = threading.Lock()
+
+    def install(self, joint):
+        if joint is None or getattr(joint, '_cancel_gate', None) is self:
+            return
+        original = joint.joint
+
+        def gated(*args, **kwargs):
+            if self._cancelled and threading.get_ident() in self._cancelled:
+                raise DecodeCancelled()
+            return original(*args, **kwargs)
+        joint.joint = gated
+        joint._cancel_gate = self
+
+    def cancel(self, ident):
+        with self._lock:
+            self._cancelled.add(ident)
+
+    def clear(self, ident):
+        with self._lock:
+            self._cancelled.discard(ident)
+
+
+def build_rtf_estimator():
+    return RTFEstimator(defaults={'beam': float(os.environ.get('ASR_DEADLINE_BEAM_RTF', DEFAULT_RTF['beam'])),
+                                  'greedy': float(os.environ.get('ASR_DEADLINE_GREEDY_RTF', DEFAULT_RTF['greedy']))},
+                        margin=float(os.environ.get('ASR_DEADLINE_MARGIN', '1.2')))
@@ -0,0 +1,147 @@
+"""
+RNNT decoding configs shared by the servers and scripts.
+
+decoding_cfg() returns a plain dict (the caller wraps it in a DictConfig) and
+the KenLM path that should be attached from the resident LM manager, if any.
+'knelm_beam' and 'flashlight_beam' load their LM inside NeMo, so their path is
+part of the config instead.
+"""
+
+SUPPORTED_STRATEGIES = ['greedy', 'beam', 'auto', 'knelm_beam', 'flashlight_beam', 'maes']
+BEAM_STRATEGIES = ('beam', 'knelm_beam', 'flashlight_beam')
+LM_SEARCH_STRATEGIES = ('knelm_beam', 'flashlight_beam')
+
+
+def greedy_cfg():
+    return {
+        'strategy': 'greedy',
+        'greedy': {
+            'max_symbols_per_step': 10,
+            'preserve_alignments': False,
+            'preserve_frame_confidence': False,
+            'loop_labels': True,
+            'use_cuda_graph_decoder': True
+        },
+        'compute_hypothesis_token_set': False,
+        'preserve_alignments': False
+    }
+
+
+def beam_cfg(beam_size=4, alpha=None, beta=None):
+    """
+    Beam search. Without an LM this is NeMo's 'default' search. With alpha set, a resident LM
+    will be attached, so the search is 'maes': it is the only RNNT beam search that scores
+    hypotheses with the decoder's ngram_lm (weighted by ngram_lm_alpha). maes has no word
+    insertion term, so beta is not used. The LM must be built over token ids with NeMo's
+    token offset, like the ones from NeMo's train_kenlm.py.
+    """
+    beam = {
+        'beam_size': beam_size,
+        'search_type': 'default',
+        'score_norm': True,
+        'return_best_hypothesis': True,
+        'softmax_temperature': 1.0,
+        'preserve_alignments': False,
+        'max_symbols_per_step': 10
+    }
+    if alpha is not None:
+        beam.update({'search_type': 'maes', 'ngram_lm_alpha': alpha})
+    return {
+        'strategy': 'beam',
+        'beam': beam,
+        'compute_hypothesis_token_set': False,
+        'preserve_alignments': False
+    }
+
+
+def knelm_beam_cfg(beam_size, lm_path, alpha=0.5, beta=1.0):
+    return {
+        'strategy': 'beam',
+        'beam': {
+            'beam_size': beam_size,
+            'search_type': 'kenlm',
+            'score_norm': True,
+            'return_best_hypothesis': True,
+            'softmax_temperature': 1.0,
+            'preserve_alignments': False,
+            'lm_path': lm_path,
+            'lm_alpha': alpha,  # Language model weight
+            'lm_beta': beta,  # Word insertion penalty
+            'use_knelm': True,
+            'knelm_k': 10,  # Number of nearest neighbors
+            'knelm_lambda': 0.1  # KNELM interpolation weight
+        },
+        'compute_hypothesis_token_set': False,
+        'preserve_alignments': False
+    }
+
+
+def flashlight_beam_cfg(beam_size, lm_path, alpha=0.5, beta=1.0):
+    return {
+        'strategy': 'beam',
+        'beam': {
+            'beam_size': beam_size,
+            'search_type': 'flashlight',
+            'flashlight_cfg': {
+                'lexicon_path': None,
+                'lm_path': lm_path,
+                'lm_weight': alpha,
+                'word_score': beta,
+                'unk_score': -float('inf'),
+                'sil_score': 0.0,
+                'log_add': False,
+                'criterion_type': 'ctc'
+            },
+            'return_best_hypothesis': True,
+            'preserve_alignments': False
+        },
+        'compute_hypothesis_token_set': False,
+        'preserve_alignments': False
+    }
+
+
+def maes_cfg():
+    return {
+        'strategy': 'maes',
+        'maes': {
+            'return_best_hypothesis': True
+        },
+        'compute_hypothesis_token_set': False,
+        'preserve_alignments': False
+    }
+
+
+def uses_beta(strategy):
+    """Whether the strategy's search has a word insertion term (beam with a resident LM is maes, which has none)"""
+    return strategy in LM_SEARCH_STRATEGIES
+
+
+def decoding_cfg(strategy, beam_size=4, lm_path=None, alpha=0.5, beta=1.0):
+    """(cfg dict, resident LM path or None) for a concrete strategy ('auto' is resolved per audio)"""
+    if strategy == 'greedy':
+        return greedy_cfg(), None
+    if strategy == 'beam':
+        if lm_path:
+            return beam_cfg(beam_size, alpha, beta), lm_path
+        return beam_cfg(beam_size), None
+    if strategy in LM_SEARCH_STRATEGIES:
+        if not lm_path:
+            raise ValueError(f"lm_path required for {strategy}")
+        build = knelm_beam_cfg if strategy == 'knelm_beam' else flashlight_beam_cfg
+        return build(beam_size, lm_path, alpha, beta), None
+    if strategy == 'maes':
+        return maes_cfg(), None
+    raise ValueError(f"Unknown decoding strategy: {strategy}")
+
+
+def select_for_duration(duration_sec, beam_size):
+    """Heuristic for 'auto': (strategy, beam_size) from the utterance length"""
+    # Short utterances benefit from slightly larger beam; long ones from greedy or small beam
+    if duration_sec is None:
+        return 'beam', max(beam_size, 4)
+    if duration_sec < 5:
+        return 'beam', max(beam_size, 8)
+    if duration_sec < 15:
+        return 'beam', max(beam_size, 6)
+    # Very long: use greedy for speed and stability
+    return 'greedy', 0
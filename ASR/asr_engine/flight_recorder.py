@@ -0,0 +1,169 @@
+"""
+Flight recorder for slow requests.
+
+Aggregate latency percentiles say that some requests are slow, not why one
+particular request took 20 s. The recorder keeps a ring buffer of the last
+N transcription requests with what usually explains the latency: audio
+duration and format, decoding config (including any overload step-down),
+queue wait, per-stage timings, and the other requests that were in flight
+at the same time. The server has no cross-request batching, so that
+overlapping set is the batch composition a request ran in.
+
+A request slower than the threshold is dumped to <dir>/<time>_<trace_id>.json
+together with its neighbours: the `neighbours` records before it and up to
+`neighbours` records after it. The dump is written once those have arrived,
+or after FLUSH_AFTER seconds, whichever comes first. Only the newest
+`max_dumps` files are kept.
+"""
+import os
+import json
+import time
+import logging
+import threading
+import collections
+
+logger = logging.getLogger(__name__)
+
+FLUSH_AFTER = 30.0
+
+
+class FlightRecorder:
+    def __init__(self, size=200, threshold=10.0, neighbours=10, output_dir='flight_dumps', max_dumps=100):
+        self.size = size
+        self.threshold = threshold
+        self.neighbours = neighbours
+        self.output_dir = output_dir
+        self.max_dumps = max_dumps
+        self._lock = threading.Lock()
+        self._records = collections.deque(maxlen=size)
+        self._active = {}  # trace_id -> {'started': t, 'overlapped': set()}
+        self._pending = []  # slow records waiting for their following neighbours
+        self._seq = 0
+        self.recorded = 0
+        self.dumped = 0
+
+    def begin(self, trace_id):
+        with self._lock:
+            overlapped = set(self._active)
+            for other in self._active.values():
+                other['overlapped'].add(trace_id)
+            self._active[trace_id] = {'started': time.time(), 'overlapped': overlapped}
+
+    def end(self, trace_id, **fields):
+        """Record a finished request; fields are whatever the server knows about it"""
+        with self._lock:
+            active = self._active.pop(trace_id, None)
+            self._seq += 1
+            record = {'seq': self._seq, 'trace_id': trace_id, 'finished_at': time.time()}
+            if active is not None:
+                record['started_at'] = active['started']
+                record['overlapped'] = sorted(active['overlapped'])
+            record.update(fields)
+            self._records.append(record)
+            self.recorded += 1
+            if self.threshold and (record.get('latency') or 0.0) >= self.threshold:
+                before = list(self._records)[-(self.neighbours + 1):-1]
+                self._pending.append({'record': record, 'before': before, 'after': [],
+                                      'deadline': time.monotonic() + FLUSH_AFTER})
+            for pending in self._pending:
+                if pending['record'] is not record:
+                    pending['after'].append(record)
+            ready = self._take_ready()
+        for pending in ready:
+            self._dump(pending)
+        return record
+
+    def _take_ready(self, force=False):
+        """Pending dumps that have all their neighbours or waited long enough (caller holds _lock)"""
+        now = time.monotonic()
+        ready = [p for p in self._pending
+                 if force or len(p['after']) >= self.neighbours or now >= p['deadline']]
+        self._pending = [p for p in self._pending if p not in ready]
+        return ready
+
+    def flush(self, force=False):
+        with self._lock:
+            ready = self._take_ready(force)
+        for pending in ready:
+            self._dump(pending)
+
+    def _dump(self, pending):
+        record = pending['record']
+        name = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(record['finished_at']))}_{record['trace_id']}.json"
+        dump = {
+            'trace_id': record['trace_id'],
+            'latency': record.get('latency'),
+            'threshold': self.threshold,
+            'record': record,
+            'before': pending['before'],
+            'after': pending['after']
+        }
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(os.path.join(self.output_dir, name), 'w', encoding='utf-8') as fh:
+                json.dump(dump, fh, indent=2, default=str)
+            self.dumped += 1
+            logger.warning(f"Slow request {record['trace_id']} ({record.get('latency')}s) dumped to {name}")
+            self._prune()
+        except OSError as e:
+            logger.warning(f"Could not write flight dump {name}: {e}")
+
+    def _prune(self):
+        dumps = self.list_dumps()
+        for entry in dumps[self.max_dumps:]:
+            try:
+                os.remove(os.path.join(self.output_dir, entry['name']))
+            except OSError:
+                pass
+
+    def list_dumps(self):
+        """Dump files, newest first"""
+        try:
+            names = [n for n in os.listdir(self.output_dir) if n.endswith('.json')]
+        except OSError:
+            return []
+        entries = []
+        for n in names:
+            path = os.path.join(self.output_dir, n)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append({'name': n, 'trace_id': n.rsplit('.', 1)[0].split('_', 1)[-1], 'bytes': st.st_size,
+                            'created_at': st.st_mtime})
+        return sorted(entries, key=lambda e: e['created_at'], reverse=True)
+
+    def read_dump(self, name):
+        if os.path.basename(name) != name or not name.endswith('.json'):
+            raise FileNotFoundError(name)
+        with open(os.path.join(self.output_dir, name), 'r', encoding='utf-8') as fh:
+            return json.load(fh)
+
+    def recent(self, limit=None, slowest=False):
+        with self._lock:
+            records = list(self._records)
+        if slowest:
+            records.sort(key=lambda r: r.get('latency') or 0.0, reverse=True)
+        else:
+            records.reverse()
+        return records[:limit] if limit else records
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'buffered': len(self._records),
+                'active': len(self._active),
+                'pending_dumps': len(self._pending),
+                'threshold_s': self.threshold,
+                'recorded': self.recorded,
+                'dumped': self.dumped
+            }
+
+
+def build_flight_recorder():
+    return FlightRecorder(size=int(os.environ.get('ASR_FLIGHT_RECORDER_SIZE', '200')),
+                          threshold=float(os.environ.get('ASR_SLOW_REQUEST_SECONDS', '10')),
+                          neighbours=int(os.environ.get('ASR_FLIGHT_NEIGHBOURS', '10')),
+                          output_dir=os.environ.get('ASR_FLIGHT_DIR', 'flight_dumps'),
+                          max_dumps=int(os.environ.get('ASR_FLIGHT_MAX_DUMPS', '100')))
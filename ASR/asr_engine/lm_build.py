@@ -0,0 +1,207 @@
+"""
+ARPA to KenLM binary conversion with an on-disk build cache.
+
+Usage:
+  python -m asr_engine.lm_build --lm ./model/parakeet-rnnt-1.1b_lm-o6.arpa --quantize 8 --compare
+
+Notes:
+- The binary is written next to the ARPA source as <stem>.<sha256[:12]>[.q8].trie.binary
+  and reused until the source content changes.
+- The source hash is cached in <source>.sha256.json keyed by size and mtime, so
+  a restart does not re-read a multi-GB ARPA file just to find the binary.
+- --compare loads the text and the binary LM in fresh subprocesses and reports
+  load time and resident memory for each.
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import logging
+import subprocess
+import concurrent.futures
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+HASH_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+def is_arpa(path):
+    """Detect a text ARPA file by extension or by its \\data\\ header"""
+    if not path or not os.path.isfile(path):
+        return False
+    if path.lower().endswith('.arpa'):
+        return True
+    try:
+        with open(path, 'rb') as fh:
+            head = fh.read(4096)
+    except OSError:
+        return False
+    for line in head.splitlines():
+        line = line.strip()
+        if line:
+            return line == b'\\data\\'
+    return False
+
+
+def file_digest(path):
+    """sha256 of path, cached in a sidecar keyed by size and mtime"""
+    st = os.stat(path)
+    sidecar = path + '.sha256.json'
+    try:
+        with open(sidecar, 'r', encoding='utf-8') as fh:
+            cached = json.load(fh)
+        if cached.get('size') == st.st_size and cached.get('mtime') == st.st_mtime:
+            return cached['sha256']
+    except Exception:
+        pass
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(HASH_BLOCK_SIZE), b''):
+            h.update(block)
+    digest = h.hexdigest()
+    try:
+        with open(sidecar, 'w', encoding='utf-8') as fh:
+            json.dump({'size': st.st_size, 'mtime': st.st_mtime, 'sha256': digest}, fh)
+    except OSError as e:
+        logger.warning(f"Could not write LM hash cache {sidecar}: {e}")
+    return digest
+
+
+def binary_path_for(arpa_path, digest, quantize=None):
+    stem = os.path.basename(arpa_path)
+    if stem.lower().endswith('.arpa'):
+        stem = stem[:-5]
+    suffix = f".q{int(quantize)}" if quantize else ''
+    return os.path.join(os.path.dirname(os.path.abspath(arpa_path)), f"{stem}.{digest[:12]}{suffix}.trie.binary")
+
+
+def build_binary_cmd(arpa_path, out_path, quantize=None, build_binary=None):
+    exe = build_binary or os.environ.get('KENLM_BUILD_BINARY') or shutil.which('build_binary')
+    if not exe:
+        raise FileNotFoundError("KenLM build_binary not found (set KENLM_BUILD_BINARY)")
+    cmd = [exe]
+    if quantize:
+        cmd += ['-q', str(int(quantize)), '-b', str(int(quantize)), '-a', '22']
+    cmd += ['trie', arpa_path, out_path]
+    return cmd
+
+
+def ensure_binary(arpa_path, quantize=None, build_binary=None):
+    """Return (binary_path, info), building the trie binary once per source hash"""
+    digest = file_digest(arpa_path)
+    out_path = binary_path_for(arpa_path, digest, quantize)
+    info = {
+        'source_path': os.path.abspath(arpa_path),
+        'source_bytes': os.path.getsize(arpa_path),
+        'source_sha256': digest,
+        'binary_path': out_path,
+        'quantize': int(quantize) if quantize else None,
+        'cached': True,
+        'build_time': None
+    }
+    if os.path.exists(out_path):
+        info['binary_bytes'] = os.path.getsize(out_path)
+        return out_path, info
+
+    lock_fh = open(out_path + '.lock', 'w')
+    try:
+        if fcntl is not None:
+            # Another worker may be building the same binary; wait for it instead of racing
+            fcntl.flock(lock_fh, fcntl.LOCK_EX)
+        if not os.path.exists(out_path):
+            tmp_path = f"{out_path}.{os.getpid()}.tmp"
+            cmd = build_binary_cmd(arpa_path, tmp_path, quantize, build_binary)
+            logger.info(f"Building KenLM binary: {' '.join(cmd)}")
+            start_time = time.time()
+            try:
+                subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            except subprocess.CalledProcessError as e:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise RuntimeError(f"build_binary failed: {e.stderr.decode('utf-8', 'replace')[-2000:]}")
+            os.replace(tmp_path, out_path)
+            info['cached'] = False
+            info['build_time'] = float(round(time.time() - start_time, 3))
+            logger.info(f"KenLM binary built in {info['build_time']}s: {out_path}")
+    finally:
+        if fcntl is not None:
+            fcntl.flock(lock_fh, fcntl.LOCK_UN)
+        lock_fh.close()
+        try:
+            os.remove(out_path + '.lock')
+        except OSError:
+            pass
+    info['binary_bytes'] = os.path.getsize(out_path)
+    return out_path, info
+
+
+def resolve_lm_path(path, quantize=None):
+    """Map an ARPA path to its cached binary; any other path is returned unchanged"""
+    if not is_arpa(path):
+        return path
+    if quantize is None:
+        quantize = os.environ.get('KENLM_QUANTIZE') or None
+    try:
+        binary_path, _ = ensure_binary(path, quantize)
+        return binary_path
+    except Exception as e:
+        logger.warning(f"Falling back to text ARPA LM ({e}): {path}")
+        return path
+
+
+def current_rss():
+    try:
+        import psutil
+        return psutil.Process(os.getpid()).memory_info().rss
+    except Exception:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _measure_load(path):
+    import kenlm
+    rss_before = current_rss()
+    start_time = time.time()
+    model = kenlm.Model(path)
+    load_time = time.time() - start_time
+    rss_after = current_rss()
+    return {
+        'path': path,
+        'order': int(model.order),
+        'load_time': float(round(load_time, 3)),
+        'rss_delta_bytes': int(rss_after - rss_before)
+    }
+
+
+def measure_load(path):
+    """Load path in a fresh process and report load time and resident memory"""
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(_measure_load, path).result()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lm', required=True)
+    parser.add_argument('--quantize', type=int, default=None)
+    parser.add_argument('--build-binary', type=str, default=None)
+    parser.add_argument('--compare', action='store_true')
+    args = parser.parse_args()
+
+    binary_path, info = ensure_binary(args.lm, args.quantize, args.build_binary)
+    report = {'build': info}
+    if args.compare:
+        report['text'] = measure_load(args.lm)
+        report['binary'] = measure_load(binary_path)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""
+Resident KenLM manager.
+
+Each language model binary is loaded once per process and memory-mapped
+(KenLM LAZY load method), so the pages live in the OS page cache and are
+shared by every worker process that maps the same file. Decoders register
+as users of an LM instead of loading their own copy. Text ARPA paths are
+converted to a cached trie binary first (see lm_build).
+"""
+import os
+import threading
+import time
+import logging
+import concurrent.futures
+
+from asr_engine.lm_build import is_arpa, ensure_binary, current_rss
+
+logger = logging.getLogger(__name__)
+
+try:
+    import kenlm
+except Exception:
+    kenlm = None
+
+
+class LMEntry:
+    def __init__(self, path, model, load_time, mapped_bytes, load_method, rss_delta=0, build_info=None):
+        self.path = path
+        self.model = model
+        self.load_time = load_time
+        self.mapped_bytes = mapped_bytes
+        self.load_method = load_method
+        self.rss_delta = rss_delta
+        self.build_info = build_info
+        self.loaded_at = time.time()
+        self.users = set()
+
+    def to_dict(self):
+        return {
+            'path': self.path,
+            'load_method': self.load_method,
+            'load_time': float(round(self.load_time, 3)),
+            'rss_delta_bytes': int(self.rss_delta),
+            'build': self.build_info,
+            'mapped_bytes': int(self.mapped_bytes),
+            'mapped_mb': float(round(self.mapped_bytes / (1024 * 1024), 2)),
+            'loaded_at': float(round(self.loaded_at, 3)),
+            'active_users': len(self.users),
+            'users': sorted(self.users)
+        }
+
+
+class KenLMManager:
+    def __init__(self, load_method='lazy', quantize=None):
+        self.load_method = load_method
+        self.quantize = quantize
+        self._entries = {}
+        self._resolved = {}
+        self._build_info = {}
+        # ARPA builds and kenlm loads in progress, by path; they run outside _lock
+        self._resolving = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def _config(self):
+        config = kenlm.Config()
+        methods = {
+            'lazy': kenlm.LoadMethod.LAZY,
+            'populate': kenlm.LoadMethod.POPULATE_OR_LAZY,
+            'read': kenlm.LoadMethod.READ
+        }
+        config.load_method = methods.get(self.load_method, kenlm.LoadMethod.LAZY)
+        return config
+
+    def _once(self, pending, key, done, work):
+        """
+        done() under _lock, else work() outside it. Concurrent callers for the same key wait for
+        the first one's work (and share its exception) instead of repeating it.
+        """
+        with self._lock:
+            result = done()
+            if result is not None:
+                return result
+            future = pending.get(key)
+            leader = future is None
+            if leader:
+                future = pending[key] = concurrent.futures.Future()
+        if not leader:
+            future.result()
+            return self._once(pending, key, done, work)
+        try:
+            result = work()
+        except BaseException as e:
+            with self._lock:
+                pending.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            pending.pop(key, None)
+        future.set_result(True)
+        return result
+
+    def _key(self, path):
+        """The mapped path for an LM that has been resolved, without building anything"""
+        key = os.path.abspath(path)
+        return self._resolved.get(key, key)
+
+    def _resolve(self, path):
+        """Map a requested LM path to the binary actually mapped (ARPA sources are built once)"""
+        key = os.path.abspath(path)
+
+        def build():
+            resolved = key
+            if is_arpa(key):
+                try:
+                    resolved, info = ensure_binary(key, self.quantize)
+                    with self._lock:
+                        self._build_info[resolved] = info
+                except Exception as e:
+                    logger.warning(f"ARPA conversion failed, loading text LM ({e}): {key}")
+            with self._lock:
+                self._resolved[key] = resolved
+            return resolved
+        return self._once(self._resolving, key, lambda: self._resolved.get(key), build)
+
+    def _load(self, path):
+        if kenlm is None:
+            raise RuntimeError("kenlm python module is not installed")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Language model not found: {path}")
+        rss_before = current_rss()
+        start_time = time.time()
+        model = kenlm.Model(path, self._config())
+        load_time = time.time() - start_time
+        with self._lock:
+            build_info = self._build_info.get(path)
+        entry = LMEntry(path, model, load_time, os.path.getsize(path), self.load_method,
+                        rss_delta=current_rss() - rss_before, build_info=build_info)
+        logger.info(f"KenLM loaded ({self.load_method}) in {load_time:.2f}s: {path}")
+        return entry
+
+    def acquire(self, path, user):
+        """
+        Return the resident LM for path, loading it on first use, and register user. Building and
+        loading happen outside the registry lock, so stats() is not held up by a long ARPA build.
+        """
+        key = self._resolve(path)
+
+        def registered():
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.users.add(str(user))
+            return entry
+
+        def load():
+            entry = self._load(key)
+            with self._lock:
+                self._entries[key] = entry
+                entry.users.add(str(user))
+            return entry
+        return self._once(self._loading, key, registered, load).model
+
+    def release(self, path, user):
+        """Drop user from the LM; the mapping stays resident for the next decoder"""
+        if not path:
+            return
+        with self._lock:
+            entry = self._entries.get(self._key(path))
+            if entry is not None:
+                entry.users.discard(str(user))
+
+    def unload(self, path):
+        """Unmap an LM that has no remaining users"""
+        with self._lock:
+            key = self._key(path)
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            if entry.users:
+                raise RuntimeError(f"Language model still in use by: {sorted(entry.users)}")
+            del self._entries[key]
+            return True
+
+    def get(self, path):
+        if not path:
+            return None
+        entry = self._entries.get(self._key(path))
+        return entry.model if entry is not None else None
+
+    def stats(self):
+        with self._lock:
+            return [entry.to_dict() for entry in self._entries.values()]
+
+
+def attach_to_decoding(decoding, lm, alpha=None):
+    """
+    Point an already-built NeMo decoding object at a resident LM. Only a 'maes' beam search reads
+    ngram_lm; any other search would ignore it, so nothing is attached and False is returned.
+    """
+    if decoding is None or lm is None:
+        return False
+    inner = getattr(decoding, 'decoding', decoding)
+    attached = False
+    for obj in (inner, getattr(inner, 'search', None)):
+        if obj is not None and hasattr(obj, 'ngram_lm') and getattr(obj, 'search_type', None) == 'maes':
+            obj.ngram_lm = lm
+            if alpha is not None and hasattr(obj, 'ngram_lm_alpha'):
+                obj.ngram_lm_alpha = alpha
+            attached = True
+    return attached
+
+
+lm_manager = KenLMManager(load_method=os.environ.get('KENLM_LOAD_METHOD', 'lazy'),
+                          quantize=os.environ.get('KENLM_QUANTIZE') or None)
@@ -0,0 +1,292 @@
+"""
+Memory introspection and RSS/request-count based worker recycling.
+
+Long-running replicas grow slowly: leaked temp buffers, decoders rebuilt in
+'auto' mode and reloaded LMs all stay in the heap. Allocator fragmentation
+keeps RSS up even after the objects are freed. MemoryInspector reports
+
+  rss            current and peak resident set size
+  tracemalloc    top Python allocation sites (when tracing is on)
+  torch          CUDA caching-allocator counters, when a GPU is in use
+
+It also keeps named tracemalloc snapshots, so diff() shows what grew between
+two points, e.g. before and after a few hundred requests. tracemalloc costs
+a few percent while it traces, so it is off unless ASR_TRACEMALLOC is set
+or it is started through the admin endpoint.
+
+Recycler restarts the process once RSS passes ASR_RECYCLE_RSS_MB or the
+worker has served ASR_RECYCLE_REQUESTS requests. When a limit is hit it
+stops admitting new requests, because callers get 503 with Retry-After and
+retry on another replica. It waits for the admitted ones to finish, runs the
+shutdown hooks (worker pools) and then exits with code 3 (ASR_RECYCLE_MODE=exit).
+A request is finished when done() is called. Servers call it once the response
+body has been sent (e.g. from response.call_on_close). A short grace period
+(ASR_RECYCLE_GRACE) before exiting covers servers that close late.
+Supervisors restart on that, and so does the werkzeug reloader. With
+ASR_RECYCLE_MODE=exec it re-executes itself in place.
+"""
+import os
+import gc
+import sys
+import time
+import logging
+import threading
+import collections
+
+logger = logging.getLogger(__name__)
+
+RECYCLE_EXIT_CODE = 3
+MAX_SNAPSHOTS = 8
+DEFAULT_TOP = 25
+
+
+def rss_bytes():
+    """(current, peak) resident set size of this process in bytes"""
+    current = peak = 0
+    try:
+        with open('/proc/self/status', 'r') as fh:
+            for line in fh:
+                if line.startswith('VmRSS:'):
+                    current = int(line.split()[1]) * 1024
+                elif line.startswith('VmHWM:'):
+                    peak = int(line.split()[1]) * 1024
+    except OSError:
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            current = peak
+        except Exception:
+            pass
+    return current, peak
+
+
+def torch_allocator_stats():
+    try:
+        import torch
+    except ImportError:
+        return None
+    if not torch.cuda.is_available():
+        return {'cuda': False}
+    stats = torch.cuda.memory_stats()
+    return {
+        'cuda': True,
+        'allocated_bytes': int(stats.get('allocated_bytes.all.current', 0)),
+        'allocated_peak_bytes': int(stats.get('allocated_bytes.all.peak', 0)),
+        'reserved_bytes': int(stats.get('reserved_bytes.all.current', 0)),
+        'reserved_peak_bytes': int(stats.get('reserved_bytes.all.peak', 0)),
+        'inactive_split_bytes': int(stats.get('inactive_split_bytes.all.current', 0)),
+        'alloc_retries': int(stats.get('num_alloc_retries', 0)),
+        'ooms': int(stats.get('num_ooms', 0))
+    }
+
+
+def _stat_dict(stat):
+    frame = stat.traceback[0] if len(stat.traceback) else None
+    entry = {
+        'where': f"{frame.filename}:{frame.lineno}" if frame else '?',
+        'size_bytes': int(stat.size),
+        'count': int(stat.count)
+    }
+    if hasattr(stat, 'size_diff'):
+        entry['size_diff_bytes'] = int(stat.size_diff)
+        entry['count_diff'] = int(stat.count_diff)
+    return entry
+
+
+class MemoryInspector:
+    def __init__(self, frames=0):
+        self._lock = threading.Lock()
+        self._snapshots = collections.OrderedDict()
+        if frames:
+            self.start_tracing(frames)
+
+    @property
+    def tracing(self):
+        import tracemalloc
+        return tracemalloc.is_tracing()
+
+    def start_tracing(self, frames=1):
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            logger.info(f"tracemalloc started ({frames} frames)")
+            self.snapshot('baseline')
+
+    def stop_tracing(self):
+        import tracemalloc
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            with self._lock:
+                self._snapshots.clear()
+
+    def _take(self):
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not tracing; start it first")
+        gc.collect()
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+
+    def snapshot(self, name=None):
+        """Store a named snapshot (oldest dropped past MAX_SNAPSHOTS); returns its name"""
+        snap = self._take()
+        name = name or time.strftime('%H%M%S')
+        with self._lock:
+            self._snapshots.pop(name, None)
+            self._snapshots[name] = (time.time(), snap)
+            while len(self._snapshots) > MAX_SNAPSHOTS:
+                self._snapshots.popitem(last=False)
+        return name
+
+    def snapshots(self):
+        with self._lock:
+            return [{'name': n, 'taken_at': t} for n, (t, _) in self._snapshots.items()]
+
+    def top(self, limit=DEFAULT_TOP, group='lineno'):
+        if not self.tracing:
+            return None
+        snap = self._take()
+        stats = snap.statistics(group)
+        return {'traced_bytes': int(sum(s.size for s in stats)),
+                'top': [_stat_dict(s) for s in stats[:limit]]}
+
+    def diff(self, before, after=None, limit=DEFAULT_TOP, group='lineno'):
+        """Allocation growth from snapshot `before` to snapshot `after` (a fresh one when None)"""
+        with self._lock:
+            if before not in self._snapshots or (after is not None and after not in self._snapshots):
+                raise KeyError(f"Unknown snapshot; have {list(self._snapshots)}")
+            old = self._snapshots[before][1]
+            new = self._snapshots[after][1] if after is not None else None
+        if new is None:
+            new = self._take()
+        stats = new.compare_to(old, group)
+        return {'from': before, 'to': after or 'now',
+                'size_diff_bytes': int(sum(s.size_diff for s in stats)),
+                'top': [_stat_dict(s) for s in stats[:limit]]}
+
+    def report(self, caches=None, limit=DEFAULT_TOP, group='lineno'):
+        rss, peak = rss_bytes()
+        return {
+            'rss_bytes': rss,
+            'rss_peak_bytes': peak,
+            'gc': {'counts': list(gc.get_count()), 'garbage': len(gc.garbage)},
+            'tracemalloc': {'tracing': self.tracing, 'snapshots': self.snapshots(),
+                            'current': self.top(limit, group)},
+            'torch': torch_allocator_stats(),
+            'caches': caches or {}
+        }
+
+
+class Recycler:
+    def __init__(self, max_rss_bytes=0, max_requests=0, drain_timeout=300.0, mode='exit', retry_after=5, grace=1.0):
+        self.max_rss_bytes = max_rss_bytes
+        self.max_requests = max_requests
+        self.drain_timeout = drain_timeout
+        self.mode = mode
+        self.retry_after = retry_after
+        self.grace = grace
+        self.served = 0
+        self.active = 0
+        self.reason = None
+        self.started = time.time()
+        self._cond = threading.Condition()
+        self._hooks = []
+
+    @property
+    def enabled(self):
+        return bool(self.max_rss_bytes or self.max_requests)
+
+    @property
+    def draining(self):
+        return self.reason is not None
+
+    def on_shutdown(self, fn):
+        self._hooks.append(fn)
+        return fn
+
+    def admit(self):
+        """False once recycling has started; otherwise counts the request as active"""
+        with self._cond:
+            if self.reason is not None:
+                return False
+            self.active += 1
+            return True
+
+    def done(self):
+        """An admitted request finished (its response has been sent); checks the limits"""
+        with self._cond:
+            self.active -= 1
+            self.served += 1
+            self._cond.notify_all()
+        if self.enabled and not self.draining:
+            reason = self.check()
+            if reason:
+                self.recycle(reason)
+
+    def check(self):
+        if self.max_requests and self.served >= self.max_requests:
+            return f"served {self.served} requests (limit {self.max_requests})"
+        if self.max_rss_bytes:
+            rss, _ = rss_bytes()
+            if rss >= self.max_rss_bytes:
+                return f"RSS {rss // (1024 * 1024)} MB (limit {self.max_rss_bytes // (1024 * 1024)} MB)"
+        return None
+
+    def recycle(self, reason):
+        """Stop admitting, drain in a background thread, then restart the process"""
+        with self._cond:
+            if self.reason is not None:
+                return
+            self.reason = reason
+        logger.warning(f"Recycling worker: {reason}; draining {self.active} in-flight requests")
+        threading.Thread(target=self._drain_and_restart, name='asr-recycle', daemon=True).start()
+
+    def _drain_and_restart(self):
+        deadline = time.monotonic() + self.drain_timeout
+        with self._cond:
+            while self.active > 0 and time.monotonic() < deadline:
+                self._cond.wait(timeout=1.0)
+            left = self.active
+        if left:
+            logger.warning(f"Drain timed out with {left} requests still running")
+        elif self.grace:
+            time.sleep(self.grace)
+        for hook in self._hooks:
+            try:
+                hook()
+            except Exception as e:
+                logger.warning(f"Shutdown hook failed: {e}")
+        logging.shutdown()
+        if self.mode == 'exec':
+            os.execv(sys.executable, [sys.executable] + sys.argv)
+        os._exit(RECYCLE_EXIT_CODE)
+
+    def stats(self):
+        rss, _ = rss_bytes()
+        with self._cond:
+            return {
+                'enabled': self.enabled,
+                'max_rss_bytes': self.max_rss_bytes,
+                'max_requests': self.max_requests,
+                'mode': self.mode,
+                'served': self.served,
+                'active': self.active,
+                'rss_bytes': rss,
+                'uptime_s': float(round(time.time() - self.started, 1)),
+                'draining': self.reason is not None,
+                'reason': self.reason
+            }
+
+
+def build_memory_inspector():
+    return MemoryInspector(frames=int(os.environ.get('ASR_TRACEMALLOC', '0')))
+
+
+def build_recycler():
+    return Recycler(max_rss_bytes=int(float(os.environ.get('ASR_RECYCLE_RSS_MB', '0')) * 1024 * 1024),
+                    max_requests=int(os.environ.get('ASR_RECYCLE_REQUESTS', '0')),
+                    drain_timeout=float(os.environ.get('ASR_RECYCLE_DRAIN_TIMEOUT', '300')),
+                    grace=float(os.environ.get('ASR_RECYCLE_GRACE', '1')),
+                    mode=os.environ.get('ASR_RECYCLE_MODE', 'exit').lower())
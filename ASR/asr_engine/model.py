@@ -0,0 +1,819 @@
+"""
+NeMo RNNT inference engine shared by every server and script under ASR/.
+
+NeMoASRModel owns model loading (precision policy, cudnn settings, opt-in
+torch.compile on CUDA), the decoding strategies of asr_engine.decoding with a
+small cache of built decoders, resident KenLM attachment, text extraction and
+post-processing, word timestamps, constant-memory long-audio chunking,
+deadline-aware greedy fallback and batched transcription of many files.
+Servers keep only their routes.
+"""
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+import functools
+import collections
+import concurrent.futures
+from contextlib import contextmanager
+
+import numpy as np
+import torch
+import soundfile as sf
+import nemo.collections.asr as nemo_asr
+from omegaconf import DictConfig
+
+from asr_engine.audio import probe_duration
+from asr_engine.block_reader import iter_blocks, iter_chunks
+from asr_engine.cancellation import current_token
+from asr_engine.deadline import CancelGate, DecodeCancelled, build_rtf_estimator, decoding_kind, remaining
+from asr_engine.decoding import (SUPPORTED_STRATEGIES, BEAM_STRATEGIES, beam_cfg, decoding_cfg, greedy_cfg,
+                                select_for_duration)
+from asr_engine.lm_manager import lm_manager, attach_to_decoding
+from asr_engine.precision import resolve_policy
+from asr_engine.text_normalizer import normalize_text
+from asr_engine.tracing import current_trace, install_model_stage_hooks
+from asr_engine.word_timestamps import word_timestamp_cfg, frame_seconds, extract_words, merge_chunk_words
+
+logger = logging.getLogger(__name__)
+
+# Room for the configured decoder, the overload ladder rungs and their word-timestamp variants
+DECODER_CACHE_SIZE = 8
+LONG_AUDIO_SECONDS = 60
+CHUNK_SECONDS = 30
+CHUNK_OVERLAP_SECONDS = 2
+SAMPLE_RATE = 16000
+# How long a cancelled beam thread gets to reach its next search step
+CANCEL_JOIN_SECONDS = 5.0
+
+
+def _text_of(r):
+    if hasattr(r, 'text'):
+        return str(r.text)
+    if hasattr(r, 'item'):
+        return str(r.item())
+    return str(r)
+
+
+def extract_texts(transcription):
+    """One text per input file from a NeMo transcription result"""
+    if isinstance(transcription, tuple):
+        transcription = transcription[0]
+    if isinstance(transcription, list):
+        return [_text_of(r) for r in transcription]
+    if isinstance(transcription, torch.Tensor):
+        return [str(transcription.item()) if transcription.numel() == 1 else str(transcription.tolist())]
+    return [_text_of(transcription)]
+
+
+def extract_text(transcription):
+    """Extract text from NeMo transcription result (multiple segments are joined by newlines)"""
+    try:
+        return "\n".join([t for t in extract_texts(transcription) if t])
+    except Exception as e:
+        logger.warning(f"Text extraction fallback: {str(e)}")
+        return str(transcription)
+
+
+def load_nemo_model(model_path):
+    if model_path.endswith('.ckpt'):
+        return nemo_asr.models.ASRModel.load_from_checkpoint(model_path)
+    return nemo_asr.models.ASRModel.restore_from(model_path)
+
+
+def _run_now(fn):
+    """fn() run on the calling thread, as a finished Future"""
+    future = concurrent.futures.Future()
+    try:
+        future.set_result(fn())
+    except BaseException as e:
+        future.set_exception(e)
+    return future
+
+
+class NeMoASRModel:
+    def __init__(self, model_path, decoding_strategy='beam', beam_size=4, lm_path=None, precision=None,
+                 spool=None, compile_model=False, verbose=True):
+        self.model_path = model_path
+        self.lm_path = lm_path  # Path to language model binary file
+        self.model = None
+        self.precision = None
+        self.requested_precision = precision
+        self.spool = spool  # asr_engine.spool.SpoolManager for long-audio chunk files (tempfile when None)
+        self.compile_model = compile_model
+        self.initialized = False
+        self.model_name = "Custom NeMo RNNT Model"
+        self.decoding_strategy = decoding_strategy
+        self.beam_size = beam_size
+        self.decoder_id = f"decoder-{os.getpid()}-{id(self):x}"
+        self._decoding_key = None
+        self._decoding_lm_path = None
+        self._base_decoding = None
+        # Built decoding objects by config key, so toggling e.g. word timestamps does not rebuild
+        self._decoders = {}
+        # Beam/greedy RTF for deadline predictions, and the hook that stops a late beam search
+        self.rtf_estimator = build_rtf_estimator()
+        self._cancel_gate = CancelGate()
+        # model.decoding is swapped per call (overrides, 'auto', word timestamps), so a decoder
+        # switch and the transcription that uses it run under one lock; the threads sharing this
+        # model (the scheduler's worker, /set_decoding, scripts) take turns
+        self._lock = threading.RLock()
+        self.initialize_model()
+        if verbose:
+            self.debug_model_capabilities()
+
+    def debug_model_capabilities(self):
+        """Debug what decoding options your model actually supports"""
+        try:
+            print("=== MODEL DEBUG INFO ===")
+            print(f"Model type: {type(self.model)}")
+            print(f"Model class: {self.model.__class__.__name__}")
+
+            # Check if model has decoding config
+            if hasattr(self.model, 'cfg') and hasattr(self.model.cfg, 'decoding'):
+                print(f"Current decoding config: {self.model.cfg.decoding}")
+
+            # Check what methods are available
+            decoding_methods = [method for method in dir(self.model) if 'decoding' in method.lower()]
+            print(f"Available decoding methods: {decoding_methods}")
+
+            # Try to get the current decoding strategy
+            if hasattr(self.model, 'decoding'):
+                print(f"Current decoding object: {self.model.decoding}")
+                if hasattr(self.model.decoding, 'cfg'):
+                    print(f"Decoding config: {self.model.decoding.cfg}")
+
+            # Check if it's an RNNT model (different config structure)
+            if 'rnnt' in str(type(self.model)).lower():
+                print("This appears to be an RNNT model - different config needed")
+
+            print("=== END DEBUG INFO ===")
+
+        except Exception as e:
+            print(f"Debug failed: {e}")
+
+    def verify_lm_loading(self):
+        """Verify if the language model is actually being loaded and used"""
+        try:
+            print("=== LANGUAGE MODEL DEBUG ===")
+            lm_path = self.lm_path
+            print(f"KenLM configured: {bool(lm_path)}")
+            if lm_path:
+                print(f"KenLM file exists: {os.path.exists(lm_path)}")
+                if os.path.exists(lm_path):
+                    file_size = os.path.getsize(lm_path)
+                    print(f"KenLM file size: {file_size} bytes ({file_size / (1024 * 1024):.2f} MB)")
+
+            # Check current decoding config
+            if hasattr(self.model.decoding, 'cfg'):
+                beam_cfg = self.model.decoding.cfg.get('beam', {})
+                print(f"Current beam config:")
+                print(f"  - beam_size: {beam_cfg.get('beam_size')}")
+                print(f"  - search_type: {beam_cfg.get('search_type')}")
+                print(f"  - ngram_lm_alpha: {beam_cfg.get('ngram_lm_alpha')}")
+                print(f"  - kenlm_path: {self._decoding_lm_path}")
+
+            # Check if LM is actually loaded
+            print(f"Resident KenLM: {lm_manager.get(self._decoding_lm_path) is not None}")
+
+            print("=== END LM DEBUG ===")
+
+        except Exception as e:
+            print(f"LM debug failed: {e}")
+
+    # Usage examples:
+    def apply_beam_with_lm(self):
+        if not self.lm_path:
+            raise ValueError("Language model path not set")
+        # maes search, the one that scores with the attached LM
+        with_lm_cfg = beam_cfg(100, alpha=1.0, beta=1.0)
+        with self._lock:
+            self._apply_decoding_cfg(with_lm_cfg, lm_path=self.lm_path, alpha=1.0)
+        self.verify_lm_loading()
+        logger.info("Applied beam search WITH language model")
+
+    def apply_beam_without_lm(self):
+        """Apply beam search without language model"""
+        without_lm_cfg = beam_cfg(50)
+
+        with self._lock:
+            self._apply_decoding_cfg(without_lm_cfg)
+        logger.info("Applied beam search WITHOUT language model")
+
+    def _apply_decoding_cfg(self, cfg, lm_path=None, alpha=None):
+        """Rebuild the decoder only when the config changes; LMs come from the resident manager"""
+        key = json.dumps({'cfg': cfg, 'lm_path': lm_path}, sort_keys=True, default=str)
+        if key == self._decoding_key:
+            return False
+
+        if key in self._decoders:
+            self._set_decoding(self._decoders[key])
+        else:
+            self.model.change_decoding_strategy(DictConfig(cfg))
+            if len(self._decoders) >= DECODER_CACHE_SIZE:
+                self._decoders.pop(next(iter(self._decoders)))
+            self._decoders[key] = self.model.decoding
+
+        if lm_path:
+            lm = lm_manager.acquire(lm_path, self.decoder_id)
+            if not attach_to_decoding(getattr(self.model, 'decoding', None), lm, alpha):
+                # Not reported as in use when the search would ignore it
+                logger.warning("Decoder does not score with an n-gram LM; resident LM not attached")
+                if lm_path != self._decoding_lm_path:
+                    lm_manager.release(lm_path, self.decoder_id)
+                lm_path = None
+        if self._decoding_lm_path and self._decoding_lm_path != lm_path:
+            lm_manager.release(self._decoding_lm_path, self.decoder_id)
+
+        self._decoding_key = key
+        self._decoding_lm_path = lm_path
+        return True
+
+    def set_decoding_strategy(self, strategy='beam', beam_size=4, lm_path=None, alpha=0.5, beta=1.0):
+        """Change decoding strategy; see asr_engine.decoding.SUPPORTED_STRATEGIES"""
+        if strategy == 'auto':
+            # Do not change model decoder now; will be selected per-audio in transcribe
+            self.decoding_strategy = 'auto'
+            self.beam_size = beam_size
+            logger.info("Auto decoding enabled; strategy will be chosen per-audio")
+            return
+
+        cfg, decoding_lm_path = decoding_cfg(strategy, beam_size, lm_path or self.lm_path, alpha, beta)
+        try:
+            # Apply the configuration (no-op when unchanged, e.g. repeated 'auto' selections)
+            with self._lock:
+                changed = self._apply_decoding_cfg(cfg, lm_path=decoding_lm_path, alpha=alpha)
+                self._base_decoding = (cfg, decoding_lm_path, alpha)
+
+            self.decoding_strategy = strategy
+            self.beam_size = beam_size
+            if changed:
+                logger.info(f"Changed decoding strategy to: {strategy}")
+            if lm_path:
+                self.lm_path = lm_path
+                logger.info(f"Using language model: {lm_path}")
+        except Exception as e:
+            logger.error(f"Failed to change decoding strategy: {e}")
+
+    def _select_auto_decoding(self, duration_sec):
+        """Apply the per-audio choice when the strategy is 'auto' (strategy itself stays 'auto')"""
+        if self.decoding_strategy != 'auto':
+            return
+        chosen_strategy, chosen_beam = select_for_duration(duration_sec or 0, self.beam_size)
+        if chosen_strategy == 'beam':
+            self.set_decoding_strategy('beam', beam_size=chosen_beam)
+        else:
+            self.set_decoding_strategy('greedy')
+
+    def load_binary_lm(self, binary_path):
+        """Load a binary language model file (KenLM format) into the resident LM manager"""
+        try:
+            if not os.path.exists(binary_path):
+                raise FileNotFoundError(f"Binary LM file not found: {binary_path}")
+
+            lm_manager.acquire(binary_path, self.decoder_id)
+            if self.lm_path and self.lm_path not in (binary_path, self._decoding_lm_path):
+                lm_manager.release(self.lm_path, self.decoder_id)
+            self.lm_path = binary_path
+            logger.info(f"Binary language model loaded: {binary_path}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to load binary LM: {e}")
+            return False
+
+    def initialize_model(self):
+        """Initialize the NeMo ASR model"""
+        logger.info("Initializing NeMo ASR model...")
+
+        try:
+            self.model = load_nemo_model(self.model_path)
+
+            logger.info("Model loaded successfully")
+
+            # Attribute preprocessor/encoder time to the request trace
+            install_model_stage_hooks(self.model)
+
+            if torch.cuda.is_available():
+                torch.backends.cudnn.benchmark = True
+                torch.backends.cudnn.enabled = True
+
+            # fp16 on CUDA, bf16/fp32 on CPU (see asr_engine.precision)
+            self.precision = resolve_policy(self.requested_precision)
+            self.model = self.precision.apply(self.model)
+
+            if self.compile_model and hasattr(torch, 'compile') and torch.cuda.is_available():
+                try:
+                    self.model = torch.compile(self.model, mode="reduce-overhead")
+                    logger.info("Model compiled with torch.compile")
+                except Exception as e:
+                    logger.warning(f"torch.compile failed: {e}")
+
+            # Get vocabulary info
+            if hasattr(self.model, 'tokenizer'):
+                vocab_size = len(self.model.tokenizer.vocab)
+                logger.info(f"Vocabulary size: {vocab_size}")
+
+            # Set initial decoding strategy
+            self.set_decoding_strategy(self.decoding_strategy, self.beam_size)
+
+            self.initialized = True
+            logger.info("Model initialization complete")
+            logger.info(f"Using decoding strategy: {self.decoding_strategy}")
+
+        except Exception as e:
+            logger.error(f"Failed to initialize model: {str(e)}")
+            self.initialized = False
+            raise e
+
+    def transcribe_audio(self, audio_path, audio_duration=None, word_timestamps=False, decoding=None, deadline=None):
+        """
+        Transcribe audio file using the loaded model. decoding optionally overrides the
+        configured decoding for this call only ({'strategy', 'beam_size', 'lm'}). deadline is a
+        time.perf_counter() value; beam search that would finish after it falls back to greedy.
+        """
+        if not self.initialized:
+            raise RuntimeError("Model not initialized")
+
+        if not os.path.exists(audio_path):
+            raise FileNotFoundError(f"Audio file not found: {audio_path}")
+
+        trace = current_trace()
+        try:
+            # Pre-measure duration and optionally adjust decoding strategy
+            if audio_duration is None:
+                with trace.stage('probe'):
+                    audio_duration = probe_duration(audio_path)
+
+            with self._lock:
+                fallback = None
+                if deadline is not None and self._planned_kind(decoding, audio_duration) == 'beam' and \
+                        self.rtf_estimator.predict('beam', audio_duration) > remaining(deadline):
+                    fallback = 'predicted'
+                    decoding = {'strategy': 'greedy'}
+
+                with self._decoding_for_call(decoding, audio_duration, word_timestamps):
+                    kind = decoding_kind(self._current_cfg())
+                    if (audio_duration or 0) > LONG_AUDIO_SECONDS:
+                        result = self._transcribe_long_audio(audio_path, CHUNK_SECONDS, CHUNK_OVERLAP_SECONDS,
+                                                             word_timestamps=word_timestamps)
+                        return self._mark_deadline(result, deadline, fallback)
+
+                    # Process the file with NeMo
+                    if deadline is not None and kind == 'beam':
+                        transcription, processing_time, fallback = self._transcribe_by_deadline(
+                            audio_path, audio_duration, deadline, word_timestamps)
+                    else:
+                        transcription, processing_time = self._run_transcribe([audio_path],
+                                                                              return_hypotheses=word_timestamps)
+            if fallback != 'timeout':
+                self.rtf_estimator.record(kind, processing_time, audio_duration)
+
+            # Compute RTF
+            duration_for_rtf = audio_duration or 0
+            rtf = processing_time / duration_for_rtf if duration_for_rtf > 0 else 0
+
+            # Extract and post-process transcription text
+            with trace.stage('post_process'):
+                text_result = self._extract_text_from_result(transcription)
+                text_result = self._post_process_text(text_result)
+
+            result = {
+                'text': str(text_result),
+                'processing_time': float(round(processing_time, 3)),
+                'audio_duration': float(round(duration_for_rtf, 3)),
+                'rtf': float(round(rtf, 3)),
+                'decoding_strategy': self.decoding_strategy,
+                'beam_size': self.beam_size if self.decoding_strategy in BEAM_STRATEGIES else None
+            }
+            if word_timestamps:
+                result['words'] = self._words_from_result(transcription)
+            return self._mark_deadline(result, deadline, fallback)
+
+        except Exception as e:
+            logger.error(f"Transcription failed: {str(e)}")
+            raise e
+
+    def transcribe_batch(self, audio_paths, batch_size=8):
+        """
+        Post-processed text for each path, in order. Files are batched shortest first to
+        limit padding; files longer than LONG_AUDIO_SECONDS go through transcribe_audio.
+        """
+        if not self.initialized:
+            raise RuntimeError("Model not initialized")
+        durations = [probe_duration(p) for p in audio_paths]
+        texts = [''] * len(audio_paths)
+        short = []
+        for i, (path, duration) in enumerate(zip(audio_paths, durations)):
+            if (duration or 0) > LONG_AUDIO_SECONDS:
+                texts[i] = self.transcribe_audio(path, duration)['text']
+            else:
+                short.append(i)
+        short.sort(key=lambda i: durations[i] or 0)
+        token = current_token()
+        for start in range(0, len(short), max(1, batch_size)):
+            token.check()
+            idx = short[start:start + max(1, batch_size)]
+            with self._lock:
+                self._select_auto_decoding(max(durations[i] or 0 for i in idx))
+                result, _ = self._run_transcribe([audio_paths[i] for i in idx])
+            with current_trace().stage('post_process'):
+                for i, text in zip(idx, extract_texts(result)):
+                    texts[i] = self._post_process_text(text)
+        return texts
+
+    def _override_decoding(self, decoding):
+        """Switch to a per-call decoding (built once, then from the cache); returns what to restore"""
+        saved = self._base_decoding
+        lm_path = self.lm_path if decoding.get('lm') else None
+        cfg, decoding_lm_path = decoding_cfg(decoding['strategy'], decoding.get('beam_size') or self.beam_size, lm_path)
+        self._apply_decoding_cfg(cfg, lm_path=decoding_lm_path)
+        self._base_decoding = (cfg, decoding_lm_path, None)
+        return saved
+
+    def _restore_decoding(self, saved):
+        self._base_decoding = saved
+        if saved is not None:
+            cfg, lm_path, alpha = saved
+            self._apply_decoding_cfg(cfg, lm_path=lm_path, alpha=alpha)
+
+    def _current_cfg(self):
+        return self._base_decoding[0] if self._base_decoding else None
+
+    def _planned_kind(self, decoding, audio_duration):
+        """'beam' or 'greedy': what _decoding_for_call(decoding, audio_duration) would apply"""
+        if decoding:
+            return decoding_kind({'strategy': decoding['strategy']})
+        if self.decoding_strategy == 'auto':
+            return decoding_kind({'strategy': select_for_duration(audio_duration or 0, self.beam_size)[0]})
+        return decoding_kind(self._current_cfg())
+
+    @contextmanager
+    def _decoding_for_call(self, decoding, audio_duration, word_timestamps):
+        """Apply the per-call decoding (override, 'auto' choice, word timestamps) and restore it after"""
+        saved = None
+        if decoding:
+            saved = self._override_decoding(decoding)
+        else:
+            self._select_auto_decoding(audio_duration)
+        if word_timestamps:
+            self._use_word_timestamps(True)
+        try:
+            yield
+        finally:
+            if word_timestamps:
+                self._use_word_timestamps(False)
+            if decoding:
+                self._restore_decoding(saved)
+
+    def _mark_deadline(self, result, deadline, fallback):
+        if deadline is None:
+            return result
+        if fallback:
+            result['decoding_strategy'] = 'greedy'
+            result['beam_size'] = None
+        left = remaining(deadline)
+        result['deadline'] = {'fell_back': fallback is not None, 'reason': fallback,
+                              'remaining_ms': float(round(left * 1000.0, 1)), 'met': left >= 0}
+        return result
+
+    def _set_decoding(self, decoding):
+        """
+        Install a built decoding object. A torch.compile wrapper forwards attribute reads to the
+        module it wraps but keeps assignments to itself, so the assignment goes to that module.
+        """
+        module = getattr(self.model, '_orig_mod', self.model)
+        module.decoding = decoding
+        if hasattr(module, 'wer'):
+            module.wer.decoding = decoding
+
+    def _decoder_for(self, cfg):
+        """A built decoding object for cfg from the cache, without switching the model to it"""
+        key = json.dumps({'cfg': cfg, 'lm_path': None}, sort_keys=True, default=str)
+        if key not in self._decoders:
+            current = self.model.decoding
+            self.model.change_decoding_strategy(DictConfig(cfg))
+            built = self.model.decoding
+            self._set_decoding(current)
+            if len(self._decoders) >= DECODER_CACHE_SIZE:
+                self._decoders.pop(next(iter(self._decoders)))
+            self._decoders[key] = built
+        return self._decoders[key]
+
+    def _encode(self, audio_path):
+        """(encoded, encoded_len) for one file, with the preprocessor settings model.transcribe uses"""
+        blocks = list(iter_blocks(audio_path, SAMPLE_RATE))
+        audio = np.concatenate(blocks) if blocks else np.zeros(SAMPLE_RATE // 10, dtype=np.float32)
+        device = next(self.model.parameters()).device
+        signal = torch.from_numpy(audio).unsqueeze(0).to(device)
+        length = torch.tensor([signal.shape[1]], device=device)
+        featurizer = getattr(self.model.preprocessor, 'featurizer', None)
+        dither = getattr(featurizer, 'dither', None)
+        was_training = self.model.training
+        self.model.eval()
+        try:
+            if dither is not None:
+                featurizer.dither = 0.0
+            with torch.inference_mode(), self.precision.autocast():
+                return self.model.forward(input_signal=signal, input_signal_length=length)
+        finally:
+            if dither is not None:
+                featurizer.dither = dither
+            if was_training:
+                self.model.train()
+
+    def _decode_encoded(self, decoder, encoded, encoded_len, return_hypotheses):
+        with torch.inference_mode(), self.precision.autocast():
+            return decoder.rnnt_decoder_predictions_tensor(encoder_output=encoded, encoded_lengths=encoded_len,
+                                                           return_hypotheses=return_hypotheses)
+
+    def _transcribe_by_deadline(self, audio_path, audio_duration, deadline, word_timestamps=False):
+        """
+        Encode once, run the configured beam search on a helper thread and wait while there is
+        still time for greedy; past that, cancel the beam and decode greedy from the same encoder
+        output. A cancelled beam thread is joined before returning. Returns (transcription,
+        seconds, None or 'timeout').
+        """
+        trace = current_trace()
+        beam = self.model.decoding
+        greedy = greedy_cfg()
+        greedy = self._decoder_for(word_timestamp_cfg(greedy) if word_timestamps else greedy)
+        self._cancel_gate.install(getattr(self.model, 'joint', None))
+
+        start_time = time.time()
+        model_stages_before = trace.total_of('preprocess', 'encode')
+        encoded, encoded_len = self._encode(audio_path)
+
+        outcome = {}
+
+        def run_beam():
+            try:
+                outcome['result'] = self._decode_encoded(beam, encoded, encoded_len, word_timestamps)
+            except DecodeCancelled:
+                outcome['cancelled'] = True
+            except BaseException as e:
+                outcome['error'] = e
+
+        worker = threading.Thread(target=run_beam, name='asr-beam-deadline', daemon=True)
+        worker.start()
+        worker.join(max(0.0, remaining(deadline) - self.rtf_estimator.predict('greedy', audio_duration)))
+        fallback = None
+        if worker.is_alive():
+            self._cancel_gate.cancel(worker.ident)
+            try:
+                result = self._decode_encoded(greedy, encoded, encoded_len, word_timestamps)
+                fallback = 'timeout'
+            finally:
+                # The worker (and the model lock) stays taken until the beam thread has exited,
+                # so a cancelled search never runs alongside the next job
+                waited = 0.0
+                worker.join(CANCEL_JOIN_SECONDS)
+                while worker.is_alive():
+                    waited += CANCEL_JOIN_SECONDS
+                    logger.warning(f"Cancelled beam search still running after {waited:.0f}s; "
+                                   "holding the worker until it stops")
+                    worker.join(CANCEL_JOIN_SECONDS)
+                self._cancel_gate.clear(worker.ident)
+            logger.info("Beam search cancelled at the deadline; returned the greedy hypothesis")
+        elif 'error' in outcome:
+            raise outcome['error']
+        else:
+            result = outcome['result']
+
+        elapsed = time.time() - start_time
+        model_stages = trace.total_of('preprocess', 'encode') - model_stages_before
+        trace.add('decode', max(0.0, elapsed - model_stages))
+        return result, elapsed, fallback
+
+    def _use_word_timestamps(self, enabled):
+        """Switch between the current decoding config and its word-timestamp variant"""
+        if self._base_decoding is None:
+            return
+        cfg, lm_path, alpha = self._base_decoding
+        self._apply_decoding_cfg(word_timestamp_cfg(cfg) if enabled else cfg, lm_path=lm_path, alpha=alpha)
+
+    def _words_from_result(self, transcription, offset=0.0):
+        if isinstance(transcription, tuple):
+            transcription = transcription[0]
+        hyps = transcription if isinstance(transcription, list) else [transcription]
+        seconds_per_frame = frame_seconds(self.model)
+        words = []
+        for hyp in hyps:
+            words.extend(extract_words(hyp, seconds_per_frame, offset))
+        return words
+
+    def _post_process_text(self, text):
+        """Post-process text to handle special characters (single-pass compiled rule table)"""
+        return normalize_text(text)
+
+    def _run_transcribe(self, paths, return_hypotheses=False):
+        """Run model.transcribe; time not spent in preprocessor/encoder hooks is attributed to decode"""
+        trace = current_trace()
+        model_stages_before = trace.total_of('preprocess', 'encode')
+        start_time = time.time()
+        with torch.inference_mode(), self.precision.autocast():
+            if return_hypotheses:
+                result = self.model.transcribe(paths, batch_size=len(paths), return_hypotheses=True)
+            else:
+                result = self.model.transcribe(paths, batch_size=len(paths))
+        elapsed = time.time() - start_time
+        model_stages = trace.total_of('preprocess', 'encode') - model_stages_before
+        trace.add('decode', max(0.0, elapsed - model_stages))
+        return result, elapsed
+
+    def _transcribe_chunk(self, chunk_path, word_timestamps=False, offset=0.0):
+        result, _ = self._run_transcribe([chunk_path], return_hypotheses=word_timestamps)
+        with current_trace().stage('post_process'):
+            text = self._post_process_text(self._extract_text_from_result(result))
+            words = self._words_from_result(result, offset) if word_timestamps else None
+        return text, words
+
+    def _merge_transcriptions(self, parts):
+        lines = [p.strip() for p in parts if p and p.strip()]
+        if not lines:
+            return ""
+        merged = []
+        prev = ""
+        for ln in lines:
+            if prev and ln.startswith(prev[-5:]):
+                merged.append(ln[len(prev[-5:]):])
+            else:
+                merged.append(ln)
+            prev = ln
+        return "\n".join(merged)
+
+    def _new_chunk_file(self, samples):
+        """(path, release) for one chunk WAV, from the spool when one is configured"""
+        if self.spool is not None:
+            return self.spool.new_file('chunk.wav', expected_bytes=samples * 2 + 44), self.spool.release
+        fd, path = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+        return path, os.remove
+
+    def _transcribe_long_audio(self, audio_path, chunk_duration=30, overlap=2, word_timestamps=False, submit=None,
+                               window=1, chunk_decoding=None, audio_duration=None):
+        """
+        Transcribe in overlapping chunks. Without submit every chunk runs inline under the caller's
+        decoding. With submit(fn, chunk_seconds, remaining_seconds) -> Future each chunk is its own
+        work item that applies its own decoding (see transcribe_long); up to `window` items are
+        outstanding while the next chunk is written.
+        """
+        trace = current_trace()
+        token = current_token()
+        sr = SAMPLE_RATE
+        texts = []
+        words = []
+        total = 0
+        busy = [0.0]
+        outstanding = collections.deque()
+
+        def collect():
+            future, chunk_path, release = outstanding.popleft()
+            try:
+                t, chunk_words, seconds = future.result()
+            finally:
+                release(chunk_path)
+            texts.append(t)
+            busy[0] += seconds
+            if chunk_words:
+                merge_chunk_words(words, chunk_words)
+
+        try:
+            # Windows are read block by block, so memory stays flat however long the recording is
+            for idx, chunk in iter_chunks(audio_path, chunk_duration, overlap, target_sr=sr):
+                # Stop between chunks once the client has gone away
+                token.check()
+                total = idx + len(chunk)
+                offset = idx / sr
+                chunk_path, release = self._new_chunk_file(len(chunk))
+                try:
+                    with trace.stage('save'):
+                        sf.write(chunk_path, chunk, sr)
+                except BaseException:
+                    release(chunk_path)
+                    raise
+                if submit is None:
+                    future = _run_now(functools.partial(self._timed_chunk, chunk_path, word_timestamps, offset))
+                else:
+                    left = max(0.0, (audio_duration or 0) - offset)
+                    forced = chunk_decoding(left) if chunk_decoding else None
+                    work = functools.partial(self._chunk_item, chunk_path, word_timestamps, offset, audio_duration,
+                                             forced)
+                    future = submit(work, len(chunk) / sr, left)
+                outstanding.append((future, chunk_path, release))
+                while len(outstanding) >= max(1, window):
+                    collect()
+            while outstanding:
+                collect()
+        finally:
+            # Only reached with items left on an error or cancellation; queued ones are not run
+            for future, chunk_path, release in outstanding:
+                future.cancel()
+                release(chunk_path)
+        merged = self._merge_transcriptions(texts)
+        duration = total / sr
+        result = {
+            'text': merged,
+            'processing_time': float(round(busy[0], 3)),
+            'audio_duration': float(round(duration, 3)),
+            'rtf': float(round(busy[0] / duration, 3)) if duration else None,
+            'decoding_strategy': self.decoding_strategy,
+            'beam_size': self.beam_size if self.decoding_strategy in BEAM_STRATEGIES else None,
+            'chunks': len(texts)
+        }
+        if word_timestamps:
+            result['words'] = words
+        return result
+
+    def _timed_chunk(self, chunk_path, word_timestamps, offset):
+        started = time.time()
+        text, words = self._transcribe_chunk(chunk_path, word_timestamps, offset)
+        return text, words, time.time() - started
+
+    def _chunk_item(self, chunk_path, word_timestamps, offset, audio_duration, forced, decoding=None):
+        """One chunk as a self-contained work item; forced (deadline) wins over decoding (e.g. overload)"""
+        with self._lock, self._decoding_for_call(forced or decoding, audio_duration, word_timestamps):
+            return self._timed_chunk(chunk_path, word_timestamps, offset)
+
+    def transcribe_long(self, audio_path, audio_duration=None, word_timestamps=False, submit=None, window=2,
+                        deadline=None):
+        """
+        Long-file transcription as separate chunk work items, so other requests can run between
+        them. submit(fn, chunk_seconds, remaining_seconds) queues fn (e.g. on the inference
+        scheduler) and returns a Future; fn(decoding=None) may be given a per-chunk decoding
+        override. With a deadline, chunks fall back to greedy once beam is predicted to be late
+        for the audio that is left.
+        """
+        if not self.initialized:
+            raise RuntimeError("Model not initialized")
+        if audio_duration is None:
+            with current_trace().stage('probe'):
+                audio_duration = probe_duration(audio_path)
+        fell_back = []
+
+        def chunk_decoding(left):
+            if deadline is None or self._planned_kind(None, audio_duration) != 'beam':
+                return None
+            if self.rtf_estimator.predict('beam', left) > remaining(deadline):
+                fell_back.append(left)
+                return {'strategy': 'greedy'}
+            return None
+
+        result = self._transcribe_long_audio(audio_path, CHUNK_SECONDS, CHUNK_OVERLAP_SECONDS, word_timestamps,
+                                             submit=submit or (lambda fn, _s, _r: _run_now(fn)), window=window,
+                                             chunk_decoding=chunk_decoding, audio_duration=audio_duration)
+        if deadline is not None:
+            strategy, beam_size = result['decoding_strategy'], result['beam_size']
+            result = self._mark_deadline(result, deadline, 'predicted' if fell_back else None)
+            result['deadline']['greedy_chunks'] = len(fell_back)
+            if fell_back and len(fell_back) < result['chunks']:
+                # Only the tail fell back; the response names the configured decoding
+                result['decoding_strategy'], result['beam_size'] = strategy, beam_size
+        return result
+
+    def _extract_text_from_result(self, transcription):
+        """Extract text from NeMo transcription result"""
+        return extract_text(transcription)
+
+    def cache_stats(self):
+        """Sizes of the per-model caches, for memory introspection"""
+        return {
+            'decoders': len(self._decoders),
+            'decoder_cache_size': DECODER_CACHE_SIZE,
+            'decoder_configs': [json.loads(k)['cfg'].get('strategy') for k in self._decoders],
+            'language_models': lm_manager.stats()
+        }
+
+    def get_model_info(self):
+        """Return detailed model information"""
+        info = {
+            'model_name': self.model_name,
+            'model_type': type(self.model).__name__,
+            'model_path': self.model_path,
+            'decoding_strategy': self.decoding_strategy,
+            'beam_size': self.beam_size,
+            'initialized': self.initialized,
+            'precision': self.precision.name if self.precision else None,
+            'lm_path': self.lm_path,
+            # True only while the active decoder actually scores with the resident LM
+            'lm_in_use': self._decoding_lm_path is not None,
+            'language_models': lm_manager.stats(),
+            'deadline_rtf': self.rtf_estimator.stats(),
+            'supported_strategies': list(SUPPORTED_STRATEGIES)
+        }
+
+        try:
+            if hasattr(self.model, 'cfg'):
+                cfg = self.model.cfg
+                info.update({
+                    'architecture': cfg.get('_target_', 'Unknown'),
+                    'vocab_size': len(self.model.tokenizer.vocab) if hasattr(self.model, 'tokenizer') else 'Unknown',
+                    'sample_rate': cfg.get('preprocessor', {}).get('sample_rate', 'Unknown'),
+                    'encoder_layers': cfg.get('encoder', {}).get('n_layers', 'Unknown'),
+                    'decoder_layers': cfg.get('decoder', {}).get('num_layers', 'Unknown')
+                })
+        except:
+            pass
+
+        return info
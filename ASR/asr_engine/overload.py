@@ -0,0 +1,157 @@
+"""
+Load-adaptive decoding: step requests down to cheaper decoding under pressure.
+
+The OverloadController watches the inference queue depth and a moving
+average of the real-time factor. When either one passes its high threshold,
+it moves one rung down the ladder
+
+    beam_lm  ->  beam  ->  small_beam  ->  greedy
+
+When both are back under their low thresholds, it moves one rung back up.
+A minimum hold time between transitions keeps it from flapping. The level
+counts rungs below the configured decoding: a server configured for plain
+beam starts at 'beam' and can only drop to small_beam and greedy.
+Transitions are counted and kept in a short history for /api/overload. The
+request that triggered a transition also reports it in its response.
+"""
+import os
+import time
+import logging
+import threading
+import collections
+
+logger = logging.getLogger(__name__)
+
+LADDER = ('beam_lm', 'beam', 'small_beam', 'greedy')
+HISTORY = 50
+
+
+def rung_of(strategy, beam_size, lm_path, small_beam):
+    """Ladder rung of a configured decoding"""
+    if strategy == 'greedy':
+        return LADDER.index('greedy')
+    if strategy == 'beam':
+        if lm_path:
+            return LADDER.index('beam_lm')
+        return LADDER.index('beam') if beam_size > small_beam else LADDER.index('small_beam')
+    if strategy in ('knelm_beam', 'flashlight_beam'):
+        return LADDER.index('beam_lm')
+    return LADDER.index('beam')  # 'auto' and 'maes' are at most plain-beam cost
+
+
+class OverloadController:
+    def __init__(self, queue_high=8, queue_low=2, rtf_high=0.5, rtf_low=0.25, degrade_hold=2.0,
+                 recover_hold=10.0, rtf_alpha=0.2, small_beam=2, enabled=True):
+        self.queue_high = queue_high
+        self.queue_low = queue_low
+        self.rtf_high = rtf_high
+        self.rtf_low = rtf_low
+        self.degrade_hold = degrade_hold
+        self.recover_hold = recover_hold
+        self.rtf_alpha = rtf_alpha
+        self.small_beam = small_beam
+        self.enabled = enabled
+        self.level = 0
+        self.max_level = len(LADDER) - 1  # rungs left below the configured decoding (see set_decoding)
+        self.rtf = None
+        self._lock = threading.Lock()
+        self._changed_at = time.monotonic()
+        self._history = collections.deque(maxlen=HISTORY)
+        self.transitions = collections.Counter()
+        self.served = collections.Counter()
+
+    def set_decoding(self, strategy, beam_size, lm_path):
+        """Tell the controller the configured decoding; call at startup and whenever it changes"""
+        with self._lock:
+            self._set_base(rung_of(strategy, beam_size, lm_path, self.small_beam))
+
+    def _set_base(self, base):
+        """Rungs that exist below base; clamps the level to them (caller holds _lock)"""
+        self.max_level = len(LADDER) - 1 - base
+        if self.level > self.max_level:
+            logger.info(f"Overload level {self.level} clamped to {self.max_level} for the configured decoding")
+            self.level = self.max_level
+
+    def record_rtf(self, processing_seconds, audio_seconds):
+        """Fold one finished request into the RTF moving average"""
+        if not audio_seconds or processing_seconds is None:
+            return
+        rtf = processing_seconds / audio_seconds
+        with self._lock:
+            self.rtf = rtf if self.rtf is None else (1 - self.rtf_alpha) * self.rtf + self.rtf_alpha * rtf
+
+    def update(self, queue_depth):
+        """Re-evaluate the level for the current queue depth; returns the transition made, if any"""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            rtf = self.rtf or 0.0
+            held = now - self._changed_at
+            if (queue_depth >= self.queue_high or rtf >= self.rtf_high) and held >= self.degrade_hold:
+                new_level = min(self.level + 1, self.max_level)
+            elif queue_depth <= self.queue_low and rtf <= self.rtf_low and held >= self.recover_hold:
+                new_level = max(self.level - 1, 0)
+            else:
+                return None
+            if new_level == self.level:
+                return None
+            transition = {
+                'from': self.level,
+                'to': new_level,
+                'direction': 'degrade' if new_level > self.level else 'recover',
+                'queue_depth': queue_depth,
+                'rtf': float(round(rtf, 3)),
+                'at': time.time()
+            }
+            self.level = new_level
+            self._changed_at = now
+            self._history.append(transition)
+            self.transitions[transition['direction']] += 1
+        logger.warning(f"Overload level {transition['from']} -> {transition['to']} "
+                       f"(queue={queue_depth}, rtf={transition['rtf']})")
+        return transition
+
+    def decoding_for(self, strategy, beam_size, lm_path):
+        """(rung name, override or None) for the configured decoding at the current level"""
+        base = rung_of(strategy, beam_size, lm_path, self.small_beam)
+        with self._lock:
+            if self.max_level != len(LADDER) - 1 - base:
+                self._set_base(base)
+            rung = base + self.level
+            name = LADDER[rung]
+            self.served[name] += 1
+        if rung == base:
+            return name, None
+        if name == 'greedy':
+            return name, {'strategy': 'greedy', 'beam_size': 0, 'lm': False}
+        if name == 'small_beam':
+            return name, {'strategy': 'beam', 'beam_size': min(beam_size or self.small_beam, self.small_beam), 'lm': False}
+        return name, {'strategy': 'beam', 'beam_size': beam_size or 4, 'lm': False}
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'level': self.level,
+                'max_level': self.max_level,
+                'rtf_ewma': float(round(self.rtf, 3)) if self.rtf is not None else None,
+                'thresholds': {'queue_high': self.queue_high, 'queue_low': self.queue_low,
+                               'rtf_high': self.rtf_high, 'rtf_low': self.rtf_low},
+                'transitions': dict(self.transitions),
+                'served_by_rung': dict(self.served),
+                'recent_transitions': list(self._history)[-10:]
+            }
+
+
+def build_overload_controller():
+    return OverloadController(
+        queue_high=int(os.environ.get('ASR_OVERLOAD_QUEUE_HIGH', '8')),
+        queue_low=int(os.environ.get('ASR_OVERLOAD_QUEUE_LOW', '2')),
+        rtf_high=float(os.environ.get('ASR_OVERLOAD_RTF_HIGH', '0.5')),
+        rtf_low=float(os.environ.get('ASR_OVERLOAD_RTF_LOW', '0.25')),
+        degrade_hold=float(os.environ.get('ASR_OVERLOAD_DEGRADE_HOLD', '2')),
+        recover_hold=float(os.environ.get('ASR_OVERLOAD_RECOVER_HOLD', '10')),
+        small_beam=int(os.environ.get('ASR_OVERLOAD_SMALL_BEAM', '2')),
+        enabled=os.environ.get('ASR_OVERLOAD_ENABLED', '1').lower() not in ('0', 'false', 'no')
+    )
@@ -0,0 +1,243 @@
+"""
+Staged request pipeline: CPU preprocessing in a process pool ahead of inference.
+
+    request thread ──> PreprocessPool (processes: decode, resample, normalize, write 16 kHz WAV)
+                   ──> InferenceScheduler queue (only ready-to-run jobs) ──> inference worker(s)
+
+Audio work runs in separate processes, so it neither holds the GIL nor
+competes with the inference threads. A job reaches the scheduler only once
+its audio is prepared, so the inference worker always picks up input that is
+ready to run. The pool bounds in-flight work (callers block past
+max_pending). Every stage records busy time in a StageMeter, and utilization
+over a sliding window shows which pool needs more workers.
+
+Mel features are deliberately not computed here. model.transcribe() takes
+audio files and always runs the model's own preprocessor (with its dither,
+normalization and precision settings), so features made in a pool process
+would be computed a second time. In practice that stage runs inside the
+model call, where the 'preprocess' trace stage reports it.
+
+Workers are forked by start(), which servers call before the model is loaded
+and before any other thread starts (the spool sweeper, the scheduler, request
+threads). Forking then keeps the children free of CUDA state, of the model
+and of locks held by other threads, and avoids spawn, which would re-import
+(and re-load) the server module in every worker. A pool whose worker died is
+recreated from a forkserver that preloads only this module, since by then
+the process has threads and the model.
+
+There is no cross-request batching, so the inference stage's "next batch" is
+the next queued job: it only enters the scheduler queue once this pool has
+written its WAV, so the worker never waits on decode or resample. Long
+recordings keep their next chunk written and queued while one runs
+(asr_engine.model.transcribe_long).
+"""
+import io
+import os
+import time
+import logging
+import threading
+import collections
+import multiprocessing
+import concurrent.futures
+from multiprocessing import context, forkserver, popen_forkserver, reduction, spawn, util
+
+from asr_engine.tracing import RequestTrace, activate, current_trace
+
+logger = logging.getLogger(__name__)
+
+UTILIZATION_WINDOW = 60.0
+
+
+class StageMeter:
+    """Busy time and waits of one pipeline stage over a sliding window"""
+    def __init__(self, name, workers, window=UTILIZATION_WINDOW):
+        self.name = name
+        self.workers = workers
+        self.window = window
+        self._lock = threading.Lock()
+        self._events = collections.deque()  # (finished_at, busy, wait)
+        self.completed = 0
+        self.busy_total = 0.0
+        self.started = time.monotonic()
+
+    def record(self, busy, wait=0.0):
+        now = time.monotonic()
+        with self._lock:
+            self._events.append((now, busy, wait))
+            self.completed += 1
+            self.busy_total += busy
+            self._trim(now)
+
+    def _trim(self, now):
+        while self._events and now - self._events[0][0] > self.window:
+            self._events.popleft()
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            events = list(self._events)
+        span = min(self.window, now - self.started) or 1e-9
+        busy = sum(e[1] for e in events)
+        return {
+            'workers': self.workers,
+            'completed': self.completed,
+            'utilization': float(round(min(1.0, busy / (span * max(self.workers, 1))), 3)),
+            'service_mean': float(round(busy / len(events), 4)) if events else 0.0,
+            'wait_mean': float(round(sum(e[2] for e in events) / len(events), 4)) if events else 0.0,
+            'throughput_per_s': float(round(len(events) / span, 3))
+        }
+
+
+def prepare_audio(input_path, output_path, target_sr=16000):
+    """
+    asr_engine.audio.convert_audio_to_wav in a pool process.
+    Returns (duration, stage timings, decoder-pool record or None).
+    """
+    from asr_engine.audio import convert_audio_to_wav
+    from asr_engine.audio_decoder import needs_decoder
+
+    trace = RequestTrace()
+    decoded = None
+    with activate(trace):
+        duration = convert_audio_to_wav(input_path, output_path, target_sr)
+    if needs_decoder(input_path):
+        decoded = (input_path.rsplit('.', 1)[-1].lower(), os.path.getsize(input_path),
+                   duration, trace.timings['audio_decode'])
+    return duration, dict(trace.timings), decoded
+
+
+def _noop():
+    return os.getpid()
+
+
+class _ServerlessPopen(popen_forkserver.Popen):
+    """Forkserver launch whose child does not re-import __main__ (the server module and its model)"""
+    def _launch(self, process_obj):
+        prep_data = spawn.get_preparation_data(process_obj._name)
+        prep_data.pop('init_main_from_path', None)
+        prep_data.pop('init_main_from_name', None)
+        buf = io.BytesIO()
+        context.set_spawning_popen(self)
+        try:
+            reduction.dump(prep_data, buf)
+            reduction.dump(process_obj, buf)
+        finally:
+            context.set_spawning_popen(None)
+        self.sentinel, w = forkserver.connect_to_new_process(self._fds)
+        _parent_w = os.dup(w)
+        self.finalizer = util.Finalize(self, util.close_fds, (_parent_w, self.sentinel))
+        with open(w, 'wb', closefd=True) as f:
+            f.write(buf.getbuffer())
+        self.pid = forkserver.read_signed(self.sentinel)
+
+
+class _ServerlessProcess(context.ForkServerProcess):
+    @staticmethod
+    def _Popen(process_obj):
+        return _ServerlessPopen(process_obj)
+
+
+class _RespawnContext(context.ForkServerContext):
+    """Workers started from a clean forkserver once the process has threads and the model"""
+    Process = _ServerlessProcess
+
+
+def _respawn_context():
+    ctx = _RespawnContext()
+    # The default preload imports __main__ into the forkserver, i.e. the server and its model
+    ctx.set_forkserver_preload(['asr_engine.pipeline'])
+    return ctx
+
+
+class PreprocessPool:
+    def __init__(self, workers=2, max_pending=None):
+        self.workers = workers
+        self.max_pending = max_pending or max(1, workers) * 4
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._mp_context = multiprocessing.get_context('fork')
+        self._lock = threading.Lock()
+        self.meter = StageMeter('preprocess', max(workers, 1))
+        self.failures = 0
+        self._in_flight = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers,
+                                                                        mp_context=self._mp_context)
+            return self._executor
+
+    def start(self):
+        """Fork the worker processes now (call before loading the model and starting threads)"""
+        if self.workers > 0:
+            executor = self._get_executor()
+            pids = {f.result() for f in [executor.submit(_noop) for _ in range(self.workers)]}
+            logger.info(f"Preprocess pool started with {len(pids)} worker processes")
+        return self
+
+    def prepare(self, input_path, output_path, target_sr=16000):
+        """Convert input_path to the model's WAV input; blocks while max_pending jobs are in flight"""
+        trace = current_trace()
+        queued_at = time.perf_counter()
+        self._slots.acquire()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            t0 = time.perf_counter()
+            try:
+                if self.workers > 0:
+                    try:
+                        future = self._get_executor().submit(prepare_audio, input_path, output_path, target_sr)
+                        duration, timings, decoded = future.result()
+                    except concurrent.futures.process.BrokenProcessPool:
+                        logger.error("Preprocess pool broken (worker died); running inline and recreating")
+                        with self._lock:
+                            self._executor = None
+                            self._mp_context = _respawn_context()
+                        duration, timings, decoded = prepare_audio(input_path, output_path, target_sr)
+                    else:
+                        if decoded is not None:
+                            # Decoder stats live in the worker; mirror them in this process's pool
+                            from asr_engine.audio_decoder import decoder_pool
+                            decoder_pool.record(*decoded)
+                else:
+                    duration, timings, _ = prepare_audio(input_path, output_path, target_sr)
+            except Exception:
+                with self._lock:
+                    self.failures += 1
+                from asr_engine.audio_decoder import decoder_pool, needs_decoder
+                if needs_decoder(input_path):
+                    decoder_pool.record(input_path.rsplit('.', 1)[-1].lower(), failed=True)
+                raise
+            busy = sum(timings.values())
+            wait = (time.perf_counter() - t0 - busy) + (t0 - queued_at)
+            self.meter.record(busy, max(0.0, wait))
+            for name, secs in timings.items():
+                trace.add(name, secs)
+            trace.add('preprocess_wait', max(0.0, wait))
+            return duration
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def stats(self):
+        stats = self.meter.stats()
+        with self._lock:
+            stats.update({'in_flight': self._in_flight, 'max_pending': self.max_pending,
+                          'failures': self.failures, 'mode': 'process' if self.workers > 0 else 'inline'})
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+def build_preprocess_pool():
+    workers = int(os.environ.get('ASR_PREPROCESS_WORKERS', '2'))
+    max_pending = int(os.environ.get('ASR_PREPROCESS_MAX_PENDING', '0')) or None
+    return PreprocessPool(workers=workers, max_pending=max_pending)
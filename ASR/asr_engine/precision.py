@@ -0,0 +1,100 @@
+"""
+Device-aware precision policy shared by the servers and scripts.
+
+  fp32  weights and compute in float32 (always safe)
+  bf16  float32 weights, bfloat16 autocast (CUDA with bf16 support, or CPUs with
+        AVX512-BF16/AMX where oneDNN has fast bf16 kernels)
+  fp16  half-precision weights plus fp16 autocast (CUDA only; slow or broken on CPU)
+
+'auto' (default, or ASR_PRECISION) picks fp16 on CUDA, bf16 on CPUs that
+support it natively and fp32 otherwise. An explicit request that the device
+cannot honour is downgraded with a warning instead of failing.
+"""
+import os
+import logging
+from contextlib import nullcontext
+
+logger = logging.getLogger(__name__)
+
+PRECISIONS = ('fp32', 'bf16', 'fp16')
+
+_CPU_BF16_FLAGS = ('avx512_bf16', 'amx_bf16')
+
+
+def cpu_supports_bf16():
+    try:
+        with open('/proc/cpuinfo', 'r') as fh:
+            for line in fh:
+                if line.startswith('flags'):
+                    flags = set(line.split(':', 1)[1].split())
+                    return any(f in flags for f in _CPU_BF16_FLAGS)
+    except OSError:
+        pass
+    return False
+
+
+def default_device():
+    import torch
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+class PrecisionPolicy:
+    def __init__(self, name, device):
+        self.name = name
+        self.device = device
+
+    def apply(self, model):
+        """Cast model weights for this policy; returns the model"""
+        if self.name == 'fp16':
+            return model.half()
+        return model.float()
+
+    def autocast(self):
+        """Context manager for inference under this policy"""
+        import torch
+        if self.name == 'fp16':
+            return torch.autocast(device_type=self.device, dtype=torch.float16)
+        if self.name == 'bf16':
+            return torch.autocast(device_type=self.device, dtype=torch.bfloat16)
+        return nullcontext()
+
+    def describe(self):
+        return {'precision': self.name, 'device': self.device}
+
+    def __repr__(self):
+        return f"PrecisionPolicy({self.name!r}, {self.device!r})"
+
+
+def select_precision(requested=None, device=None):
+    import torch
+    device = device or default_device()
+    requested = (requested or os.environ.get('ASR_PRECISION') or 'auto').lower()
+    if requested not in PRECISIONS and requested != 'auto':
+        logger.warning(f"Unknown precision {requested!r}; using auto")
+        requested = 'auto'
+
+    if device == 'cuda':
+        bf16_ok = torch.cuda.is_bf16_supported()
+        if requested == 'auto':
+            return 'fp16'
+        if requested == 'bf16' and not bf16_ok:
+            logger.warning("bf16 not supported on this GPU; using fp16")
+            return 'fp16'
+        return requested
+
+    cpu_bf16 = cpu_supports_bf16()
+    if requested == 'auto':
+        return 'bf16' if cpu_bf16 else 'fp32'
+    if requested == 'fp16':
+        logger.warning("fp16 is not supported for CPU inference; using fp32")
+        return 'fp32'
+    if requested == 'bf16' and not cpu_bf16:
+        logger.warning("CPU lacks native bf16 (avx512_bf16/amx); bf16 autocast will be emulated and slow")
+    return requested
+
+
+def resolve_policy(requested=None, device=None):
+    device = device or default_device()
+    policy = PrecisionPolicy(select_precision(requested, device), device)
+    logger.info(f"Precision policy: {policy.name} on {policy.device}")
+    return policy
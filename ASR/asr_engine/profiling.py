@@ -0,0 +1,263 @@
+"""
+On-demand profiling of inference requests.
+
+A ProfileCapture is idle by default. Then run(fn) checks one attribute and
+calls fn() directly, so profiling costs nothing until it is armed. arm()
+starts a session covering the next N requests, the next T seconds, or both
+(whichever ends first). While a session is armed, each request that reaches
+the inference worker runs under torch.profiler and writes
+
+  <dir>/<session>/<label>.trace.json   Chrome trace (chrome://tracing, Perfetto)
+  <dir>/<session>/<label>.ops.txt      operator table sorted by self CPU time
+
+With sampling=True, a sampler thread also records the worker thread's Python
+stack every `interval` seconds, py-spy style, to <label>.folded (collapsed
+stacks for flamegraph.pl / speedscope). This covers the Python-side time
+(decoding loops, LM scoring) that operator tables do not show.
+
+The torch profiler is process-wide, so only one request is profiled at a
+time. Requests that run concurrently on other workers are not profiled and
+do not count toward N. Operator self times are summed across the session,
+and summary() returns the top operators.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import collections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOP = 20
+SAMPLE_INTERVAL = 0.005
+MAX_STACK_DEPTH = 128
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='asr-profile-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.stacks
+
+
+def _torch_profiler(record_shapes, with_stack):
+    try:
+        import torch
+        from torch.profiler import profile, ProfilerActivity
+    except ImportError:
+        return None
+    activities = [ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(ProfilerActivity.CUDA)
+    return profile(activities=activities, record_shapes=record_shapes, with_stack=with_stack)
+
+
+class ProfileCapture:
+    def __init__(self, output_dir='profiles', top=DEFAULT_TOP):
+        self.output_dir = output_dir
+        self.top = top
+        self.armed = False
+        self._lock = threading.Lock()
+        self._busy = threading.Lock()
+        self._done = threading.Event()
+        self._session = None
+
+    def arm(self, requests=1, seconds=None, sampling=False, interval=SAMPLE_INTERVAL, record_shapes=False,
+            with_stack=False):
+        """Profile the next `requests` requests and/or the next `seconds` seconds"""
+        if not requests and not seconds:
+            raise ValueError("Give a request count, a duration or both")
+        with self._lock:
+            if self.armed:
+                raise RuntimeError("A profiling session is already armed")
+            session_id = time.strftime('%Y%m%d-%H%M%S') + f"-{int(time.time() * 1000) % 1000:03d}"
+            path = os.path.join(self.output_dir, session_id)
+            os.makedirs(path, exist_ok=True)
+            self._session = {
+                'id': session_id,
+                'dir': path,
+                'requests': requests or None,
+                'seconds': seconds or None,
+                'sampling': sampling,
+                'interval': interval,
+                'record_shapes': record_shapes,
+                'with_stack': with_stack,
+                'armed_at': time.time(),
+                'deadline': time.monotonic() + seconds if seconds else None,
+                'remaining': requests or None,
+                'captures': [],
+                'ops': {},
+                'leaf_samples': collections.Counter(),
+                'finished_at': None,
+                'reason': None
+            }
+            self._done.clear()
+            self.armed = True
+        logger.warning(f"Profiling armed: session {session_id}, requests={requests}, seconds={seconds}, "
+                       f"sampling={sampling}")
+        return self.summary()
+
+    def disarm(self, reason='disarmed'):
+        with self._lock:
+            self._finish(reason)
+        return self.summary()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def _finish(self, reason):
+        """Close the armed session (caller holds _lock)"""
+        if not self.armed:
+            return
+        self.armed = False
+        self._session['finished_at'] = time.time()
+        self._session['reason'] = reason
+        self._done.set()
+        try:
+            with open(os.path.join(self._session['dir'], 'summary.json'), 'w', encoding='utf-8') as fh:
+                json.dump(self._summary(), fh, indent=2)
+        except OSError as e:
+            logger.warning(f"Could not write profile summary: {e}")
+        logger.warning(f"Profiling session {self._session['id']} finished ({reason}), "
+                       f"{len(self._session['captures'])} requests captured")
+
+    def _expire(self):
+        """End the session if its time is up (caller holds _lock)"""
+        session = self._session
+        if self.armed and session['deadline'] is not None and time.monotonic() >= session['deadline']:
+            self._finish('duration reached')
+
+    def _claim(self):
+        with self._lock:
+            self._expire()
+            if not self.armed:
+                return None
+            session = self._session
+            if session['remaining'] is not None:
+                session['remaining'] -= 1
+            return session
+
+    def run(self, fn, label=None):
+        """fn(), profiled when a session is armed and no other request is being profiled"""
+        if not self.armed:
+            return fn()
+        if not self._busy.acquire(blocking=False):
+            return fn()
+        try:
+            session = self._claim()
+            if session is None:
+                return fn()
+            return self._profile(session, fn, label)
+        finally:
+            self._busy.release()
+
+    def _profile(self, session, fn, label):
+        label = label or f"request_{len(session['captures']) + 1}"
+        sampler = StackSampler(threading.get_ident(), session['interval']).start() if session['sampling'] else None
+        prof = _torch_profiler(session['record_shapes'], session['with_stack'])
+        started = time.perf_counter()
+        try:
+            if prof is not None:
+                with prof:
+                    return fn()
+            return fn()
+        finally:
+            elapsed = time.perf_counter() - started
+            stacks = sampler.stop() if sampler is not None else None
+            try:
+                self._record(session, label, prof, stacks, elapsed)
+            except Exception as e:
+                logger.warning(f"Could not write profile for {label}: {e}")
+            with self._lock:
+                if session is self._session and session['remaining'] is not None and session['remaining'] <= 0:
+                    self._finish('request count reached')
+
+    def _record(self, session, label, prof, stacks, elapsed):
+        base = os.path.join(session['dir'], label)
+        capture = {'label': label, 'seconds': float(round(elapsed, 4)), 'files': []}
+        if prof is not None:
+            prof.export_chrome_trace(base + '.trace.json')
+            averages = prof.key_averages()
+            with open(base + '.ops.txt', 'w', encoding='utf-8') as fh:
+                fh.write(averages.table(sort_by='self_cpu_time_total', row_limit=100))
+            capture['files'] += [base + '.trace.json', base + '.ops.txt']
+            with self._lock:
+                for event in averages:
+                    op = session['ops'].setdefault(event.key, {'calls': 0, 'self_cpu_us': 0.0, 'self_device_us': 0.0})
+                    op['calls'] += event.count
+                    op['self_cpu_us'] += event.self_cpu_time_total
+                    op['self_device_us'] += getattr(event, 'self_device_time_total',
+                                                    getattr(event, 'self_cuda_time_total', 0.0))
+        if stacks:
+            with open(base + '.folded', 'w', encoding='utf-8') as fh:
+                for stack, count in stacks.most_common():
+                    fh.write(f"{stack} {count}\n")
+            capture['files'].append(base + '.folded')
+            with self._lock:
+                for stack, count in stacks.items():
+                    session['leaf_samples'][stack.rsplit(';', 1)[-1]] += count
+        with self._lock:
+            session['captures'].append(capture)
+
+    def _summary(self):
+        session = self._session
+        if session is None:
+            return {'armed': False, 'session': None}
+        ops = sorted(session['ops'].items(), key=lambda kv: kv[1]['self_cpu_us'], reverse=True)[:self.top]
+        total_cpu = sum(op['self_cpu_us'] for op in session['ops'].values()) or 1.0
+        return {
+            'armed': self.armed,
+            'session': session['id'],
+            'dir': session['dir'],
+            'requests': session['requests'],
+            'seconds': session['seconds'],
+            'sampling': session['sampling'],
+            'remaining': session['remaining'],
+            'armed_at': session['armed_at'],
+            'finished_at': session['finished_at'],
+            'reason': session['reason'],
+            'captures': list(session['captures']),
+            'top_ops': [{'name': name, 'calls': op['calls'], 'self_cpu_ms': float(round(op['self_cpu_us'] / 1000.0, 3)),
+                         'self_cpu_pct': float(round(100.0 * op['self_cpu_us'] / total_cpu, 2)),
+                         'self_device_ms': float(round(op['self_device_us'] / 1000.0, 3))} for name, op in ops],
+            'top_sampled_frames': [{'frame': frame, 'samples': count}
+                                   for frame, count in session['leaf_samples'].most_common(self.top)]
+        }
+
+    def summary(self):
+        with self._lock:
+            self._expire()
+            return self._summary()
+
+
+def build_profile_capture():
+    return ProfileCapture(output_dir=os.environ.get('ASR_PROFILE_DIR', 'profiles'),
+                          top=int(os.environ.get('ASR_PROFILE_TOP', str(DEFAULT_TOP))))
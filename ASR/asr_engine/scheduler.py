@@ -0,0 +1,276 @@
+"""
+Priority-class inference scheduler.
+
+Requests are queued per priority class ('interactive', 'batch', ...) and run
+by one worker thread. There is one NeMoASRModel, and its lock lets one
+thread switch the decoder and transcribe at a time, so more workers would
+only queue on that lock; the model's parallelism comes from its intra-op
+threads (asr_engine.affinity). Classes are served in rank order; within a class the job with the shortest expected audio
+duration runs first, adjusted by an aging credit so long jobs still move
+forward. Any job that has waited longer than its class max_wait is promoted
+ahead of everything else (starvation protection). A job whose CancelToken is
+cancelled while it waits is dropped from the queue; while it runs the token
+is bound on the worker for cooperative checks (asr_engine.cancellation).
+
+Long recordings are not one job: each chunk is its own job in a JobGroup, so
+a short request waits for at most one chunk. How the chunks of concurrent
+long jobs are ordered among themselves is the fairness policy:
+
+  round_robin         every chunk is costed on its own; jobs take turns
+  fifo                chunks age from when their job started; the oldest job
+                      finishes first
+  shortest_remaining  chunks are costed by their job's remaining audio
+"""
+import os
+import time
+import logging
+import threading
+import itertools
+import collections
+import concurrent.futures
+
+from asr_engine.tracing import activate
+from asr_engine.cancellation import RequestCancelled, bind_token
+from asr_engine.pipeline import StageMeter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CLASSES = {
+    'interactive': {'rank': 0, 'max_wait': 10.0},
+    'batch': {'rank': 1, 'max_wait': 120.0},
+}
+
+# Seconds of expected duration forgiven per second spent waiting
+DEFAULT_AGING_RATE = 0.5
+# Expected duration assumed when the probe failed
+DEFAULT_EXPECTED_DURATION = 60.0
+WAIT_SAMPLES = 1000
+FAIRNESS_POLICIES = ('round_robin', 'fifo', 'shortest_remaining')
+
+
+class JobGroup:
+    """The chunk jobs of one long request"""
+
+    def __init__(self, total_seconds=None):
+        self.started = time.monotonic()
+        self.remaining = total_seconds
+        self.chunks = 0
+
+
+class Job:
+    def __init__(self, fn, priority, expected_duration, trace=None, token=None, group=None):
+        self.fn = fn
+        self.priority = priority
+        self.expected_duration = expected_duration
+        self.trace = trace
+        self.token = token
+        self.group = group
+        self.future = concurrent.futures.Future()
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+        self.seq = None
+
+    def waited(self, now=None):
+        return (now or time.monotonic()) - self.enqueued_at
+
+
+class InferenceScheduler:
+    def __init__(self, classes=None, aging_rate=DEFAULT_AGING_RATE, default_priority='batch', worker_init=None,
+                 fairness='round_robin'):
+        if fairness not in FAIRNESS_POLICIES:
+            raise ValueError(f"Unknown fairness policy {fairness!r}; use one of {FAIRNESS_POLICIES}")
+        self.classes = dict(classes or DEFAULT_CLASSES)
+        self.fairness = fairness
+        self.workers = 1
+        # Called as worker_init(0) on the worker thread before it takes jobs (e.g. CPU pinning)
+        self.worker_init = worker_init
+        self.aging_rate = aging_rate
+        self.default_priority = default_priority
+        self._pending = []
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._thread = None
+        self._running = 0
+        self._waits = {name: collections.deque(maxlen=WAIT_SAMPLES) for name in self.classes}
+        self._completed = collections.Counter()
+        self._failed = collections.Counter()
+        self._promoted = collections.Counter()
+        self._cancelled = collections.Counter()  # (class, 'queued'|'running') -> jobs
+        self._chunk_jobs = 0
+        self.meter = StageMeter('inference', self.workers)
+
+    def resolve_priority(self, priority):
+        return priority if priority in self.classes else self.default_priority
+
+    def _ensure_worker(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._worker, name='asr-inference', daemon=True)
+            self._thread.start()
+
+    def submit(self, fn, priority=None, expected_duration=None, trace=None, token=None, group=None):
+        """Queue fn() for a worker thread; returns a Future"""
+        job = Job(fn, self.resolve_priority(priority), expected_duration, trace, token, group)
+        with self._cond:
+            self._ensure_worker()
+            job.seq = next(self._seq)
+            self._pending.append(job)
+            self._cond.notify()
+        if token is not None:
+            token.on_cancel(lambda: self._drop(job))
+        return job.future
+
+    def run(self, fn, priority=None, expected_duration=None, trace=None, token=None):
+        """Queue fn() and block until it has run"""
+        return self.submit(fn, priority, expected_duration, trace, token).result()
+
+    def _drop(self, job):
+        """Remove a cancelled job that has not started yet"""
+        with self._cond:
+            if job not in self._pending:
+                return
+            self._pending.remove(job)
+            self._cancelled[(job.priority, 'queued')] += 1
+        job.future.set_exception(RequestCancelled(job.token.reason))
+
+    def new_group(self, total_seconds=None):
+        return JobGroup(total_seconds)
+
+    def _cost(self, job, now):
+        expected = job.expected_duration if job.expected_duration is not None else DEFAULT_EXPECTED_DURATION
+        since = job.enqueued_at
+        if job.group is not None:
+            if self.fairness == 'shortest_remaining' and job.group.remaining is not None:
+                expected = job.group.remaining
+            elif self.fairness == 'fifo':
+                since = job.group.started
+        return expected - self.aging_rate * (now - since)
+
+    def _select(self):
+        now = time.monotonic()
+        starved = [j for j in self._pending if j.waited(now) >= self.classes[j.priority]['max_wait']]
+        if starved:
+            job = min(starved, key=lambda j: j.enqueued_at)
+            self._promoted[job.priority] += 1
+        else:
+            job = min(self._pending, key=lambda j: (self.classes[j.priority]['rank'], self._cost(j, now), j.seq))
+        self._pending.remove(job)
+        return job
+
+    def _worker(self):
+        if self.worker_init is not None:
+            try:
+                self.worker_init(0)
+            except Exception as e:
+                logger.warning(f"Inference worker init failed: {e}")
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                job = self._select()
+                self._running += 1
+            job.started_at = time.monotonic()
+            wait = job.started_at - job.enqueued_at
+            self._waits[job.priority].append(wait)
+            if job.trace is not None:
+                job.trace.add('queue', wait)
+            if not job.future.set_running_or_notify_cancel():
+                with self._cond:
+                    self._running -= 1
+                continue
+            try:
+                if job.token is not None:
+                    job.token.check()
+                with bind_token(job.token):
+                    if job.trace is not None:
+                        with activate(job.trace):
+                            result = job.fn()
+                    else:
+                        result = job.fn()
+                job.future.set_result(result)
+                self._completed[job.priority] += 1
+                if job.group is not None:
+                    job.group.chunks += 1
+                    self._chunk_jobs += 1
+            except RequestCancelled as e:
+                job.future.set_exception(e)
+                self._cancelled[(job.priority, 'running')] += 1
+            except BaseException as e:
+                job.future.set_exception(e)
+                self._failed[job.priority] += 1
+            finally:
+                self.meter.record(time.monotonic() - job.started_at, wait)
+                with self._cond:
+                    self._running -= 1
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._pending)
+
+    def stats(self):
+        with self._cond:
+            queued = collections.Counter(j.priority for j in self._pending)
+            running = self._running
+        classes = {}
+        for name in self.classes:
+            waits = sorted(self._waits[name])
+            classes[name] = {
+                'queued': queued.get(name, 0),
+                'completed': self._completed.get(name, 0),
+                'failed': self._failed.get(name, 0),
+                'starvation_promotions': self._promoted.get(name, 0),
+                'cancelled_queued': self._cancelled.get((name, 'queued'), 0),
+                'cancelled_running': self._cancelled.get((name, 'running'), 0),
+                'wait_mean': float(round(sum(waits) / len(waits), 3)) if waits else 0.0,
+                'wait_p50': _percentile(waits, 50),
+                'wait_p95': _percentile(waits, 95),
+                'wait_max': float(round(waits[-1], 3)) if waits else 0.0
+            }
+        return {'workers': self.workers, 'running': running, 'queued': sum(queued.values()), 'classes': classes,
+                'fairness': self.fairness, 'chunk_jobs': self._chunk_jobs, 'utilization': self.meter.stats()}
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return float(round(sorted_values[idx], 3))
+
+
+def parse_api_key_classes(spec):
+    """'key1:interactive,key2:batch' -> {'key1': 'interactive', 'key2': 'batch'}"""
+    mapping = {}
+    for item in (spec or '').split(','):
+        if ':' in item:
+            key, cls = item.rsplit(':', 1)
+            if key.strip():
+                mapping[key.strip()] = cls.strip()
+    return mapping
+
+
+def priority_from_request(headers, api_key_classes, default=None):
+    """Priority from X-Priority, else from the class bound to X-API-Key"""
+    explicit = (headers.get('X-Priority') or '').strip().lower()
+    if explicit:
+        return explicit
+    api_key = headers.get('X-API-Key')
+    if api_key and api_key in api_key_classes:
+        return api_key_classes[api_key]
+    return default
+
+
+def build_scheduler(worker_init=None):
+    if os.environ.get('ASR_INFERENCE_WORKERS', '1') != '1':
+        logger.warning("ASR_INFERENCE_WORKERS is ignored: inference runs on one worker "
+                       "(size it with ASR_INFERENCE_THREADS)")
+    classes = {name: dict(cfg) for name, cfg in DEFAULT_CLASSES.items()}
+    for name, cfg in classes.items():
+        env_wait = os.environ.get(f"ASR_MAX_WAIT_{name.upper()}")
+        if env_wait:
+            cfg['max_wait'] = float(env_wait)
+    return InferenceScheduler(
+        classes=classes,
+        aging_rate=float(os.environ.get('ASR_SCHEDULER_AGING_RATE', DEFAULT_AGING_RATE)),
+        default_priority=os.environ.get('ASR_DEFAULT_PRIORITY', 'batch'),
+        worker_init=worker_init,
+        fairness=os.environ.get('ASR_LONG_JOB_FAIRNESS', 'round_robin').lower()
+    )
@@ -0,0 +1,98 @@
+"""
+Single-flight coalescing of identical in-flight transcriptions.
+
+UI retries and upstream services often resend the same audio while the first
+request is still being transcribed. Requests are keyed on the SHA-256 of the
+model-input WAV plus the decoding config. A request whose key is already in
+flight does not queue its own inference: it waits for the leader's result
+(or exception) and gets a copy of it. Keys are dropped as soon as the leader
+finishes, so this is not a result cache. When the leader fails with one of
+the retry_on exceptions (its client went away and its work was cancelled),
+the waiting callers do not inherit that failure. They start over, and one of
+them becomes the new leader.
+"""
+import os
+import copy
+import json
+import hashlib
+import logging
+import threading
+import concurrent.futures
+
+from asr_engine.cancellation import RequestCancelled
+
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK = 1024 * 1024
+
+
+def audio_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(HASH_BLOCK), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def request_key(wav_path, **decoding):
+    """Key for one transcription: audio content plus everything that changes the output"""
+    return audio_digest(wav_path) + ':' + json.dumps(decoding, sort_keys=True, default=str)
+
+
+class SingleFlight:
+    def __init__(self, enabled=True, retry_on=()):
+        self.enabled = enabled
+        self.retry_on = tuple(retry_on)
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> Future of the leader's result
+        self.leaders = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    def do(self, key, fn):
+        """(result, coalesced): run fn() once per key in flight; concurrent callers share its outcome"""
+        if not self.enabled:
+            return fn(), False
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = concurrent.futures.Future()
+                self._inflight[key] = future
+                self.leaders += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+        if not leader:
+            try:
+                return copy.deepcopy(future.result()), True
+            except self.retry_on:
+                return self.do(key, fn)
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                self.failures += 1
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(copy.deepcopy(result))
+            return result, False
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'in_flight': len(self._inflight),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'failures': self.failures
+            }
+
+
+def build_single_flight():
+    return SingleFlight(enabled=os.environ.get('ASR_COALESCE', '1').lower() not in ('0', 'false', 'no'),
+                        retry_on=(RequestCancelled,))
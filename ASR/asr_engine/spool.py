@@ -0,0 +1,264 @@
+"""
+Upload spool: where request audio lives between upload and transcription.
+
+Files are created through a SpoolManager, which
+  - prefers tmpfs (/dev/shm) so uploads and converted WAVs never touch disk,
+  - enforces a byte quota across all live files (SpoolQuotaError when full),
+  - reference-counts every file and deletes it when the last user releases it,
+  - names files '<pid>_<seq>_<name>' so a sweep (at startup and on a timer)
+    can remove files left behind by crashed workers or lost requests.
+
+Routes use a SpoolSession (`with spool.session() as files:`), which releases
+everything it created on exit, including on error paths.
+"""
+import os
+import time
+import shutil
+import logging
+import threading
+import itertools
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUOTA_BYTES = 2 * 1024 * 1024 * 1024
+DEFAULT_ORPHAN_AGE = 3600.0
+DEFAULT_SWEEP_INTERVAL = 300.0
+TMPFS_CANDIDATE = '/dev/shm'
+
+
+class SpoolQuotaError(Exception):
+    pass
+
+
+def is_tmpfs(path):
+    """True when path lives on a tmpfs mount (from /proc/mounts)"""
+    try:
+        real = os.path.realpath(path)
+        best, fstype = '', None
+        with open('/proc/mounts', 'r') as fh:
+            for line in fh:
+                parts = line.split()
+                if len(parts) < 3:
+                    continue
+                mount = parts[1]
+                if (real == mount or real.startswith(mount.rstrip('/') + '/')) and len(mount) >= len(best):
+                    best, fstype = mount, parts[2]
+        return fstype == 'tmpfs'
+    except OSError:
+        return False
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def choose_spool_root(fallback, quota_bytes):
+    """tmpfs when it exists and has room for the quota, else the fallback directory"""
+    if os.path.isdir(TMPFS_CANDIDATE) and os.access(TMPFS_CANDIDATE, os.W_OK) and is_tmpfs(TMPFS_CANDIDATE):
+        try:
+            if shutil.disk_usage(TMPFS_CANDIDATE).free >= quota_bytes:
+                return os.path.join(TMPFS_CANDIDATE, 'asr-spool')
+        except OSError:
+            pass
+    return fallback
+
+
+class SpoolManager:
+    def __init__(self, root, quota_bytes=DEFAULT_QUOTA_BYTES, orphan_age=DEFAULT_ORPHAN_AGE,
+                 sweep_interval=DEFAULT_SWEEP_INTERVAL):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+        self.tmpfs = is_tmpfs(self.root)
+        self.quota_bytes = quota_bytes
+        self.orphan_age = orphan_age
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._files = {}  # path -> {'refs': n, 'bytes': size (reserved or actual)}
+        self._used = 0
+        self.peak_bytes = 0
+        self.quota_rejections = 0
+        self.orphans_removed = 0
+        self.sweeps = 0
+        self._timer = None
+
+    def start(self):
+        """Sweep leftovers from previous runs and start the periodic sweeper"""
+        self.sweep(startup=True)
+        if self.sweep_interval and self._timer is None:
+            self._timer = threading.Thread(target=self._sweep_loop, name='asr-spool-sweeper', daemon=True)
+            self._timer.start()
+        logger.info(f"Upload spool at {self.root} (tmpfs={self.tmpfs}, quota={self.quota_bytes} bytes)")
+        return self
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.warning(f"Spool sweep failed: {e}")
+
+    def new_file(self, name, expected_bytes=0):
+        """Reserve a spool path for name; the caller holds one reference"""
+        expected_bytes = int(expected_bytes or 0)
+        with self._lock:
+            if self._used + expected_bytes > self.quota_bytes:
+                self.quota_rejections += 1
+                raise SpoolQuotaError(f"Upload spool full ({self._used} of {self.quota_bytes} bytes in use)")
+            path = os.path.join(self.root, f"{os.getpid()}_{next(self._seq)}_{os.path.basename(name)}")
+            self._files[path] = {'refs': 1, 'bytes': expected_bytes}
+            self._used += expected_bytes
+            self.peak_bytes = max(self.peak_bytes, self._used)
+        return path
+
+    def commit(self, path):
+        """Account the real size of a written file; over-quota files are rejected"""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is None:
+                return size
+            self._used += size - entry['bytes']
+            entry['bytes'] = size
+            self.peak_bytes = max(self.peak_bytes, self._used)
+            over = self._used > self.quota_bytes
+            if over:
+                self.quota_rejections += 1
+        if over:
+            raise SpoolQuotaError(f"Upload spool quota of {self.quota_bytes} bytes exceeded")
+        return size
+
+    def acquire(self, path):
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is None:
+                raise KeyError(f"Not a live spool file: {path}")
+            entry['refs'] += 1
+
+    def release(self, path):
+        """Drop one reference; the file is deleted when none are left"""
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is None:
+                return
+            entry['refs'] -= 1
+            if entry['refs'] > 0:
+                return
+            del self._files[path]
+            self._used -= entry['bytes']
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove spool file {path}: {e}")
+
+    def session(self):
+        return SpoolSession(self)
+
+    def sweep(self, startup=False):
+        """Remove files not owned by a live spool user (dead pid, or untracked and too old)"""
+        removed = 0
+        now = time.time()
+        own = str(os.getpid())
+        with self._lock:
+            live = set(self._files)
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return 0
+        for name in names:
+            path = os.path.join(self.root, name)
+            if path in live or not os.path.isfile(path):
+                continue
+            pid = name.split('_', 1)[0]
+            try:
+                age = now - os.path.getmtime(path)
+            except OSError:
+                continue
+            if pid == own:
+                orphan = startup or age > self.orphan_age
+            elif pid.isdigit() and not _pid_alive(int(pid)):
+                orphan = True
+            else:
+                orphan = age > self.orphan_age
+            if orphan:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        with self._lock:
+            self.orphans_removed += removed
+            self.sweeps += 1
+        if removed:
+            logger.info(f"Spool sweep removed {removed} orphaned files from {self.root}")
+        return removed
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'root': self.root,
+                'tmpfs': self.tmpfs,
+                'quota_bytes': self.quota_bytes,
+                'used_bytes': self._used,
+                'peak_bytes': self.peak_bytes,
+                'live_files': len(self._files),
+                'quota_rejections': self.quota_rejections,
+                'orphans_removed': self.orphans_removed,
+                'sweeps': self.sweeps
+            }
+        try:
+            usage = shutil.disk_usage(self.root)
+            stats['filesystem_free_bytes'] = int(usage.free)
+        except OSError:
+            pass
+        return stats
+
+
+class SpoolSession:
+    """Files created for one request; all released on close()/exit"""
+    def __init__(self, manager):
+        self.manager = manager
+        self.paths = []
+
+    def new_file(self, name, expected_bytes=0):
+        path = self.manager.new_file(name, expected_bytes)
+        self.paths.append(path)
+        return path
+
+    def commit(self, path):
+        return self.manager.commit(path)
+
+    def close(self):
+        paths, self.paths = self.paths, []
+        for path in paths:
+            self.manager.release(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def build_spool(fallback_dir):
+    quota = int(float(os.environ.get('ASR_SPOOL_QUOTA_MB', DEFAULT_QUOTA_BYTES / (1024 * 1024))) * 1024 * 1024)
+    root = os.environ.get('ASR_SPOOL_DIR') or choose_spool_root(fallback_dir, quota)
+    return SpoolManager(
+        root,
+        quota_bytes=quota,
+        orphan_age=float(os.environ.get('ASR_SPOOL_ORPHAN_AGE', DEFAULT_ORPHAN_AGE)),
+        sweep_interval=float(os.environ.get('ASR_SPOOL_SWEEP_INTERVAL', DEFAULT_SWEEP_INTERVAL))
+    )
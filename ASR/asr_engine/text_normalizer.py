@@ -0,0 +1,272 @@
+"""
+Transcript normalizer with a configurable rule table and a protected lexicon.
+
+The model emits Swedish å/ä/ö as the digraphs aw/ae/oe. Plain rules are
+applied as a chain of str.replace calls, longest pattern first, skipping a
+rule when its first character does not occur. CPython runs those at memcpy
+speed, and on an hour-long transcript the chain is several times faster than
+a single-pass regex scan over the same text. Rules
+anchored to word boundaries are compiled into one regex alternation, applied
+in a single scan before the chain, and only when the table has any.
+
+Rules are dicts: {'pattern': 'ae', 'replacement': 'ä', 'boundary': None}
+where boundary is None (match anywhere), 'word', 'start' or 'end'.
+
+Lexicon entries protect (or rewrite) whole words that legitimately contain a
+digraph, e.g. 'anaerob' or 'Mikael'. They are matched at word boundaries in
+lowercase, Capitalized or UPPERCASE spelling and take priority over the
+digraph rules. A trailing '*' matches the word stem plus any suffix
+('anaerob*' covers 'anaeroba'). An entry 'src<TAB>dst' rewrites the exact
+word src to dst instead of keeping it. Small regexes that start with a rule
+literal first decide whether any lexicon word can occur at all. Only then is
+the transcript split around the words (a prefix-trie regex) and the rules
+applied to the pieces in between.
+
+Custom tables: ASR_NORMALIZER_RULES (JSON list of rules) and
+ASR_NORMALIZER_LEXICON (text file, one entry per line, '#' comments).
+"""
+import os
+import re
+import json
+import logging
+import collections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES = [
+    {'pattern': 'aw', 'replacement': 'å'},
+    {'pattern': 'ae', 'replacement': 'ä'},
+    {'pattern': 'oe', 'replacement': 'ö'},
+    {'pattern': 'AW', 'replacement': 'Å'},
+    {'pattern': 'AE', 'replacement': 'Ä'},
+    {'pattern': 'OE', 'replacement': 'Ö'},
+    {'pattern': '⁇', 'replacement': ''},
+]
+
+DEFAULT_LEXICON = [
+    'aerob*', 'anaerob*', 'aerosol*', 'aeruginosa', 'haemophilus', 'haemolyticus',
+    'koefficient*', 'poet*', 'poesi*',
+    'mikael', 'michael', 'rafael', 'israel', 'joel', 'noel',
+]
+
+_BOUNDARY_WRAP = {
+    None: '{}',
+    'word': r'(?<!\w){}(?!\w)',
+    'start': r'(?<!\w){}',
+    'end': r'{}(?!\w)',
+}
+
+
+def load_rules(path):
+    with open(path, 'r', encoding='utf-8') as fh:
+        rules = json.load(fh)
+    for r in rules:
+        if r.get('boundary') not in _BOUNDARY_WRAP:
+            raise ValueError(f"Unknown boundary {r.get('boundary')!r} in rule {r}")
+    return rules
+
+
+def load_lexicon(path):
+    entries = []
+    with open(path, 'r', encoding='utf-8') as fh:
+        for line in fh:
+            s = line.strip()
+            if not s or s.startswith('#'):
+                continue
+            if '\t' in s:
+                src, dst = s.split('\t', 1)
+                entries.append((src.strip(), dst.strip()))
+            else:
+                entries.append(s)
+    return entries
+
+
+def _case_insensitive(ch):
+    if ch.lower() != ch.upper():
+        return '[' + re.escape(ch.lower()) + re.escape(ch.upper()) + ']'
+    return re.escape(ch)
+
+
+def _trie_pattern(words, case_insensitive=True):
+    """Compile lexicon words into a prefix-trie regex; '*' marks a stem"""
+    tree = {}
+    for w in words:
+        node = tree
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def emit(node):
+        alternatives = []
+        terminal = False
+        for ch, sub in sorted(node.items()):
+            if ch == '':
+                terminal = True
+                continue
+            if ch == '*':
+                head = r'\w*'
+            else:
+                head = _case_insensitive(ch) if case_insensitive else re.escape(ch)
+            alternatives.append(head + emit(sub))
+        if not alternatives:
+            return ''
+        body = '(?:' + '|'.join(alternatives) + ')'
+        return body + '?' if terminal else body
+
+    return emit(tree)
+
+
+class _ReplacementTable(dict):
+    """Rule literals map directly; anything else matched is a lexicon word"""
+    def __init__(self, literals, lexicon_map):
+        super().__init__(literals)
+        self.lexicon_map = lexicon_map
+
+    def __missing__(self, matched):
+        return self.lexicon_map.get(matched.lower(), matched)
+
+
+class TextNormalizer:
+    def __init__(self, rules=None, lexicon=None):
+        self.rules = list(DEFAULT_RULES if rules is None else rules)
+        self.lexicon = list(DEFAULT_LEXICON if lexicon is None else lexicon)
+        self._compile()
+
+    def _compile(self):
+        literals = {}
+        lexicon_map = {}
+        self._chain = []
+        bounded = []
+
+        # Longest pattern first, so a longer rule is not pre-empted by a shorter one inside it
+        ordered = sorted(enumerate(self.rules), key=lambda ir: (-len(ir[1]['pattern']), ir[0]))
+        for _, rule in ordered:
+            pattern, replacement = rule['pattern'], rule['replacement']
+            if literals.get(pattern, replacement) != replacement:
+                raise ValueError(f"Conflicting replacements for {pattern!r}")
+            literals[pattern] = replacement
+            if rule.get('boundary') is None:
+                self._chain.append((pattern, replacement))
+            else:
+                bounded.append(_BOUNDARY_WRAP[rule['boundary']].format(re.escape(pattern)))
+        self._bounded = re.compile('(' + '|'.join(bounded) + ')') if bounded else None
+
+        words = []
+        for entry in self.lexicon:
+            src, dst = entry if isinstance(entry, tuple) else (entry, None)
+            if not src:
+                continue
+            words.append(src.lower())
+            if dst is not None:
+                lexicon_map[src.lower()] = dst
+        self._lexicon = None
+        self._gates = []
+        self._anchorless = None
+        if words:
+            # The lookahead lets the regex skip word starts that cannot begin a lexicon entry
+            first_chars = sorted({c for w in words for c in (w[0].lower(), w[0].upper())})
+            lookahead = '(?=[' + ''.join(re.escape(c) for c in first_chars) + '])'
+            self._lexicon = re.compile(r'(\b' + lookahead + _trie_pattern(words) + r'\b)')
+            self._compile_gates(words, [r['pattern'].lower() for r in self.rules])
+        self._table = _ReplacementTable(literals, lexicon_map)
+
+    def _compile_gates(self, words, patterns):
+        """
+        Cheap presence checks for the lexicon, for each word in lowercase, Capitalized and
+        UPPERCASE spelling. A spelling is anchored at the first rule pattern it contains. The gate
+        for an anchor starts with that literal, so the regex engine only tries it where the anchor
+        occurs; the rest of the word is matched and its start checked with a lookbehind. Words that
+        contain no rule pattern fall back to the trie on the lowercased text.
+        """
+        anchored = collections.defaultdict(lambda: collections.defaultdict(set))  # anchor -> rest -> spellings
+        anchorless = []
+        for w in words:
+            stem = w.rstrip('*')
+            found = False
+            for spelling in {stem, stem.capitalize(), stem.upper()}:
+                hits = [(spelling.find(c), -len(c), c) for p in patterns if p
+                        for c in {p, p.capitalize(), p.upper()} if spelling.find(c) >= 0]
+                if not hits:
+                    continue
+                at, _, anchor = min(hits)
+                anchored[anchor][spelling[at + len(anchor):]].add(spelling if at else '')
+                found = True
+            if not found:
+                anchorless.append(w)
+        for anchor, rests in anchored.items():
+            alternatives = []
+            for rest, spellings in sorted(rests.items()):
+                # An empty spelling means the word starts with the anchor and needs no lookbehind
+                checks = '' if '' in spellings else \
+                    '(?:' + '|'.join(f'(?<={re.escape(sp)})' for sp in sorted(spellings)) + ')'
+                alternatives.append(re.escape(rest) + checks)
+            self._gates.append((anchor[0], re.compile(re.escape(anchor) + '(?:' + '|'.join(alternatives) + ')')))
+        if anchorless:
+            self._anchorless = re.compile(_trie_pattern(anchorless, case_insensitive=False))
+
+    def _may_contain_lexicon(self, text):
+        for first, gate in self._gates:
+            if first in text and gate.search(text) is not None:
+                return True
+        return self._anchorless is not None and self._anchorless.search(text.lower()) is not None
+
+    def _apply_rules(self, text):
+        if self._bounded is not None:
+            parts = self._bounded.split(text)
+            parts[1::2] = map(self._table.__getitem__, parts[1::2])
+            text = ''.join(parts)
+        for pattern, replacement in self._chain:
+            # A one-character membership test is a memchr; it skips e.g. the uppercase rules
+            if pattern[0] in text:
+                text = text.replace(pattern, replacement)
+        return text
+
+    def normalize(self, text):
+        if not text:
+            return text
+        if self._lexicon is None or not self._may_contain_lexicon(text):
+            return self._apply_rules(text)
+        # Lexicon words (odd indices) are kept or rewritten; the rules run on the text between them
+        parts = self._lexicon.split(text)
+        parts[0::2] = map(self._apply_rules, parts[0::2])
+        parts[1::2] = map(self._table.__missing__, parts[1::2])
+        return ''.join(parts)
+
+    __call__ = normalize
+
+
+def legacy_post_process(text):
+    """Reference implementation kept for benchmarks: one str.replace per rule"""
+    replacements = {
+        "aw": "å", "ae": "ä", "oe": "ö",
+        "AW": "Å", "AE": "Ä", "OE": "Ö",
+        "⁇": ""
+    }
+
+    for old, new in replacements.items():
+        text = text.replace(old, new)
+
+    return text
+
+
+def build_default_normalizer():
+    rules = None
+    lexicon = None
+    rules_path = os.environ.get('ASR_NORMALIZER_RULES')
+    lexicon_path = os.environ.get('ASR_NORMALIZER_LEXICON')
+    try:
+        if rules_path:
+            rules = load_rules(rules_path)
+        if lexicon_path:
+            lexicon = DEFAULT_LEXICON + load_lexicon(lexicon_path)
+    except Exception as e:
+        logger.error(f"Failed to load normalizer tables, using defaults: {e}")
+        rules, lexicon = None, None
+    return TextNormalizer(rules, lexicon)
+
+
+default_normalizer = build_default_normalizer()
+
+
+def normalize_text(text):
+    return default_normalizer.normalize(text)
@@ -0,0 +1,167 @@
+"""
+Per-request trace ids and stage timing.
+
+A RequestTrace is bound to the current context for the duration of a
+request; code anywhere below the route can time a stage with
+
+    with current_trace().stage('resample'):
+        ...
+
+without the trace being threaded through every call. When no trace is bound
+current_trace() returns a no-op trace, so scripts pay nothing.
+"""
+import re
+import time
+import uuid
+import logging
+import contextvars
+from contextlib import contextmanager
+
+# Stage order used when rendering timings; unknown stages are appended after these
+STAGES = ['receive', 'save', 'audio_decode', 'resample', 'ingest_overlap', 'preprocess_wait', 'probe', 'coalesce_key',
+          'queue', 'coalesce_wait', 'preprocess', 'encode', 'decode', 'post_process', 'cleanup']
+
+_TRACE_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+_current = contextvars.ContextVar('asr_request_trace', default=None)
+
+
+class RequestTrace:
+    def __init__(self, trace_id=None, detailed=False):
+        if not trace_id or not _TRACE_ID_RE.match(trace_id):
+            trace_id = uuid.uuid4().hex[:16]
+        self.trace_id = trace_id
+        # detailed traces synchronize CUDA at model stage boundaries for exact numbers
+        self.detailed = detailed
+        self.started = time.perf_counter()
+        self.timings = {}
+        self._open = {}
+
+    def add(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0)
+
+    def start(self, name):
+        self._open[name] = time.perf_counter()
+
+    def stop(self, name):
+        t0 = self._open.pop(name, None)
+        if t0 is not None:
+            self.add(name, time.perf_counter() - t0)
+
+    def total_of(self, *names):
+        return sum(self.timings.get(n, 0.0) for n in names)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        ordered = [s for s in STAGES if s in self.timings] + [s for s in self.timings if s not in STAGES]
+        out = {s: float(round(self.timings[s], 4)) for s in ordered}
+        out['total'] = float(round(self.elapsed(), 4))
+        return out
+
+    def server_timing(self):
+        """Render as a Server-Timing header value (milliseconds)"""
+        return ', '.join(f"{name};dur={secs * 1000:.1f}" for name, secs in self.as_dict().items())
+
+
+class _NullTrace:
+    trace_id = '-'
+    detailed = False
+
+    def add(self, name, seconds):
+        pass
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def start(self, name):
+        pass
+
+    def stop(self, name):
+        pass
+
+    def total_of(self, *names):
+        return 0.0
+
+
+NULL_TRACE = _NullTrace()
+
+
+def current_trace():
+    trace = _current.get()
+    return trace if trace is not None else NULL_TRACE
+
+
+def bind_trace(trace):
+    """Bind trace to the current context; returns a token for unbind_trace"""
+    return _current.set(trace)
+
+
+def unbind_trace(token):
+    _current.reset(token)
+
+
+@contextmanager
+def activate(trace):
+    """Bind trace inside another thread (contextvars do not follow thread hand-offs)"""
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+class TraceIdFilter(logging.Filter):
+    def filter(self, record):
+        record.trace_id = current_trace().trace_id
+        return True
+
+
+def install_log_filter(fmt='%(asctime)s %(levelname)s [%(trace_id)s] %(name)s: %(message)s'):
+    """Add the trace id to every record emitted through the root handlers"""
+    root = logging.getLogger()
+    for handler in root.handlers:
+        if not any(isinstance(f, TraceIdFilter) for f in handler.filters):
+            handler.addFilter(TraceIdFilter())
+        if fmt:
+            handler.setFormatter(logging.Formatter(fmt))
+
+
+def install_model_stage_hooks(model, stages=(('preprocessor', 'preprocess'), ('encoder', 'encode'))):
+    """Time NeMo preprocessor/encoder forwards into the current trace"""
+    import torch
+
+    def sync(trace):
+        if trace.detailed and torch.cuda.is_available():
+            torch.cuda.synchronize()
+
+    handles = []
+    for attr, stage in stages:
+        module = getattr(model, attr, None)
+        if module is None or not hasattr(module, 'register_forward_hook'):
+            continue
+
+        def pre_hook(_module, _inputs, stage=stage):
+            trace = current_trace()
+            if trace is not NULL_TRACE:
+                sync(trace)
+                trace.start(stage)
+
+        def post_hook(_module, _inputs, _outputs, stage=stage):
+            trace = current_trace()
+            if trace is not NULL_TRACE:
+                sync(trace)
+                trace.stop(stage)
+
+        handles.append(module.register_forward_pre_hook(pre_hook))
+        handles.append(module.register_forward_hook(post_hook))
+    return handles
@@ -0,0 +1,102 @@
+"""
+Word-level timings and confidence from the RNNT decoder's own frame alignments.
+
+Nothing here runs unless a caller asks for word timestamps: the normal
+decoding config is untouched, and word_timestamp_cfg() derives the variant
+that makes the decoder keep alignments and per-frame confidence. Beam search
+does not produce confidence in NeMo, so those words report confidence None.
+Each word goes through the transcript normalizer (digraphs to å/ä/ö, lexicon
+words kept), so words[] spells words the way the text does; a word that
+normalizes to nothing (e.g. '⁇') is dropped, as it is from the text.
+"""
+import copy
+import logging
+
+from asr_engine.text_normalizer import normalize_text
+
+logger = logging.getLogger(__name__)
+
+CONFIDENCE_CFG = {
+    'preserve_frame_confidence': True,
+    'preserve_word_confidence': True,
+    'aggregation': 'min',
+    'exclude_blank': True
+}
+
+
+def word_timestamps_requested(value):
+    return (value or '').strip().lower() == 'word'
+
+
+def word_timestamp_cfg(cfg):
+    """Copy of a decoding cfg dict that also computes word timestamps and confidence"""
+    cfg = copy.deepcopy(cfg)
+    cfg['compute_timestamps'] = True
+    cfg['preserve_alignments'] = True
+    if cfg.get('strategy') == 'greedy':
+        greedy = cfg.setdefault('greedy', {})
+        greedy['preserve_alignments'] = True
+        greedy['preserve_frame_confidence'] = True
+        # The CUDA graph decoder does not keep per-frame confidence
+        greedy['use_cuda_graph_decoder'] = False
+        cfg['confidence_cfg'] = dict(CONFIDENCE_CFG)
+    else:
+        cfg.setdefault('beam', {})['preserve_alignments'] = True
+    return cfg
+
+
+def frame_seconds(model):
+    """Duration of one encoder output frame"""
+    cfg = getattr(model, 'cfg', None)
+    try:
+        stride = float(cfg.preprocessor.window_stride)
+    except Exception:
+        stride = 0.01
+    try:
+        subsampling = int(cfg.encoder.get('subsampling_factor', 1) or 1)
+    except Exception:
+        subsampling = 1
+    return stride * subsampling
+
+
+def _as_float(value):
+    try:
+        return float(value.item()) if hasattr(value, 'item') else float(value)
+    except Exception:
+        return None
+
+
+def extract_words(hypothesis, seconds_per_frame, offset=0.0):
+    """[{'word', 'start', 'end', 'confidence'}] from a NeMo Hypothesis"""
+    stamps = getattr(hypothesis, 'timestamp', None) or getattr(hypothesis, 'timestep', None)
+    if not isinstance(stamps, dict):
+        return []
+    words = stamps.get('word') or []
+    confidence = getattr(hypothesis, 'word_confidence', None) or []
+    out = []
+    for i, w in enumerate(words):
+        word = normalize_text(str(w.get('word', ''))).strip()
+        if not word:
+            continue
+        if 'start' in w and 'end' in w:
+            start, end = _as_float(w['start']), _as_float(w['end'])
+        else:
+            start = _as_float(w.get('start_offset', 0)) * seconds_per_frame
+            end = _as_float(w.get('end_offset', 0)) * seconds_per_frame
+        out.append({
+            'word': word,
+            'start': round(start + offset, 3),
+            'end': round(end + offset, 3),
+            'confidence': round(_as_float(confidence[i]), 4) if i < len(confidence) else None
+        })
+    return out
+
+
+def merge_chunk_words(merged, words):
+    """Append words of the next overlapping chunk, dropping ones already covered"""
+    last_end = merged[-1]['end'] if merged else None
+    for w in words:
+        if last_end is not None and w['start'] < last_end:
+            continue
+        merged.append(w)
+    return merged
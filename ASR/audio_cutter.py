@@ -7,41 +7,38 @@ Notes:
 - Names outputs sequentially: sample_001.wav, sample_002.wav, ...
 """
 import os
-import math
 import argparse
-import librosa
 import numpy as np
 import soundfile as sf
 
+from asr_engine.block_reader import iter_chunks
+
 def ensure_dir(p):
     if not os.path.exists(p):
         os.makedirs(p, exist_ok=True)
 
 def slice_wav(input_path, output_dir, chunk_seconds=30, target_sr=16000, prefix='sample', start_index=1):
     ensure_dir(output_dir)
-    audio, sr = librosa.load(input_path, sr=target_sr, mono=True)
     samples_per_chunk = int(chunk_seconds * target_sr)
-    total_samples = len(audio)
-    if total_samples == 0:
-        num_chunks = 1
-    else:
-        num_chunks = math.ceil(total_samples / samples_per_chunk)
-    for i in range(num_chunks):
-        start = i * samples_per_chunk
-        end = start + samples_per_chunk
-        chunk = audio[start:end]
-        if len(chunk) < samples_per_chunk:
-            pad = np.zeros(samples_per_chunk - len(chunk), dtype=np.float32)
-            if len(chunk) == 0:
-                chunk = pad
-            else:
-                chunk = np.concatenate([chunk.astype(np.float32), pad])
+    # Read block by block so multi-hour inputs never have to fit in memory
+    written = 0
+    for _, chunk in iter_chunks(input_path, chunk_seconds, 0, target_sr=target_sr):
+        write_chunk(chunk, samples_per_chunk, output_dir, target_sr, f"{prefix}_{start_index + written:03d}.wav")
+        written += 1
+    if written == 0:
+        write_chunk(np.zeros(0, dtype=np.float32), samples_per_chunk, output_dir, target_sr, f"{prefix}_{start_index:03d}.wav")
+
+def write_chunk(chunk, samples_per_chunk, output_dir, target_sr, name):
+    if len(chunk) < samples_per_chunk:
+        pad = np.zeros(samples_per_chunk - len(chunk), dtype=np.float32)
+        if len(chunk) == 0:
+            chunk = pad
         else:
-            chunk = chunk.astype(np.float32)
-        idx = start_index + i
-        name = f"{prefix}_{idx:03d}.wav"
-        out_path = os.path.join(output_dir, name)
-        sf.write(out_path, chunk, target_sr)
+            chunk = np.concatenate([chunk.astype(np.float32), pad])
+    else:
+        chunk = chunk.astype(np.float32)
+    out_path = os.path.join(output_dir, name)
+    sf.write(out_path, chunk, target_sr)
 
 def main():
     parser = argparse.ArgumentParser()
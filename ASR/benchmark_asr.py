@@ -5,17 +5,19 @@ Usage (benchmarks hard-coded models/checkpoints):
 Notes:
 - Model sources are embedded in DEFAULT_MODEL_SOURCES.
 - Supports greedy and beam decoding for fair comparisons.
+- Models run on asr_engine.model.NeMoASRModel (the servers' engine), so audio
+  conversion, precision, decoding configs and post-processing match production.
 """
 import os
 import argparse
 import csv
 import tempfile
 import time
-import torch
 import librosa
 import soundfile as sf
-import nemo.collections.asr as nemo_asr
-from omegaconf import DictConfig
+
+from asr_engine.model import NeMoASRModel
+from asr_engine.audio import convert_to_temp_wav
 
 DEFAULT_MODEL_SOURCES = [
     "/home/harinder.bedi/BENCHMARK/MODELS_COPIED/Speech_To_Text_Finetuning.nemo",
@@ -26,100 +28,22 @@ DEFAULT_MODEL_SOURCES = [
     "/opt/aitraining/models/nemo_experiments_med_2/Speech_To_Text_Finetuning/2025-09-25_10-14-40",
 ]
 
-class ASRWrapper:
-    def __init__(self, model_path, strategy='greedy', beam_size=4):
-        self.model_path = model_path
+class ASRWrapper(NeMoASRModel):
+    """The production engine with the benchmark's call signature"""
+    def __init__(self, model_path, strategy='greedy', beam_size=4, precision=None):
         self.strategy = strategy
-        self.beam_size = beam_size
-        self.model = None
-        self.initialized = False
-        self.initialize()
-
-    def initialize(self):
-        if self.model_path.endswith('.ckpt'):
-            self.model = nemo_asr.models.ASRModel.load_from_checkpoint(self.model_path)
-        else:
-            self.model = nemo_asr.models.ASRModel.restore_from(self.model_path)
-        self.model = self.model.half()
-        self.set_decoding(self.strategy, self.beam_size)
-        self.initialized = True
+        super().__init__(model_path, decoding_strategy=strategy, beam_size=beam_size,
+                         precision=precision, verbose=False)
 
     def set_decoding(self, strategy='greedy', beam_size=4):
-        if strategy == 'greedy':
-            cfg = DictConfig({
-                'strategy': 'greedy',
-                'greedy': {
-                    'max_symbols_per_step': 10,
-                    'preserve_alignments': False,
-                    'preserve_frame_confidence': False,
-                    'loop_labels': True,
-                    'use_cuda_graph_decoder': True
-                },
-                'compute_hypothesis_token_set': False,
-                'preserve_alignments': False
-            })
-        elif strategy == 'beam':
-            cfg = DictConfig({
-                'strategy': 'beam',
-                'beam': {
-                    'beam_size': beam_size,
-                    'search_type': 'default',
-                    'score_norm': True,
-                    'return_best_hypothesis': True,
-                    'softmax_temperature': 1.0,
-                    'preserve_alignments': False
-                },
-                'compute_hypothesis_token_set': False,
-                'preserve_alignments': False
-            })
-        else:
-            cfg = DictConfig({
-                'strategy': 'greedy',
-                'greedy': {
-                    'max_symbols_per_step': 10,
-                    'preserve_alignments': False,
-                    'preserve_frame_confidence': False,
-                    'loop_labels': True,
-                    'use_cuda_graph_decoder': True
-                },
-                'compute_hypothesis_token_set': False,
-                'preserve_alignments': False
-            })
-        self.model.change_decoding_strategy(cfg)
-
-    def _extract_text(self, transcription):
-        try:
-            if isinstance(transcription, list):
-                if len(transcription) > 0:
-                    result = transcription[0]
-                    if hasattr(result, 'item'):
-                        return str(result.item())
-                    elif hasattr(result, 'text'):
-                        return str(result.text)
-                    else:
-                        return str(result)
-                else:
-                    return ''
-            elif isinstance(transcription, torch.Tensor):
-                return str(transcription.item()) if transcription.numel() == 1 else str(transcription.tolist())
-            elif hasattr(transcription, 'text'):
-                return str(transcription.text)
-            else:
-                return str(transcription)
-        except Exception:
-            return str(transcription)
+        self.strategy = strategy
+        self.set_decoding_strategy(strategy, beam_size)
 
     def transcribe(self, audio_path):
-        with torch.no_grad():
-            result = self.model.transcribe([audio_path], batch_size=1)
-        return self._extract_text(result)
+        return self.transcribe_audio(audio_path)['text']
 
 def convert_to_wav(input_path):
-    audio, sr = librosa.load(input_path, sr=16000, mono=True)
-    f = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
-    f.close()
-    sf.write(f.name, audio, sr)
-    return f.name
+    return convert_to_temp_wav(input_path)
 
 def trim_to_30s(input_path):
     audio, sr = librosa.load(input_path, sr=16000, mono=True, offset=0.0, duration=30.0)
@@ -197,7 +121,7 @@ def resolve_model_file(path_or_dir):
         return candidates[0] if candidates else None
     return None
 
-def run_benchmark(samples_dir, gt_dir, output_csv, strategy, beam_size, model_list_path):
+def run_benchmark(samples_dir, gt_dir, output_csv, strategy, beam_size, model_list_path, precision=None):
     audio_files = list_audio_files(samples_dir)
     alias_specs = read_model_aliases(model_list_path)
     alias_model_paths = []
@@ -214,7 +138,7 @@ def run_benchmark(samples_dir, gt_dir, output_csv, strategy, beam_size, model_li
             models.append(None)
             continue
         try:
-            m = ASRWrapper(mp, strategy=strategy, beam_size=beam_size)
+            m = ASRWrapper(mp, strategy=strategy, beam_size=beam_size, precision=precision)
             models.append(m)
         except Exception:
             models.append(None)
@@ -263,8 +187,9 @@ def main():
     parser.add_argument('--strategy', type=str, default='greedy', choices=['greedy', 'beam'])
     parser.add_argument('--beam-size', type=int, default=4)
     parser.add_argument('--model-list', type=str, default=os.path.join('test-data', 'models', 'model_list.txt'))
+    parser.add_argument('--precision', type=str, default='auto', choices=['auto', 'fp32', 'bf16', 'fp16'])
     args = parser.parse_args()
-    run_benchmark(args.samples_dir, args.gt_dir, args.output, args.strategy, args.beam_size, args.model_list)
+    run_benchmark(args.samples_dir, args.gt_dir, args.output, args.strategy, args.beam_size, args.model_list, args.precision)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,140 @@
+"""
+Usage:
+  python benchmark_capture_formats.py --samples-dir ./test-data/audio --repeats 5
+
+Notes:
+- Measures server CPU time (process_time) spent turning one uploaded recording
+  into the 16 kHz PCM_16 WAV the model reads, for each way the UI can send it:
+    browser_48k_wav   48 kHz upload: sf.read + kaiser_best resample + write
+    browser_webm      webm/opus from MediaRecorder via the decoder pool (needs PyAV or ffmpeg)
+    pcm16_worklet     16 kHz mono int16 WAV from the AudioWorklet capture: streaming ingest only
+- Each sample is re-encoded to the browser-side format first; that cost is not measured.
+- Reports CPU ms per request and per audio second, and the saving of pcm16_worklet
+  against each other path.
+"""
+import io
+import os
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import soundfile as sf
+
+from asr_engine.stream_ingest import ingest_to_wav
+from asr_engine.audio_decoder import decoder_pool
+
+BROWSER_SR = 48000
+TARGET_SR = 16000
+
+
+def list_audio_files(d):
+    exts = ('.wav', '.flac', '.ogg', '.mp3', '.m4a')
+    return sorted(os.path.join(d, f) for f in os.listdir(d) if f.lower().endswith(exts))
+
+
+def to_rate(data, sr, target):
+    import librosa
+    return librosa.resample(data, orig_sr=sr, target_sr=target) if sr != target else data
+
+
+def encode_webm(data, sr, path):
+    import av
+    with av.open(path, 'w', format='webm') as container:
+        stream = container.add_stream('libopus', rate=sr)
+        frame = av.AudioFrame.from_ndarray(data.reshape(1, -1).astype(np.float32), format='flt', layout='mono')
+        frame.sample_rate = sr
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+
+
+def convert_48k(path, out_path):
+    import librosa
+    data, sr = sf.read(path, dtype='float32')
+    if data.ndim > 1:
+        data = data.mean(axis=1)
+    data = librosa.resample(data, orig_sr=sr, target_sr=TARGET_SR, res_type='kaiser_best')
+    data = data / max(float(np.max(np.abs(data))), 1e-9) * 0.95
+    sf.write(out_path, data, TARGET_SR, subtype='PCM_16')
+
+
+def convert_webm(path, out_path):
+    data = decoder_pool.decode(path)
+    data = data / max(float(np.max(np.abs(data))), 1e-9) * 0.95
+    sf.write(out_path, data, TARGET_SR, subtype='PCM_16')
+
+
+def convert_pcm16(body, out_path):
+    ingest_to_wav(io.BytesIO(body), 'wav', out_path, mimetype='audio/wav', content_length=len(body))
+
+
+def cpu_time(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        t0 = time.process_time()
+        fn()
+        samples.append(time.process_time() - t0)
+    return float(np.median(samples))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--samples-dir', type=str, default=os.path.join('test-data', 'audio'))
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', type=str, default='capture_formats_results.json')
+    args = parser.parse_args()
+
+    totals = {'browser_48k_wav': 0.0, 'browser_webm': 0.0, 'pcm16_worklet': 0.0}
+    webm_ok = True
+    audio_seconds = 0.0
+    with tempfile.TemporaryDirectory() as tmp:
+        out_path = os.path.join(tmp, 'out.wav')
+        for path in list_audio_files(args.samples_dir):
+            data, sr = sf.read(path, dtype='float32')
+            if data.ndim > 1:
+                data = data.mean(axis=1)
+            audio_seconds += len(data) / sr
+            stem = os.path.splitext(os.path.basename(path))[0]
+
+            wav48 = os.path.join(tmp, stem + '_48k.wav')
+            sf.write(wav48, to_rate(data, sr, BROWSER_SR), BROWSER_SR, subtype='FLOAT')
+            totals['browser_48k_wav'] += cpu_time(lambda: convert_48k(wav48, out_path), args.repeats)
+
+            if webm_ok:
+                webm = os.path.join(tmp, stem + '.webm')
+                try:
+                    encode_webm(to_rate(data, sr, BROWSER_SR), BROWSER_SR, webm)
+                    totals['browser_webm'] += cpu_time(lambda: convert_webm(webm, out_path), args.repeats)
+                except Exception as e:
+                    print(f"Skipping webm path: {e}")
+                    webm_ok = False
+
+            buf = io.BytesIO()
+            sf.write(buf, to_rate(data, sr, TARGET_SR), TARGET_SR, format='WAV', subtype='PCM_16')
+            body = buf.getvalue()
+            totals['pcm16_worklet'] += cpu_time(lambda: convert_pcm16(body, out_path), args.repeats)
+
+    files = len(list_audio_files(args.samples_dir))
+    report = {'files': files, 'audio_seconds': round(audio_seconds, 2)}
+    for name, total in totals.items():
+        if name == 'browser_webm' and not webm_ok:
+            continue
+        report[name] = {
+            'cpu_ms_per_request': round(1000 * total / max(files, 1), 2),
+            'cpu_ms_per_audio_second': round(1000 * total / max(audio_seconds, 1e-9), 3)
+        }
+    base = report['pcm16_worklet']['cpu_ms_per_request']
+    report['saved_ms_per_request'] = {
+        name: round(report[name]['cpu_ms_per_request'] - base, 2)
+        for name in ('browser_48k_wav', 'browser_webm') if name in report
+    }
+    with open(args.output, 'w', encoding='utf-8') as fh:
+        json.dump(report, fh, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Usage:
+  python benchmark_long_audio_memory.py --hours 3 --sr 48000
+  python benchmark_long_audio_memory.py --hours 1 --sr 16000 --compare --max-growth-mb 150
+
+Notes:
+- Writes a synthetic multi-hour PCM_16 WAV (generated block by block) and runs
+  each path in a fresh subprocess, reporting peak RSS growth over the
+  post-import baseline:
+    chunks      asr_engine.block_reader.iter_chunks (what the long-audio transcriber reads)
+    convert     asr_engine.block_reader.convert_to_wav (upload conversion)
+    full_load   sf.read of the whole file, the previous behaviour (only with --compare)
+- Exits with status 1 when a streaming path grows by more than --max-growth-mb,
+  so it can be used as a memory regression check.
+"""
+import os
+import sys
+import json
+import argparse
+import resource
+import tempfile
+import subprocess
+
+import numpy as np
+import soundfile as sf
+
+STREAMING_MODES = ('chunks', 'convert')
+
+
+def rss_mb():
+    with open('/proc/self/status', 'r') as fh:
+        for line in fh:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+
+def write_synthetic(path, hours, sr, block_seconds=60):
+    rng = np.random.default_rng(0)
+    total = int(hours * 3600 * sr)
+    t = 0
+    with sf.SoundFile(path, mode='w', samplerate=sr, channels=1, subtype='PCM_16') as out:
+        while t < total:
+            n = min(int(block_seconds * sr), total - t)
+            idx = np.arange(t, t + n)
+            block = 0.3 * np.sin(2 * np.pi * 220 * idx / sr) + 0.05 * rng.standard_normal(n)
+            out.write(block.astype(np.float32))
+            t += n
+
+
+def child(mode, path):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from asr_engine.block_reader import iter_chunks, convert_to_wav
+    baseline = rss_mb()
+    if mode == 'chunks':
+        samples = 0
+        for _, chunk in iter_chunks(path, 30, 2):
+            samples += len(chunk)
+    elif mode == 'convert':
+        out = path + '.converted.wav'
+        convert_to_wav(path, out)
+        os.remove(out)
+    else:
+        data, _ = sf.read(path, dtype='float32')
+        del data
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    print(json.dumps({'baseline_mb': round(baseline, 1), 'peak_mb': round(peak, 1),
+                      'growth_mb': round(peak - baseline, 1)}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hours', type=float, default=3.0)
+    parser.add_argument('--sr', type=int, default=48000)
+    parser.add_argument('--compare', action='store_true')
+    parser.add_argument('--max-growth-mb', type=float, default=150.0)
+    parser.add_argument('--keep', type=str, default=None, help='Reuse/keep the synthetic file at this path')
+    parser.add_argument('--child', type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--path', type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.path)
+        return
+
+    tmpdir = None
+    path = args.keep
+    if path is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(tmpdir.name, 'synthetic.wav')
+    if not os.path.exists(path):
+        write_synthetic(path, args.hours, args.sr)
+
+    report = {'hours': args.hours, 'sr': args.sr, 'file_mb': round(os.path.getsize(path) / (1024 * 1024), 1)}
+    failed = False
+    for mode in STREAMING_MODES + (('full_load',) if args.compare else ()):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode, '--path', path],
+                             stdout=subprocess.PIPE, check=True)
+        report[mode] = json.loads(out.stdout.decode().strip().splitlines()[-1])
+        if mode in STREAMING_MODES and report[mode]['growth_mb'] > args.max_growth_mb:
+            report[mode]['over_limit'] = True
+            failed = True
+    print(json.dumps(report, indent=2))
+    if tmpdir is not None:
+        tmpdir.cleanup()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Usage:
+  python benchmark_normalizer.py --gt-dir ./test-data/gt --minutes 60 --repeat 20
+
+Notes:
+- Builds a synthetic transcript of roughly --minutes of speech (150 words/min) by
+  repeating the ground-truth texts re-encoded with the model's aw/ae/oe digraphs.
+- Compares the legacy chained str.replace post-processing with the default
+  normalizer (gated replace chain plus protected lexicon) and reports per-call
+  latency and output differences.
+"""
+import os
+import argparse
+import json
+import time
+
+from asr_engine.text_normalizer import default_normalizer, legacy_post_process
+
+WORDS_PER_MINUTE = 150
+
+
+def encode_digraphs(text):
+    for old, new in (('å', 'aw'), ('ä', 'ae'), ('ö', 'oe'), ('Å', 'AW'), ('Ä', 'AE'), ('Ö', 'OE')):
+        text = text.replace(old, new)
+    return text
+
+
+def build_transcript(gt_dir, minutes):
+    words = []
+    for name in sorted(os.listdir(gt_dir)):
+        if name.endswith('.txt'):
+            with open(os.path.join(gt_dir, name), 'r', encoding='utf-8') as fh:
+                words.extend(encode_digraphs(fh.read()).split())
+    if not words:
+        words = encode_digraphs('jättebra då så ska vi se hur vi har det ⁇').split()
+    target = int(minutes * WORDS_PER_MINUTE)
+    out = []
+    while len(out) < target:
+        out.extend(words)
+    return ' '.join(out[:target])
+
+
+def time_fn(fn, text, repeat):
+    fn(text)
+    best = float('inf')
+    total = 0.0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(text)
+        elapsed = time.perf_counter() - t0
+        total += elapsed
+        best = min(best, elapsed)
+    return {'mean_ms': round(total / repeat * 1000, 3), 'best_ms': round(best * 1000, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gt-dir', type=str, default=os.path.join('test-data', 'gt'))
+    parser.add_argument('--minutes', type=float, default=60)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    text = build_transcript(args.gt_dir, args.minutes)
+    legacy = time_fn(legacy_post_process, text, args.repeat)
+    normalizer = time_fn(default_normalizer.normalize, text, args.repeat)
+
+    legacy_words = legacy_post_process(text).split()
+    compiled_words = default_normalizer.normalize(text).split()
+    changed = sorted({f"{a} -> {b}" for a, b in zip(legacy_words, compiled_words) if a != b})
+
+    print(json.dumps({
+        'chars': len(text),
+        'words': len(text.split()),
+        'legacy': legacy,
+        'normalizer': normalizer,
+        'speedup': round(legacy['mean_ms'] / normalizer['mean_ms'], 2) if normalizer['mean_ms'] else None,
+        'lexicon_differences': changed[:50]
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Usage:
+  python benchmark_precision.py --model /path/to/model.nemo --samples-dir ./test-data/audio --gt-dir ./test-data/gt
+  python benchmark_precision.py --model /path/to/model.nemo --precisions fp32,bf16 --output precision_results.json
+
+Notes:
+- Loads the model once per precision through asr_engine.precision, so the numbers
+  match what the servers run; precisions the device cannot honour are reported
+  under the precision actually selected.
+- Reports mean/p95 latency, RTF and corpus WER against the ground-truth texts.
+"""
+import os
+import re
+import json
+import time
+import argparse
+
+import soundfile as sf
+
+from benchmark_asr import ASRWrapper, list_audio_files, find_gt_in_dir
+
+
+def normalize_for_wer(text):
+    return re.sub(r"[^\w\s]", ' ', text.lower()).split()
+
+
+def edit_distance(ref, hyp):
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1]
+
+
+def run_precision(model_path, precision, audio_files, gt_dir, strategy, beam_size):
+    m = ASRWrapper(model_path, strategy=strategy, beam_size=beam_size, precision=precision)
+    if audio_files:
+        m.transcribe(audio_files[0])  # warm-up (cudnn autotune, allocator)
+    latencies = []
+    audio_total = 0.0
+    errors = 0
+    ref_words = 0
+    for ap in audio_files:
+        stem = os.path.splitext(os.path.basename(ap))[0]
+        t0 = time.perf_counter()
+        hyp = m.transcribe(ap)
+        latencies.append(time.perf_counter() - t0)
+        audio_total += sf.info(ap).duration
+        ref = normalize_for_wer(find_gt_in_dir(gt_dir, stem))
+        if ref:
+            errors += edit_distance(ref, normalize_for_wer(hyp))
+            ref_words += len(ref)
+    latencies.sort()
+    return {
+        'requested': precision,
+        'precision': m.precision.name,
+        'device': m.precision.device,
+        'files': len(audio_files),
+        'latency_mean': round(sum(latencies) / len(latencies), 4) if latencies else None,
+        'latency_p95': round(latencies[int(0.95 * (len(latencies) - 1))], 4) if latencies else None,
+        'rtf': round(sum(latencies) / audio_total, 4) if audio_total else None,
+        'wer': round(errors / ref_words, 4) if ref_words else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', type=str, required=True)
+    parser.add_argument('--samples-dir', type=str, default=os.path.join('test-data', 'audio'))
+    parser.add_argument('--gt-dir', type=str, default=os.path.join('test-data', 'gt'))
+    parser.add_argument('--precisions', type=str, default='fp32,bf16,fp16')
+    parser.add_argument('--strategy', type=str, default='greedy', choices=['greedy', 'beam'])
+    parser.add_argument('--beam-size', type=int, default=4)
+    parser.add_argument('--output', type=str, default='precision_results.json')
+    args = parser.parse_args()
+
+    audio_files = list_audio_files(args.samples_dir)
+    results = [run_precision(args.model, p.strip(), audio_files, args.gt_dir, args.strategy, args.beam_size)
+               for p in args.precisions.split(',') if p.strip()]
+    with open(args.output, 'w', encoding='utf-8') as fh:
+        json.dump(results, fh, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
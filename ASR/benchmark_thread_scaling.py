@@ -0,0 +1,181 @@
+"""
+Usage:
+  python benchmark_thread_scaling.py --model /path/to/model.nemo --samples-dir ./test-data/audio
+  python benchmark_thread_scaling.py --threads 2,4,8 --seconds 20
+  python benchmark_thread_scaling.py --reserved 2 --output thread_scaling.json
+
+Notes:
+- The server runs one inference worker (asr_engine.affinity), so the sweep
+  is over that worker's torch intra-op threads.
+- Each thread count runs in a fresh subprocess and is applied the way the
+  server applies it (asr_engine.affinity: torch intra-op threads and thread
+  env, one core set for the worker thread, --reserved cores left for the
+  shared pools).
+- The worker runs requests back to back until --seconds have passed.
+  With --model it transcribes the sample files with a NeMoASRModel (greedy).
+  Without --model it runs an encoder-sized synthetic torch workload
+  (--frames x --dim transformer layers), so the host can be profiled without
+  a checkpoint.
+- The default thread counts are every power of two below the full budget,
+  and the budget itself. The best count by throughput is reported together
+  with the ASR_INFERENCE_THREADS setting that selects it.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from asr_engine.affinity import available_cpus, plan_cpus, set_thread_budget, pin_current_thread
+
+
+def default_thread_counts(budget):
+    counts = []
+    t = 1
+    while t < budget:
+        counts.append(t)
+        t *= 2
+    counts.append(budget)
+    return counts
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+def make_workload(args):
+    """fn() running one request and returning the audio seconds it processed"""
+    if args.model:
+        from benchmark_asr import list_audio_files
+        from asr_engine.model import NeMoASRModel
+        from asr_engine.audio import probe_duration
+        files = list_audio_files(args.samples_dir)
+        if not files:
+            raise SystemExit(f"No audio files in {args.samples_dir}")
+        model = NeMoASRModel(args.model, decoding_strategy='greedy', compile_model=False, verbose=False)
+        durations = {p: probe_duration(p) or 0.0 for p in files}
+        counter = iter(range(10 ** 9))
+
+        def run_model():
+            path = files[next(counter) % len(files)]
+            model.transcribe_audio(path, durations[path])
+            return durations[path]
+        return run_model
+
+    import torch
+    layers = torch.nn.Sequential(*[torch.nn.TransformerEncoderLayer(args.dim, 8, args.dim * 4, batch_first=True)
+                                   for _ in range(args.layers)]).eval()
+    x = torch.randn(1, args.frames, args.dim)
+    # frames at the usual 80 ms encoder stride
+    audio_seconds = args.frames * 0.08
+
+    def run_synthetic():
+        with torch.inference_mode():
+            layers(x)
+        return audio_seconds
+    return run_synthetic
+
+
+def child(args):
+    plan = plan_cpus(args.threads, reserved=args.reserved)
+    if plan is None:
+        print(json.dumps({'error': 'thread count does not fit the available CPUs'}))
+        return
+    set_thread_budget(args.threads, args.interop)
+    if plan['shared']:
+        pin_current_thread(plan['shared'])
+    work = make_workload(args)
+    work()  # warm-up
+
+    latencies = []
+    audio = [0.0]
+    deadline = time.perf_counter() + args.seconds
+
+    def worker():
+        pin_current_thread(plan['inference']['cpus'])
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            audio[0] += work()
+            latencies.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        'threads': args.threads,
+        'requests': len(latencies),
+        'requests_per_s': round(len(latencies) / elapsed, 3),
+        'audio_s_per_s': round(audio[0] / elapsed, 2),
+        'latency_p50': round(percentile(latencies, 50), 4),
+        'latency_p95': round(percentile(latencies, 95), 4),
+        'plan': plan
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', type=str, default=None)
+    parser.add_argument('--samples-dir', type=str, default=os.path.join('test-data', 'audio'))
+    parser.add_argument('--threads', type=str, default=None, help='Comma-separated intra-op thread counts, e.g. 2,4,8')
+    parser.add_argument('--reserved', type=int, default=1, help='Cores left for Flask and the preprocess pools')
+    parser.add_argument('--interop', type=int, default=1)
+    parser.add_argument('--seconds', type=float, default=15.0)
+    parser.add_argument('--frames', type=int, default=250)
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--layers', type=int, default=4)
+    parser.add_argument('--output', type=str, default='thread_scaling_results.json')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.threads = int(args.threads)
+        child(args)
+        return
+
+    cpus = available_cpus()
+    budget = max(1, len(cpus) - args.reserved)
+    if args.threads:
+        counts = [int(x) for x in args.threads.split(',') if x.strip()]
+    else:
+        counts = default_thread_counts(budget)
+    passthrough = ['--reserved', str(args.reserved), '--interop', str(args.interop), '--seconds', str(args.seconds),
+                   '--frames', str(args.frames), '--dim', str(args.dim), '--layers', str(args.layers),
+                   '--samples-dir', args.samples_dir]
+    if args.model:
+        passthrough += ['--model', args.model]
+
+    results = []
+    for threads in counts:
+        cmd = [sys.executable, os.path.abspath(__file__), '--child', '--threads', str(threads)] + passthrough
+        out = subprocess.run(cmd, stdout=subprocess.PIPE, check=True)
+        result = json.loads(out.stdout.decode().strip().splitlines()[-1])
+        result.setdefault('threads', threads)
+        results.append(result)
+        print(json.dumps({k: v for k, v in result.items() if k != 'plan'}))
+
+    ok = [r for r in results if 'error' not in r]
+    best = max(ok, key=lambda r: r['audio_s_per_s']) if ok else None
+    report = {
+        'cpus': len(cpus),
+        'reserved': args.reserved,
+        'workload': 'model' if args.model else 'synthetic',
+        'results': results,
+        'best': best,
+        'settings': {'ASR_INFERENCE_THREADS': best['threads'], 'ASR_RESERVED_CPUS': args.reserved} if best else None
+    }
+    with open(args.output, 'w', encoding='utf-8') as fh:
+        json.dump(report, fh, indent=2)
+    print(json.dumps(report['settings'], indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Usage:
+  python benchmark_word_timestamps.py --model /path/to/model.nemo --samples-dir ./test-data/audio --strategies greedy,beam
+
+Notes:
+- For each strategy, times NeMoASRModel.transcribe_audio with and without
+  word_timestamps (the server's code path) on the same files.
+- Both decoding objects are built by a warm-up call and then come from the
+  engine's decoder cache, so the numbers are the per-request overhead of
+  alignments/confidence only.
+- Reports mean latency with and without word timestamps and the overhead in percent.
+"""
+import os
+import json
+import time
+import argparse
+
+from benchmark_asr import ASRWrapper, list_audio_files
+
+
+def timed(m, files, word_timestamps, repeats):
+    latencies = []
+    words = 0
+    for path in files:
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            result = m.transcribe_audio(path, word_timestamps=word_timestamps)
+            latencies.append(time.perf_counter() - t0)
+        words += len(result.get('words') or [])
+    return sum(latencies) / len(latencies), words
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', type=str, required=True)
+    parser.add_argument('--samples-dir', type=str, default=os.path.join('test-data', 'audio'))
+    parser.add_argument('--strategies', type=str, default='greedy,beam')
+    parser.add_argument('--beam-size', type=int, default=4)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--precision', type=str, default=None, choices=['auto', 'fp32', 'bf16', 'fp16'])
+    parser.add_argument('--output', type=str, default='word_timestamps_results.json')
+    args = parser.parse_args()
+
+    files = list_audio_files(args.samples_dir)
+    m = ASRWrapper(args.model, precision=args.precision)
+    if files:
+        m.transcribe(files[0])  # warm-up
+
+    results = []
+    for strategy in [s.strip() for s in args.strategies.split(',') if s.strip()]:
+        m.set_decoding(strategy, args.beam_size)
+        if files:
+            # Build (and cache) both decoding variants before timing, as a warm server has them
+            m.transcribe_audio(files[0], word_timestamps=True)
+        off, _ = timed(m, files, False, args.repeats)
+        on, words = timed(m, files, True, args.repeats)
+        results.append({
+            'strategy': strategy,
+            'files': len(files),
+            'latency_off': round(off, 4),
+            'latency_word_timestamps': round(on, 4),
+            'overhead_pct': round(100.0 * (on - off) / off, 2) if off else None,
+            'words': words
+        })
+
+    with open(args.output, 'w', encoding='utf-8') as fh:
+        json.dump(results, fh, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
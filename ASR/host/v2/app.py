@@ -1,21 +1,43 @@
 import traceback
+import sys
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, g
 from flask_cors import CORS
 import os
 import torch
-import nemo.collections.asr as nemo_asr
-from omegaconf import DictConfig
-import tempfile
 import logging
 import time
+import hmac
+import collections
 from werkzeug.utils import secure_filename
-import librosa
-import soundfile as sf
-import numpy as np
+
+ASR_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ASR_ROOT not in sys.path:
+    sys.path.insert(0, ASR_ROOT)
+
+from asr_engine.model import NeMoASRModel, LONG_AUDIO_SECONDS
+from asr_engine.audio import probe_duration
+from asr_engine.decoding import SUPPORTED_STRATEGIES, uses_beta
+from asr_engine.tracing import (RequestTrace, current_trace, bind_trace, unbind_trace,
+                                install_log_filter)
+from asr_engine.scheduler import build_scheduler, parse_api_key_classes, priority_from_request
+from asr_engine.stream_ingest import stream_format, ingest_to_wav
+from asr_engine.audio_decoder import decoder_pool
+from asr_engine.word_timestamps import word_timestamps_requested
+from asr_engine.spool import build_spool, SpoolQuotaError
+from asr_engine.pipeline import build_preprocess_pool
+from asr_engine.overload import build_overload_controller, LADDER
+from asr_engine.singleflight import build_single_flight, request_key
+from asr_engine.affinity import build_worker_affinity
+from asr_engine.profiling import build_profile_capture
+from asr_engine.memory import build_memory_inspector, build_recycler
+from asr_engine.flight_recorder import build_flight_recorder
+from asr_engine.deadline import parse_deadline
+from asr_engine.cancellation import CancelToken, RequestCancelled, build_disconnect_watcher
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
+install_log_filter()
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
@@ -23,7 +45,7 @@ CORS(app)
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
-ALLOWED_EXTENSIONS = {'wav', 'mp3', 'flac', 'ogg', 'm4a', 'webm'}
+ALLOWED_EXTENSIONS = {'wav', 'mp3', 'flac', 'ogg', 'opus', 'm4a', 'webm'}
 MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50MB max file size
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
@@ -32,458 +54,174 @@ app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 # Create upload directory if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Inference runs on the scheduler's worker thread: priority classes, shortest job first within a class
+scheduler = build_scheduler()
+# Long recordings go through the scheduler one chunk at a time (ASR_LONG_JOB_FAIRNESS orders concurrent ones)
+CHUNK_INTERLEAVE = os.environ.get('ASR_CHUNK_INTERLEAVE', '1').lower() not in ('0', 'false', 'no')
+# Chunk jobs a long request keeps outstanding: one running, the next queued while its file is written
+LONG_JOB_WINDOW = int(os.environ.get('ASR_LONG_JOB_WINDOW', '2'))
+# Core set and torch thread budget of the inference worker; the main thread (and the pools it starts) stays on
+# the shared cores
+affinity = build_worker_affinity().configure()
+scheduler.worker_init = affinity.pin_worker
+# Browser webm/opus and m4a uploads are decoded in-process with PyAV; refuse to start without it
+decoder_pool.require()
+# Decode/resample/normalize run in worker processes, forked here before the model is loaded and before
+# any thread (the spool sweeper below included) starts
+preprocess_pool = build_preprocess_pool().start()
+# Uploads, converted WAVs and chunk files; tmpfs when available, quota-bounded, swept for orphans
+spool = build_spool(UPLOAD_FOLDER).start()
+API_KEY_CLASSES = parse_api_key_classes(os.environ.get('ASR_PRIORITY_API_KEYS'))
+# Steps decoding down (beam+LM -> beam -> small beam -> greedy) while the queue or RTF is high
+overload = build_overload_controller()
+# Concurrent requests for the same audio and decoding share one inference
+inflight = build_single_flight()
+# Cancels queued/running work whose client has disconnected
+disconnects = build_disconnect_watcher()
+# torch.profiler capture of the next N requests / T seconds, armed through /admin/profile
+profiler = build_profile_capture()
+# tracemalloc top sites / snapshot diffs and cache sizes for /admin/memory
+memory = build_memory_inspector()
+# Restart after ASR_RECYCLE_RSS_MB or ASR_RECYCLE_REQUESTS, once admitted requests have drained
+recycler = build_recycler()
+recycler.on_shutdown(preprocess_pool.shutdown)
+recycler.on_shutdown(decoder_pool.shutdown)
+TRANSCRIBE_ENDPOINTS = ('transcribe', 'api_transcribe')
+# Ring buffer of recent transcriptions; slow ones are dumped with their neighbours for /admin/flights
+flights = build_flight_recorder()
+# /admin/* requires X-Admin-Token when set; without it only loopback clients are allowed
+ADMIN_TOKEN = os.environ.get('ASR_ADMIN_TOKEN')
 
-class NeMoASRModel:
-    def __init__(self, model_path, decoding_strategy='beam', beam_size=4, lm_path=None):
-        self.model_path = model_path
-        self.lm_path = lm_path  # Path to language model binary file
-        self.model = None
-        self.initialized = False
-        self.model_name = "Custom NeMo RNNT Model"
-        self.decoding_strategy = decoding_strategy
-        self.beam_size = beam_size
-        self.initialize_model()
-        self.debug_model_capabilities()
-
-    def debug_model_capabilities(self):
-        """Debug what decoding options your model actually supports"""
-        try:
-            print("=== MODEL DEBUG INFO ===")
-            print(f"Model type: {type(self.model)}")
-            print(f"Model class: {self.model.__class__.__name__}")
 
-            # Check if model has decoding config
-            if hasattr(self.model, 'cfg') and hasattr(self.model.cfg, 'decoding'):
-                print(f"Current decoding config: {self.model.cfg.decoding}")
+# Initialize the model
+MODEL_PATH = '/opt/aitraining/models/nemo_experiments_med_2/Speech_To_Text_Finetuning/2025-09-19_14-06-09/checkpoints/Speech_To_Text_Finetuning.nemo'
+LM_PATH = None
 
-            # Check what methods are available
-            decoding_methods = [method for method in dir(self.model) if 'decoding' in method.lower()]
-            print(f"Available decoding methods: {decoding_methods}")
+ENV_MODEL_PATH = os.environ.get('NEMO_MODEL_PATH')
+ENV_LM_PATH = os.environ.get('KENLM_PATH')
+if ENV_MODEL_PATH:
+    MODEL_PATH = ENV_MODEL_PATH
+if ENV_LM_PATH is not None:
+    LM_PATH = ENV_LM_PATH
 
-            # Try to get the current decoding strategy
-            if hasattr(self.model, 'decoding'):
-                print(f"Current decoding object: {self.model.decoding}")
-                if hasattr(self.model.decoding, 'cfg'):
-                    print(f"Decoding config: {self.model.decoding.cfg}")
+# torch.compile on CUDA, as this server always did; the engine leaves it off for other callers
+COMPILE_MODEL = os.environ.get('ASR_COMPILE', '1').lower() not in ('0', 'false', 'no')
+asr_model = NeMoASRModel(MODEL_PATH, decoding_strategy='beam', beam_size=4, lm_path=LM_PATH, spool=spool,
+                         compile_model=COMPILE_MODEL)
 
-            # Check if it's an RNNT model (different config structure)
-            if 'rnnt' in str(type(self.model)).lower():
-                print("This appears to be an RNNT model - different config needed")
 
-            print("=== END DEBUG INFO ===")
+def sync_overload_decoding():
+    """The overload ladder only steps through the rungs below the configured decoding"""
+    overload.set_decoding(asr_model.decoding_strategy, asr_model.beam_size, asr_model.lm_path)
 
-        except Exception as e:
-            print(f"Debug failed: {e}")
 
-    def verify_lm_loading(self):
-        """Verify if the language model is actually being loaded and used"""
-        try:
-            print("=== LANGUAGE MODEL DEBUG ===")
-            lm_path = self.lm_path
-            print(f"KenLM configured: {bool(lm_path)}")
-            if lm_path:
-                print(f"KenLM file exists: {os.path.exists(lm_path)}")
-                if os.path.exists(lm_path):
-                    file_size = os.path.getsize(lm_path)
-                    print(f"KenLM file size: {file_size} bytes ({file_size / (1024 * 1024):.2f} MB)")
-
-            # Check current decoding config
-            if hasattr(self.model.decoding, 'cfg'):
-                beam_cfg = self.model.decoding.cfg.get('beam', {})
-                print(f"Current beam config:")
-                print(f"  - beam_size: {beam_cfg.get('beam_size')}")
-                print(f"  - beam_alpha: {beam_cfg.get('beam_alpha')}")
-                print(f"  - beam_beta: {beam_cfg.get('beam_beta')}")
-                print(f"  - kenlm_path: {beam_cfg.get('kenlm_path')}")
-
-                # Check if LM is actually loaded
-                if hasattr(self.model.decoding, 'kenlm'):
-                    print(f"KenLM object loaded: {self.model.decoding.kenlm is not None}")
-
-            print("=== END LM DEBUG ===")
-
-        except Exception as e:
-            print(f"LM debug failed: {e}")
-
-    # Usage examples:
-    def apply_beam_with_lm(self):
-        if not self.lm_path:
-            raise ValueError("Language model path not set")
-        with_lm_cfg = DictConfig({
-            'strategy': 'beam',
-            'beam': {
-                'beam_size': 100,
-                'beam_alpha': 1.0,
-                'beam_beta': 1.0,
-                'kenlm_path': self.lm_path,
-                'return_best_hypothesis': True
-            }
-        })
-        self.model.change_decoding_strategy(with_lm_cfg)
-        self.verify_lm_loading()
-        logger.info("Applied beam search WITH language model")
-
-    def apply_beam_without_lm(self):
-        """Apply beam search without language model"""
-        without_lm_cfg = DictConfig({
-            'strategy': 'beam',
-            'beam': {
-                'beam_size': 50,
-                'beam_alpha': 1.0,
-                'beam_beta': 1.0,
-                'kenlm_path': None,
-                'return_best_hypothesis': True
-            }
-        })
+sync_overload_decoding()
 
-        self.model.change_decoding_strategy(without_lm_cfg)
-        logger.info("Applied beam search WITHOUT language model")
-
-    def set_decoding_strategy(self, strategy='beam', beam_size=4, lm_path=None, alpha=0.5, beta=1.0):
-        """Change decoding strategy; supports 'greedy', 'beam', and 'auto'"""
-        from omegaconf import DictConfig
-
-        if strategy == 'greedy':
-            decoding_cfg = DictConfig({
-                'strategy': 'greedy',
-                'greedy': {
-                    'max_symbols_per_step': 10,
-                    'preserve_alignments': False,
-                    'preserve_frame_confidence': False,
-                    'loop_labels': True,
-                    'use_cuda_graph_decoder': True
-                },
-                'compute_hypothesis_token_set': False,
-                'preserve_alignments': False
-            })
-        elif strategy == 'beam':
-            beam_cfg = {
-                'beam_size': beam_size,
-                'score_norm': True,
-                'return_best_hypothesis': True,
-                'preserve_alignments': False,
-                'max_symbols_per_step': 10
-            }
-            if lm_path or self.lm_path:
-                beam_cfg.update({
-                    'kenlm_path': lm_path or self.lm_path,
-                    'beam_alpha': alpha,
-                    'beam_beta': beta
-                })
-            decoding_cfg = DictConfig({
-                'strategy': 'beam',
-                'beam': beam_cfg,
-                'compute_hypothesis_token_set': False,
-                'preserve_alignments': False
-            })
-        elif strategy == 'auto':
-            # Do not change model decoder now; will be selected per-audio in transcribe
-            self.decoding_strategy = 'auto'
-            self.beam_size = beam_size
-            logger.info("Auto decoding enabled; strategy will be chosen per-audio")
-            return
-        
-        try:
-            # Apply the configuration
-            self.model.change_decoding_strategy(decoding_cfg)
-
-            self.decoding_strategy = strategy
-            self.beam_size = beam_size
-            logger.info(f"Changed decoding strategy to: {strategy}")
-            if lm_path:
-                self.lm_path = lm_path
-                logger.info(f"Using language model: {lm_path}")
-        except Exception as e:
-            logger.error(f"Failed to change decoding strategy: {e}")
-
-    def _select_decoding_for_duration(self, duration_sec):
-        """Heuristic: choose decoding based on utterance length"""
-        # Short utterances benefit from slightly larger beam; long ones from greedy or small beam
-        if duration_sec is None:
-            return 'beam', max(self.beam_size, 4)
-        if duration_sec < 5:
-            return 'beam', max(self.beam_size, 8)
-        if duration_sec < 15:
-            return 'beam', max(self.beam_size, 6)
-        # Very long: use greedy for speed and stability
-        return 'greedy', 0
-
-    def load_binary_lm(self, binary_path):
-        """Load a binary language model file (KenLM format)"""
-        try:
-            if not os.path.exists(binary_path):
-                raise FileNotFoundError(f"Binary LM file not found: {binary_path}")
 
-            self.lm_path = binary_path
-            logger.info(f"Binary language model loaded: {binary_path}")
-            return True
-        except Exception as e:
-            logger.error(f"Failed to load binary LM: {e}")
-            return False
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-    def initialize_model(self):
-        """Initialize the NeMo ASR model"""
-        logger.info("Initializing NeMo ASR model...")
 
-        try:
-            # Load your custom NeMo model
-            if self.model_path.endswith('.ckpt'):
-                self.model = nemo_asr.models.ASRModel.load_from_checkpoint(self.model_path)
-            else:
-                self.model = nemo_asr.models.ASRModel.restore_from(self.model_path)
-
-            logger.info("Model loaded successfully")
-
-            if torch.cuda.is_available():
-                torch.backends.cudnn.benchmark = True
-                torch.backends.cudnn.enabled = True
-
-            # Use half precision for faster inference
-            if torch.cuda.is_available():
-                self.model = self.model.half()
-
-            if hasattr(torch, 'compile') and torch.cuda.is_available():
-                try:
-                    self.model = torch.compile(self.model, mode="reduce-overhead")
-                    logger.info("Model compiled with torch.compile")
-                except Exception as e:
-                    logger.warning(f"torch.compile failed: {e}")
-
-            # Get vocabulary info
-            if hasattr(self.model, 'tokenizer'):
-                vocab_size = len(self.model.tokenizer.vocab)
-                logger.info(f"Vocabulary size: {vocab_size}")
-
-            # Set initial decoding strategy
-            self.set_decoding_strategy(self.decoding_strategy, self.beam_size)
-
-            self.initialized = True
-            logger.info("Model initialization complete")
-            logger.info(f"Using decoding strategy: {self.decoding_strategy}")
-
-        except Exception as e:
-            logger.error(f"Failed to initialize model: {str(e)}")
-            self.initialized = False
-            raise e
-
-    def transcribe_audio(self, audio_path):
-        """Transcribe audio file using the loaded model"""
-        if not self.initialized:
-            raise RuntimeError("Model not initialized")
-
-        if not os.path.exists(audio_path):
-            raise FileNotFoundError(f"Audio file not found: {audio_path}")
+def convert_audio_to_wav(input_path, output_path):
+    """Convert audio file to WAV format if needed (decode/resample/normalize in the preprocess pool)"""
+    try:
+        preprocess_pool.prepare(input_path, output_path)
+        return True
+    except Exception as e:
+        logger.error(f"Audio conversion failed: {str(e)}")
+        return False
 
-        try:
-            # Pre-measure duration and optionally adjust decoding strategy
-            try:
-                audio_duration = librosa.get_duration(filename=audio_path)
-            except Exception:
-                audio_duration = None
 
-            if self.decoding_strategy == 'auto':
-                chosen_strategy, chosen_beam = self._select_decoding_for_duration(audio_duration or 0)
-                if chosen_strategy == 'beam':
-                    self.set_decoding_strategy('beam', beam_size=chosen_beam)
-                else:
-                    self.set_decoding_strategy('greedy')
+def pipeline_stats():
+    """Per-stage utilization, for sizing the preprocess pool and the inference threads"""
+    return {
+        'preprocess': preprocess_pool.stats(),
+        'inference': scheduler.stats()['utilization']
+    }
 
-            if (audio_duration or 0) > 60:
-                return self._transcribe_long_audio(audio_path, chunk_duration=30, overlap=2)
 
-            start_time = time.time()
+def _admin_allowed():
+    if ADMIN_TOKEN:
+        return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN)
+    return request.remote_addr in ('127.0.0.1', '::1')
 
-            # Process the file with NeMo
-            with torch.inference_mode():
-                use_amp = torch.cuda.is_available()
-                with torch.cuda.amp.autocast(enabled=use_amp):
-                    transcription = self.model.transcribe([audio_path], batch_size=1)
 
-            processing_time = time.time() - start_time
+def _timings_requested():
+    flag = request.args.get('timings') or request.headers.get('X-Debug-Timings') or ''
+    return flag.lower() in ('1', 'true', 'yes')
 
-            # Compute RTF
-            try:
-                duration_for_rtf = audio_duration if audio_duration is not None else librosa.get_duration(filename=audio_path)
-                rtf = processing_time / duration_for_rtf if (duration_for_rtf and duration_for_rtf > 0) else 0
-            except Exception:
-                duration_for_rtf = 0
-                rtf = 0
-
-            # Extract and post-process transcription text
-            text_result = self._extract_text_from_result(transcription)
-            text_result = self._post_process_text(text_result)
-
-            return {
-                'text': str(text_result),
-                'processing_time': float(round(processing_time, 3)),
-                'audio_duration': float(round((duration_for_rtf or 0), 3)),
-                'rtf': float(round(rtf, 3)),
-                'decoding_strategy': self.decoding_strategy,
-                'beam_size': self.beam_size if self.decoding_strategy in ['beam'] else None
-            }
 
-        except Exception as e:
-            logger.error(f"Transcription failed: {str(e)}")
-            raise e
+@app.before_request
+def start_request_trace():
+    g.trace = RequestTrace(request.headers.get('X-Request-ID'), detailed=_timings_requested())
+    g.trace_token = bind_trace(g.trace)
 
-    def _post_process_text(self, text):
-        """Post-process text to handle special characters"""
-        replacements = {
-            "aw": "å", "ae": "ä", "oe": "ö",
-            "AW": "Å", "AE": "Ä", "OE": "Ö",
-            "⁇": ""
-        }
 
-        for old, new in replacements.items():
-            text = text.replace(old, new)
-
-        return text
-
-    def _transcribe_chunk(self, chunk_path):
-        with torch.inference_mode():
-            use_amp = torch.cuda.is_available()
-            with torch.cuda.amp.autocast(enabled=use_amp):
-                result = self.model.transcribe([chunk_path], batch_size=1)
-        text = self._extract_text_from_result(result)
-        return self._post_process_text(text)
-
-    def _merge_transcriptions(self, parts):
-        lines = [p.strip() for p in parts if p and p.strip()]
-        if not lines:
-            return ""
-        merged = []
-        prev = ""
-        for ln in lines:
-            if prev and ln.startswith(prev[-5:]):
-                merged.append(ln[len(prev[-5:]):])
-            else:
-                merged.append(ln)
-            prev = ln
-        return "\n".join(merged)
-
-    def _transcribe_long_audio(self, audio_path, chunk_duration=30, overlap=2):
-        data, sr = librosa.load(audio_path, sr=16000, mono=True)
-        total = len(data)
-        chunk_samples = int(chunk_duration * sr)
-        overlap_samples = int(overlap * sr)
-        stride = max(1, chunk_samples - overlap_samples)
-        texts = []
-        idx = 0
-        while idx < total:
-            end = min(idx + chunk_samples, total)
-            chunk = data[idx:end]
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp:
-                sf.write(tmp.name, chunk, sr)
-                t = self._transcribe_chunk(tmp.name)
-                texts.append(t)
-                try:
-                    os.unlink(tmp.name)
-                except Exception:
-                    pass
-            if end >= total:
-                break
-            idx += stride
-        merged = self._merge_transcriptions(texts)
-        duration = len(data) / sr
-        return {
-            'text': merged,
-            'processing_time': None,
-            'audio_duration': float(round(duration, 3)),
-            'rtf': None,
-            'decoding_strategy': self.decoding_strategy,
-            'beam_size': self.beam_size if self.decoding_strategy in ['beam'] else None
-        }
+@app.after_request
+def finish_request_trace(response):
+    trace = g.get('trace')
+    if trace is not None:
+        response.headers['X-Request-ID'] = trace.trace_id
+        if trace.timings:
+            response.headers['Server-Timing'] = trace.server_timing()
+    return response
 
-    def _extract_text_from_result(self, transcription):
-        """Extract text from NeMo transcription result"""
-        try:
-            if isinstance(transcription, list):
-                if len(transcription) == 0:
-                    return ""
-                # Join multiple segments/hypotheses into full text
-                parts = []
-                for r in transcription:
-                    if hasattr(r, 'text'):
-                        parts.append(str(r.text))
-                    elif hasattr(r, 'item'):
-                        parts.append(str(r.item()))
-                    else:
-                        parts.append(str(r))
-                return "\n".join([p for p in parts if p])
-            elif isinstance(transcription, torch.Tensor):
-                return str(transcription.item()) if transcription.numel() == 1 else str(transcription.tolist())
-            elif hasattr(transcription, 'text'):
-                return str(transcription.text)
-            else:
-                return str(transcription)
-        except Exception as e:
-            logger.warning(f"Text extraction fallback: {str(e)}")
-            return str(transcription)
-
-    def get_model_info(self):
-        """Return detailed model information"""
-        info = {
-            'model_name': self.model_name,
-            'model_type': type(self.model).__name__,
-            'model_path': self.model_path,
-            'decoding_strategy': self.decoding_strategy,
-            'beam_size': self.beam_size,
-            'initialized': self.initialized,
-            'lm_path': self.lm_path,
-            'supported_strategies': ['greedy', 'beam', 'auto']
-        }
 
-        try:
-            if hasattr(self.model, 'cfg'):
-                cfg = self.model.cfg
-                info.update({
-                    'architecture': cfg.get('_target_', 'Unknown'),
-                    'vocab_size': len(self.model.tokenizer.vocab) if hasattr(self.model, 'tokenizer') else 'Unknown',
-                    'sample_rate': cfg.get('preprocessor', {}).get('sample_rate', 'Unknown'),
-                    'encoder_layers': cfg.get('encoder', {}).get('n_layers', 'Unknown'),
-                    'decoder_layers': cfg.get('decoder', {}).get('num_layers', 'Unknown')
-                })
-        except:
-            pass
+@app.teardown_request
+def unbind_request_trace(exc):
+    token = g.pop('trace_token', None)
+    if token is not None:
+        unbind_trace(token)
 
-        return info
 
+@app.before_request
+def admit_transcription():
+    if request.endpoint in TRANSCRIBE_ENDPOINTS:
+        if not recycler.admit():
+            response = jsonify({'error': 'Server is recycling, retry shortly'})
+            response.headers['Retry-After'] = str(recycler.retry_after)
+            return response, 503
+        g.admitted = True
+        # Cleared by whichever hook hands the request back to the recycler
+        g.recycle_pending = True
+        flights.begin(g.trace.trace_id)
 
-# Initialize the model
-MODEL_PATH = '/opt/aitraining/models/nemo_experiments_med_2/Speech_To_Text_Finetuning/2025-09-19_14-06-09/checkpoints/Speech_To_Text_Finetuning.nemo'
-LM_PATH = None
 
-ENV_MODEL_PATH = os.environ.get('NEMO_MODEL_PATH')
-ENV_LM_PATH = os.environ.get('KENLM_PATH')
-if ENV_MODEL_PATH:
-    MODEL_PATH = ENV_MODEL_PATH
-if ENV_LM_PATH is not None:
-    LM_PATH = ENV_LM_PATH
+def _upload_format():
+    if stream_format(request.mimetype):
+        return request.mimetype
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file') or request.files.get('audio')
+        if upload is not None and '.' in (upload.filename or ''):
+            return upload.filename.rsplit('.', 1)[1].lower()
+    return request.mimetype or None
 
-asr_model = NeMoASRModel(MODEL_PATH, decoding_strategy='beam', beam_size=4, lm_path=LM_PATH)
 
+@app.after_request
+def record_flight(response):
+    if g.get('admitted'):
+        trace = g.trace
+        flights.end(trace.trace_id, endpoint=request.endpoint, status=response.status_code,
+                    latency=float(round(trace.elapsed(), 4)), format=_upload_format(),
+                    content_length=request.content_length, queue_wait=trace.timings.get('queue'),
+                    timings=trace.as_dict(), **g.get('flight', {}))
+    return response
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+@app.after_request
+def finish_transcription_on_close(response):
+    # Counted as finished only once the server has sent the body and closed the response,
+    # so a recycle triggered by this request cannot exit before its client has the result
+    if g.pop('recycle_pending', False):
+        response.call_on_close(recycler.done)
+    return response
 
-def convert_audio_to_wav(input_path, output_path):
-    """Convert audio file to WAV format if needed"""
-    try:
-        data, orig_sr = sf.read(input_path, dtype='float32')
-        if len(getattr(data, 'shape', [])) > 1:
-            data = np.mean(data, axis=1)
-        target_sr = 16000
-        if orig_sr != target_sr:
-            data = librosa.resample(data, orig_sr=orig_sr, target_sr=target_sr, res_type='kaiser_best')
-        max_val = float(np.max(np.abs(data))) if hasattr(np, 'abs') else 0.0
-        if max_val > 0:
-            data = data / max_val * 0.95
-        sf.write(output_path, data, target_sr, subtype='PCM_16')
-        return True
-    except Exception as e:
-        logger.error(f"Audio conversion failed: {str(e)}")
-        return False
+
+@app.teardown_request
+def finish_transcription(exc):
+    # Fallback for a request that never produced a response object
+    if g.pop('recycle_pending', False):
+        recycler.done()
 
 
 @app.route('/')
@@ -503,6 +241,7 @@ def load_lm():
             return jsonify({'error': 'No language model path provided'}), 400
 
         if asr_model.load_binary_lm(lm_path):
+            sync_overload_decoding()
             return jsonify({
                 'status': 'success',
                 'message': f'Language model loaded: {lm_path}',
@@ -526,11 +265,14 @@ def set_decoding():
         alpha = data.get('alpha', 0.8)
         beta = data.get('beta', 1.2)
 
-        valid_strategies = ['greedy', 'beam', 'auto']
-        if strategy not in valid_strategies:
-            return jsonify({'error': f'Invalid strategy. Use one of: {valid_strategies}'}), 400
+        if strategy not in SUPPORTED_STRATEGIES:
+            return jsonify({'error': f'Invalid strategy. Use one of: {SUPPORTED_STRATEGIES}'}), 400
+        if 'beta' in data and strategy == 'beam' and (lm_path or asr_model.lm_path):
+            return jsonify({'error': 'beta is not used by beam search with a resident LM (maes has no word '
+                                     'insertion term); use knelm_beam or flashlight_beam to set it'}), 400
 
         asr_model.set_decoding_strategy(strategy, beam_size, lm_path, alpha, beta)
+        sync_overload_decoding()
 
         return jsonify({
             'status': 'success',
@@ -538,7 +280,7 @@ def set_decoding():
             'beam_size': beam_size if strategy in ['beam'] else None,
             'lm_path': lm_path,
             'alpha': alpha if lm_path else None,
-            'beta': beta if lm_path else None,
+            'beta': beta if uses_beta(strategy) else None,
             'message': f'Decoding strategy changed to {strategy}'
         })
 
@@ -583,6 +325,16 @@ def health():
             'decoding_strategy': asr_model.decoding_strategy,
             'beam_size': asr_model.beam_size,
             'lm_loaded': asr_model.lm_path is not None,
+            'scheduler': scheduler.stats(),
+            'decoder': decoder_pool.stats(),
+            'spool': spool.stats(),
+            'pipeline': pipeline_stats(),
+            'overload': overload.stats(),
+            'coalescing': inflight.stats(),
+            'cancellation': disconnects.stats(),
+            'affinity': affinity.stats(),
+            'recycle': recycler.stats(),
+            'flight_recorder': flights.stats(),
             'system': {
                 'cpu_percent': float(syscpu),
                 'mem_total': int(getattr(sysmem, 'total', 0)),
@@ -594,64 +346,193 @@ def health():
         }
     return jsonify(get_health_data())
 
-def transcribe_current(audio_path):
+def transcribe_current(audio_path, audio_duration=None, word_timestamps=False, decoding=None, deadline=None):
     if not asr_model.initialized:
         raise RuntimeError("Model not initialized")
     if not os.path.exists(audio_path):
         raise FileNotFoundError(f"Audio file not found: {audio_path}")
-    return asr_model.transcribe_audio(audio_path)
+    return asr_model.transcribe_audio(audio_path, audio_duration, word_timestamps, decoding, deadline)
+
+
+def transcribe_under_load(audio_path, audio_duration, word_timestamps, deadline=None):
+    """Run on the inference worker with the decoding the overload controller allows right now"""
+    rung, decoding = overload.decoding_for(asr_model.decoding_strategy, asr_model.beam_size, asr_model.lm_path)
+    started = time.perf_counter()
+    results = profiler.run(
+        lambda: transcribe_current(audio_path, audio_duration, word_timestamps, decoding, deadline),
+        label=current_trace().trace_id)
+    overload.record_rtf(time.perf_counter() - started, results.get('audio_duration'))
+    if decoding and not results.get('deadline', {}).get('fell_back'):
+        results['decoding_strategy'] = decoding['strategy']
+        results['beam_size'] = decoding['beam_size'] if decoding['strategy'] == 'beam' else None
+    results['overload'] = {'decoding': rung, 'degraded': decoding is not None}
+    return results
+
+
+def transcribe_interleaved(wav_path, audio_duration, word_timestamps, deadline, priority, trace, token):
+    """Long recordings: one scheduler job per chunk, so shorter requests run between the chunks"""
+    group = scheduler.new_group(audio_duration)
+    rungs = collections.Counter()
+    degraded = []
+
+    def run_chunk(work, seconds):
+        # Each chunk takes the decoding the overload controller allows when it actually runs
+        rung, decoding = overload.decoding_for(asr_model.decoding_strategy, asr_model.beam_size, asr_model.lm_path)
+        rungs[rung] += 1
+        if decoding:
+            degraded.append(rung)
+        started = time.perf_counter()
+        out = work(decoding)
+        overload.record_rtf(time.perf_counter() - started, seconds)
+        return out
+
+    def submit(work, seconds, left):
+        group.remaining = left
+        return scheduler.submit(lambda: run_chunk(work, seconds), priority=priority, expected_duration=seconds,
+                                trace=trace, token=token, group=group)
+
+    results = asr_model.transcribe_long(wav_path, audio_duration, word_timestamps, submit=submit,
+                                        window=LONG_JOB_WINDOW, deadline=deadline)
+    results['overload'] = {'decoding': max(rungs, key=LADDER.index) if rungs else None,
+                           'degraded': bool(degraded), 'chunks_by_rung': dict(rungs)}
+    return results
 
 
 @app.route('/transcribe', methods=['POST'])
 def transcribe():
+    trace = current_trace()
     try:
-        file = request.files.get('file') or request.files.get('audio')
-        if file is None:
-            if request.data:
-                tmp = tempfile.NamedTemporaryFile(delete=False)
-                tmp.write(request.data)
-                tmp.flush()
-                tmp.close()
-                file = type('f', (), {'filename': 'raw', 'save': lambda p, src=tmp.name: open(p, 'wb').write(open(src, 'rb').read())})()
-            else:
+        # Every file created for this request is released when the session closes, on any path
+        with spool.session() as files:
+            # Raw wav/flac/pcm bodies are decoded while they stream in
+            if stream_format(request.mimetype):
+                return transcribe_stream(trace, files)
+
+            with trace.stage('receive'):
+                file = request.files.get('file') or request.files.get('audio')
+                if file is None and request.data:
+                    file = type('f', (), {'filename': 'raw', 'save': lambda p, data=request.data: open(p, 'wb').write(data)})()
+            if file is None:
                 return jsonify({'error': 'No file provided'}), 400
-        if not getattr(file, 'filename', ''):
-            return jsonify({'error': 'No file selected'}), 400
-
-        if not allowed_file(file.filename):
-            return jsonify({'error': 'Invalid file type.'}), 400
-
-        # Save file
-        filename = secure_filename(getattr(file, 'filename', 'audio'))
-        timestamp = str(int(time.time()))
-        filename = f"{timestamp}_{filename}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-
-        # Convert to WAV if needed
-        wav_path = file_path
-        if not filename.lower().endswith('.wav'):
-            wav_filename = filename.rsplit('.', 1)[0] + '.wav'
-            wav_path = os.path.join(app.config['UPLOAD_FOLDER'], wav_filename)
-            if not convert_audio_to_wav(file_path, wav_path):
-                return jsonify({'error': 'Failed to convert audio file'}), 500
-
-        results = transcribe_current(wav_path)
-
-        # Clean up files
-        try:
-            os.remove(file_path)
-            if wav_path != file_path:
-                os.remove(wav_path)
-        except Exception as e:
-            logger.warning(f"Cleanup failed: {str(e)}")
-
-        return jsonify(results)
-
+            if not getattr(file, 'filename', ''):
+                return jsonify({'error': 'No file selected'}), 400
+
+            if not allowed_file(file.filename):
+                return jsonify({'error': 'Invalid file type.'}), 400
+
+            # Save file
+            filename = secure_filename(getattr(file, 'filename', 'audio'))
+            timestamp = str(int(time.time()))
+            filename = f"{timestamp}_{filename}"
+            file_path = files.new_file(filename, expected_bytes=request.content_length)
+            with trace.stage('save'):
+                file.save(file_path)
+                files.commit(file_path)
+
+            # Convert to WAV if needed
+            wav_path = file_path
+            if not filename.lower().endswith('.wav'):
+                wav_path = files.new_file(filename.rsplit('.', 1)[0] + '.wav')
+                if not convert_audio_to_wav(file_path, wav_path):
+                    return jsonify({'error': 'Failed to convert audio file'}), 500
+                files.commit(wav_path)
+
+            with trace.stage('probe'):
+                audio_duration = probe_duration(wav_path)
+            return run_scheduled(trace, wav_path, audio_duration, files)
+
+    except SpoolQuotaError as e:
+        logger.warning(f"Rejected upload: {str(e)}")
+        return jsonify({'error': str(e)}), 507
     except Exception as e:
         logger.error(f"Transcription error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+
+def transcribe_stream(trace, files):
+    """Decode/resample a raw audio body as it arrives, then transcribe the result"""
+    fmt = stream_format(request.mimetype)
+    params = dict(request.mimetype_params)
+    params.update({k: v for k, v in request.args.items() if k in ('rate', 'channels')})
+    wav_path = files.new_file(f"{trace.trace_id}_stream.wav", expected_bytes=request.content_length)
+    try:
+        audio_duration = ingest_to_wav(request.stream, fmt, wav_path, mimetype=request.mimetype,
+                                       content_length=request.content_length, params=params, trace=trace)
+        files.commit(wav_path)
+    except SpoolQuotaError:
+        raise
+    except Exception as e:
+        logger.error(f"Streaming ingest failed: {str(e)}")
+        return jsonify({'error': f'Failed to decode audio stream: {str(e)}'}), 400
+    return run_scheduled(trace, wav_path, audio_duration, files)
+
+
+def run_scheduled(trace, wav_path, audio_duration, files):
+    priority = scheduler.resolve_priority(priority_from_request(request.headers, API_KEY_CLASSES))
+    # ?timestamps=word (or a 'timestamps' form field) adds word timings/confidence; off by default
+    word_timestamps = word_timestamps_requested(request.values.get('timestamps'))
+    # X-Deadline-Ms: budget from arrival; beam search that would overrun it falls back to greedy
+    deadline = parse_deadline(request.headers, trace.started)
+
+    token = CancelToken()
+
+    def infer():
+        transitions = [overload.update(scheduler.queue_depth())]
+        if CHUNK_INTERLEAVE and (audio_duration or 0) > LONG_AUDIO_SECONDS:
+            results = transcribe_interleaved(wav_path, audio_duration, word_timestamps, deadline, priority, trace,
+                                             token)
+        else:
+            results = scheduler.run(lambda: transcribe_under_load(wav_path, audio_duration, word_timestamps, deadline),
+                                    priority=priority, expected_duration=audio_duration, trace=trace, token=token)
+        transitions.append(overload.update(scheduler.queue_depth()))
+        results['overload']['level'] = overload.level
+        results['overload']['transitions'] = [t for t in transitions if t]
+        return results
+
+    queued_ahead = scheduler.queue_depth()
+    key = None
+    # A deadline result depends on the caller's remaining budget, so those requests run on their own
+    if inflight.enabled and deadline is None:
+        with trace.stage('coalesce_key'):
+            key = request_key(wav_path, strategy=asr_model.decoding_strategy, beam_size=asr_model.beam_size,
+                              lm_path=asr_model.lm_path, word_timestamps=word_timestamps)
+    waited_from = time.perf_counter()
+    try:
+        with disconnects.watch(request.environ, token):
+            results, coalesced = inflight.do(key, infer) if key is not None else (infer(), False)
+    except RequestCancelled as e:
+        # Nobody is listening any more; 499 as in nginx's "client closed request"
+        logger.info(f"Transcription cancelled: {e}")
+        files.close()
+        return jsonify({'error': 'Client closed request', 'trace_id': trace.trace_id}), 499
+    if coalesced:
+        trace.add('coalesce_wait', time.perf_counter() - waited_from)
+        results['overload']['transitions'] = []
+    results['coalesced'] = coalesced
+    results['priority'] = priority
+    g.flight = {
+        'audio_duration': results.get('audio_duration'),
+        'decoding': {'strategy': results.get('decoding_strategy'), 'beam_size': results.get('beam_size'),
+                     'lm': bool(asr_model.lm_path) and not results['overload']['degraded'],
+                     'rung': results['overload']['decoding']},
+        'word_timestamps': word_timestamps,
+        'priority': priority,
+        'coalesced': coalesced,
+        'queued_ahead': queued_ahead,
+        'deadline': results.get('deadline'),
+        'rtf': results.get('rtf')
+    }
+
+    # Clean up files
+    with trace.stage('cleanup'):
+        files.close()
+
+    results['trace_id'] = trace.trace_id
+    if _timings_requested():
+        results['timings'] = trace.as_dict()
+    logger.info(f"Transcribed {results.get('audio_duration')}s audio in {trace.elapsed():.3f}s")
+    return jsonify(results)
+
 @app.route('/api/transcribe', methods=['POST'])
 def api_transcribe():
     return transcribe()
@@ -670,10 +551,130 @@ def api_model_info():
 def api_health():
     return health()
 
+@app.route('/api/scheduler', methods=['GET'])
+def api_scheduler():
+    return jsonify(scheduler.stats())
+
+@app.route('/api/pipeline', methods=['GET'])
+def api_pipeline():
+    return jsonify(pipeline_stats())
+
+@app.route('/api/spool', methods=['GET'])
+def api_spool():
+    return jsonify(spool.stats())
+
+@app.route('/api/overload', methods=['GET'])
+def api_overload():
+    return jsonify(overload.stats())
+
+@app.route('/api/coalescing', methods=['GET'])
+def api_coalescing():
+    return jsonify(inflight.stats())
+
 @app.route('/api/set-decoding', methods=['POST'])
 def api_set_decoding():
     return set_decoding()
 
+@app.route('/admin/profile', methods=['GET', 'POST', 'DELETE'])
+def admin_profile():
+    """Arm (POST), inspect (GET) or cancel (DELETE) a profiling session"""
+    if not _admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    if request.method == 'GET':
+        return jsonify(profiler.summary())
+    if request.method == 'DELETE':
+        return jsonify(profiler.disarm())
+    data = request.get_json(silent=True) or {}
+    try:
+        seconds = float(data['seconds']) if data.get('seconds') else None
+        count = int(data.get('requests', 0 if seconds else 1))
+        summary = profiler.arm(requests=count, seconds=seconds, sampling=bool(data.get('sampling')),
+                               interval=float(data.get('interval', 0.005)),
+                               record_shapes=bool(data.get('record_shapes')), with_stack=bool(data.get('with_stack')))
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    # wait=<seconds> blocks until the session ends and returns its top operators
+    if data.get('wait'):
+        profiler.wait(float(data['wait']))
+        summary = profiler.summary()
+    return jsonify(summary)
+
+@app.route('/admin/flights', methods=['GET'])
+def admin_flights():
+    """Slow-request dumps (newest first) and the recorder's recent requests (?recent=N[&slowest=1])"""
+    if not _admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    flights.flush()
+    out = {'stats': flights.stats(), 'dumps': flights.list_dumps()}
+    recent = request.args.get('recent', type=int)
+    if recent:
+        out['recent'] = flights.recent(recent, slowest=request.args.get('slowest', '').lower() in ('1', 'true', 'yes'))
+    return jsonify(out)
+
+@app.route('/admin/flights/<name>', methods=['GET'])
+def admin_flight_dump(name):
+    if not _admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    try:
+        return jsonify(flights.read_dump(name))
+    except (OSError, ValueError):
+        return jsonify({'error': f'No such dump: {name}'}), 404
+
+def cache_sizes():
+    return {
+        'model': asr_model.cache_stats(),
+        'spool': spool.stats(),
+        'coalescing_in_flight': inflight.stats()['in_flight'],
+        'scheduler_queued': scheduler.queue_depth(),
+        'preprocess_in_flight': preprocess_pool.stats().get('in_flight')
+    }
+
+@app.route('/admin/memory', methods=['GET', 'POST'])
+def admin_memory():
+    """GET: RSS, tracemalloc top sites, torch allocator and cache sizes.
+    POST {'action': 'start'|'stop'|'snapshot'|'recycle', 'name': ..., 'frames': ...}"""
+    if not _admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    limit = request.args.get('top', 25, type=int)
+    group = request.args.get('group', 'lineno')
+    if group not in ('lineno', 'filename', 'traceback'):
+        return jsonify({'error': 'group must be lineno, filename or traceback'}), 400
+    if request.method == 'GET':
+        return jsonify(memory.report(cache_sizes(), limit, group))
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    try:
+        if action == 'start':
+            memory.start_tracing(int(data.get('frames', 1)))
+        elif action == 'stop':
+            memory.stop_tracing()
+        elif action == 'snapshot':
+            return jsonify({'snapshot': memory.snapshot(data.get('name')), 'snapshots': memory.snapshots()})
+        elif action == 'recycle':
+            recycler.recycle(data.get('reason', 'requested through /admin/memory'))
+            return jsonify(recycler.stats()), 202
+        else:
+            return jsonify({'error': 'action must be start, stop, snapshot or recycle'}), 400
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify(memory.report(cache_sizes(), limit, group))
+
+@app.route('/admin/memory/diff', methods=['GET'])
+def admin_memory_diff():
+    """?from=<snapshot>[&to=<snapshot>]: allocation growth between snapshots (to a fresh one by default)"""
+    if not _admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    before = request.args.get('from', 'baseline')
+    try:
+        return jsonify(memory.diff(before, request.args.get('to'), request.args.get('top', 25, type=int),
+                                   request.args.get('group', 'lineno')))
+    except KeyError as e:
+        return jsonify({'error': str(e.args[0])}), 404
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+
 
 
 if __name__ == '__main__':
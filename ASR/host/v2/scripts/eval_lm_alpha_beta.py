@@ -1,19 +1,14 @@
 import argparse
 import json
 import os
+import sys
 import time
-import nemo.collections.asr as nemo_asr
-import torch
 
-def transcribe(model, path):
-    with torch.inference_mode():
-        return model.transcribe([path], batch_size=1)
+ASR_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+if ASR_ROOT not in sys.path:
+    sys.path.insert(0, ASR_ROOT)
 
-def extract_text(res):
-    if isinstance(res, list) and len(res) > 0:
-        r = res[0]
-        return getattr(r, 'text', str(r))
-    return str(res)
+from asr_engine.model import NeMoASRModel
 
 def main():
     parser = argparse.ArgumentParser()
@@ -22,12 +17,15 @@ def main():
     parser.add_argument('--dataset', required=True)
     parser.add_argument('--alpha_grid', default='0.6,0.8,1.0')
     parser.add_argument('--beta_grid', default='0.8,1.0,1.2')
+    parser.add_argument('--precision', default='auto', choices=['auto', 'fp32', 'bf16', 'fp16'])
+    parser.add_argument('--batch_size', type=int, default=8)
     args = parser.parse_args()
 
     alpha_vals = [float(x) for x in args.alpha_grid.split(',')]
     beta_vals = [float(x) for x in args.beta_grid.split(',')]
 
-    model = nemo_asr.models.ASRModel.restore_from(args.model)
+    # Same engine as the server: the KenLM binary is loaded once (resident) and reused for every grid point
+    model = NeMoASRModel(args.model, decoding_strategy='greedy', precision=args.precision, verbose=False)
 
     with open(args.dataset, 'r', encoding='utf-8') as f:
         items = json.load(f)
@@ -35,30 +33,14 @@ def main():
     scores = []
     for a in alpha_vals:
         for b in beta_vals:
-            cfg = {
-                'strategy': 'beam',
-                'beam': {
-                    'beam_size': 8,
-                    'score_norm': True,
-                    'return_best_hypothesis': True,
-                    'preserve_alignments': False,
-                    'max_symbols_per_step': 10,
-                    'kenlm_path': args.lm,
-                    'beam_alpha': a,
-                    'beam_beta': b
-                },
-                'compute_hypothesis_token_set': False,
-                'preserve_alignments': False
-            }
-            model.change_decoding_strategy(cfg)
+            model.set_decoding_strategy('beam', beam_size=8, lm_path=args.lm, alpha=a, beta=b)
             start = time.time()
             correct = 0
             total = 0
-            for it in items:
-                res = transcribe(model, it['audio'])
-                hyp = extract_text(res).strip()
+            hyps = model.transcribe_batch([it['audio'] for it in items], batch_size=args.batch_size)
+            for it, hyp in zip(items, hyps):
                 ref = it['text'].strip()
-                correct += int(hyp == ref)
+                correct += int(hyp.strip() == ref)
                 total += 1
             elapsed = time.time() - start
             acc = correct / max(1, total)
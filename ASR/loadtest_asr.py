@@ -0,0 +1,276 @@
+"""
+Usage:
+  python loadtest_asr.py --url http://localhost:5000/api/transcribe --concurrency 1,2,4,8 --duration 60
+  python loadtest_asr.py --mode open --rate 0.5,1,2 --duration 120 --label build-1234
+  python loadtest_asr.py --synthetic-seconds 600 --concurrency 2 --requests 10 --raw
+
+Notes:
+- Replays the files in --samples-dir (default test-data/audio) round robin.
+  With --synthetic-seconds it uses one generated 16 kHz recording of that
+  length (tone plus noise) instead.
+- closed  each of N clients sends its next request when the previous one
+          returns (one step per --concurrency value)
+- open    requests arrive as a Poisson process at R requests/s, whether or not
+          earlier ones have finished (one step per --rate value). Latency
+          is measured from the scheduled arrival time, so time queued on the
+          client side is counted (no coordinated omission).
+- Uploads are multipart 'file' fields. --raw sends the WAV as an audio/wav
+  body instead, which is the server's streaming-ingest path. --unique
+  changes one sample per request, so the server's in-flight coalescing
+  cannot merge concurrent uploads of the same file.
+- Per step it reports p50/p95/p99 latency, throughput in requests/s and
+  audio-seconds/s, error rate, and the server-reported RTF, coalescing and
+  overload rungs (and greedy deadline fallbacks with --deadline-ms). --output gets the full JSON report (with --label), so runs
+  can be compared across builds.
+"""
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+import urllib.error
+import urllib.request
+import concurrent.futures
+
+import numpy as np
+import soundfile as sf
+
+AUDIO_EXTS = {'.wav', '.mp3', '.flac', '.ogg', '.m4a', '.webm', '.opus'}
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))], 4)
+
+
+def load_samples(samples_dir):
+    samples = []
+    for name in sorted(os.listdir(samples_dir)):
+        path = os.path.join(samples_dir, name)
+        if os.path.isfile(path) and os.path.splitext(name)[1].lower() in AUDIO_EXTS:
+            with open(path, 'rb') as fh:
+                samples.append({'name': name, 'data': fh.read()})
+    return samples
+
+
+def synthetic_sample(seconds, sr=16000):
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sr))
+    audio = 0.3 * np.sin(2 * np.pi * 220 * t / sr) + 0.05 * rng.standard_normal(len(t))
+    buf = io.BytesIO()
+    sf.write(buf, audio.astype(np.float32), sr, format='WAV', subtype='PCM_16')
+    return {'name': f'synthetic_{int(seconds)}s.wav', 'data': buf.getvalue()}
+
+
+def make_unique(data):
+    """Flip the last PCM sample of a WAV so every request has distinct content"""
+    if len(data) < 48 or data[:4] != b'RIFF':
+        return data
+    out = bytearray(data)
+    out[-2:] = random.getrandbits(16).to_bytes(2, 'little')
+    return bytes(out)
+
+
+def build_request(url, sample, args):
+    data = make_unique(sample['data']) if args.unique else sample['data']
+    headers = {'X-Request-ID': uuid.uuid4().hex[:16]}
+    if args.priority:
+        headers['X-Priority'] = args.priority
+    if args.api_key:
+        headers['X-API-Key'] = args.api_key
+    if args.deadline_ms:
+        headers['X-Deadline-Ms'] = str(args.deadline_ms)
+    if args.timestamps:
+        url += ('&' if '?' in url else '?') + 'timestamps=word'
+    if args.raw:
+        headers['Content-Type'] = 'audio/wav'
+        return urllib.request.Request(url, data=data, headers=headers, method='POST')
+    boundary = uuid.uuid4().hex
+    body = b''.join([
+        f'--{boundary}\r\n'.encode(),
+        f'Content-Disposition: form-data; name="file"; filename="{sample["name"]}"\r\n'.encode(),
+        b'Content-Type: application/octet-stream\r\n\r\n',
+        data,
+        f'\r\n--{boundary}--\r\n'.encode()
+    ])
+    headers['Content-Type'] = f'multipart/form-data; boundary={boundary}'
+    return urllib.request.Request(url, data=body, headers=headers, method='POST')
+
+
+def send(url, sample, args, scheduled_at=None):
+    """One request; latency counts from scheduled_at when given (open loop)"""
+    start = scheduled_at if scheduled_at is not None else time.perf_counter()
+    record = {'sample': sample['name']}
+    try:
+        with urllib.request.urlopen(build_request(url, sample, args), timeout=args.timeout) as resp:
+            payload = json.loads(resp.read().decode('utf-8') or '{}')
+            record['status'] = resp.status
+    except urllib.error.HTTPError as e:
+        record['status'] = e.code
+        try:
+            payload = json.loads(e.read().decode('utf-8') or '{}')
+        except Exception:
+            payload = {}
+    except Exception as e:
+        record['status'] = None
+        record['error'] = type(e).__name__
+        payload = {}
+    record['latency'] = time.perf_counter() - start
+    record['ok'] = record['status'] == 200
+    if record['ok']:
+        record['audio_duration'] = payload.get('audio_duration')
+        record['rtf'] = payload.get('rtf')
+        record['coalesced'] = bool(payload.get('coalesced'))
+        record['decoding'] = (payload.get('overload') or {}).get('decoding')
+        record['fell_back'] = bool((payload.get('deadline') or {}).get('fell_back'))
+    elif 'error' not in record:
+        record['error'] = str(payload.get('error', record['status']))[:200]
+    return record
+
+
+def run_closed(url, samples, args, concurrency):
+    records = []
+    lock = threading.Lock()
+    counter = iter(range(10 ** 9))
+    deadline = time.perf_counter() + args.duration if args.duration else None
+
+    def client():
+        while True:
+            n = next(counter)
+            if (args.requests and n >= args.requests) or (deadline and time.perf_counter() >= deadline):
+                return
+            rec = send(url, samples[n % len(samples)], args)
+            with lock:
+                records.append(rec)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return records, time.perf_counter() - started
+
+
+def run_open(url, samples, args, rate):
+    rng = random.Random(args.seed)
+    futures = []
+    started = time.perf_counter()
+    total = args.requests or int(args.duration * rate)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.max_inflight) as pool:
+        at = started
+        for n in range(total):
+            at += rng.expovariate(rate)
+            delay = at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(send, url, samples[n % len(samples)], args, at))
+        records = [f.result() for f in futures]
+    return records, time.perf_counter() - started
+
+
+def summarize(records, elapsed, **step):
+    ok = [r for r in records if r['ok']]
+    latencies = [r['latency'] for r in ok]
+    rtfs = [r['rtf'] for r in ok if r.get('rtf') is not None]
+    audio = sum(r.get('audio_duration') or 0.0 for r in ok)
+    errors = {}
+    for r in records:
+        if not r['ok']:
+            key = str(r.get('status') or r.get('error'))
+            errors[key] = errors.get(key, 0) + 1
+    rungs = {}
+    for r in ok:
+        if r.get('decoding'):
+            rungs[r['decoding']] = rungs.get(r['decoding'], 0) + 1
+    step.update({
+        'requests': len(records),
+        'ok': len(ok),
+        'error_rate': round(1 - len(ok) / len(records), 4) if records else None,
+        'errors': errors,
+        'elapsed': round(elapsed, 3),
+        'throughput_rps': round(len(ok) / elapsed, 3) if elapsed else None,
+        'audio_s_per_s': round(audio / elapsed, 3) if elapsed else None,
+        'latency_mean': round(sum(latencies) / len(latencies), 4) if latencies else None,
+        'latency_p50': percentile(latencies, 50),
+        'latency_p95': percentile(latencies, 95),
+        'latency_p99': percentile(latencies, 99),
+        'server_rtf_mean': round(sum(rtfs) / len(rtfs), 4) if rtfs else None,
+        'server_rtf_p95': percentile(rtfs, 95),
+        'coalesced': sum(1 for r in ok if r.get('coalesced')),
+        'deadline_fallbacks': sum(1 for r in ok if r.get('fell_back')),
+        'decoding_rungs': rungs
+    })
+    return step
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', type=str, default='http://localhost:5000/api/transcribe')
+    parser.add_argument('--samples-dir', type=str, default=os.path.join('test-data', 'audio'))
+    parser.add_argument('--synthetic-seconds', type=float, default=None)
+    parser.add_argument('--mode', type=str, default='closed', choices=['closed', 'open'])
+    parser.add_argument('--concurrency', type=str, default='1,2,4,8', help='Closed loop: comma-separated clients')
+    parser.add_argument('--rate', type=str, default='0.5,1,2', help='Open loop: comma-separated requests/s')
+    parser.add_argument('--duration', type=float, default=60.0, help='Seconds per step')
+    parser.add_argument('--requests', type=int, default=0, help='Requests per step (overrides --duration)')
+    parser.add_argument('--max-inflight', type=int, default=256, help='Open loop client connection limit')
+    parser.add_argument('--timeout', type=float, default=600.0)
+    parser.add_argument('--raw', action='store_true')
+    parser.add_argument('--unique', action='store_true')
+    parser.add_argument('--timestamps', action='store_true')
+    parser.add_argument('--priority', type=str, default=None)
+    parser.add_argument('--api-key', type=str, default=None)
+    parser.add_argument('--deadline-ms', type=int, default=0, help='Send X-Deadline-Ms with every request')
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--label', type=str, default=None, help='Build/run label stored in the report')
+    parser.add_argument('--output', type=str, default='loadtest_results.json')
+    args = parser.parse_args()
+
+    if args.synthetic_seconds:
+        samples = [synthetic_sample(args.synthetic_seconds)]
+    else:
+        samples = load_samples(args.samples_dir)
+    if not samples:
+        print(f"No audio files in {args.samples_dir}", file=sys.stderr)
+        sys.exit(1)
+    if args.raw and any(not s['name'].lower().endswith('.wav') for s in samples):
+        print("--raw sends audio/wav bodies; only WAV samples are supported", file=sys.stderr)
+        sys.exit(1)
+
+    for i in range(args.warmup):
+        send(args.url, samples[i % len(samples)], args)
+
+    steps = []
+    levels = args.concurrency if args.mode == 'closed' else args.rate
+    for level in [x.strip() for x in levels.split(',') if x.strip()]:
+        if args.mode == 'closed':
+            records, elapsed = run_closed(args.url, samples, args, int(level))
+            step = summarize(records, elapsed, mode='closed', concurrency=int(level))
+        else:
+            records, elapsed = run_open(args.url, samples, args, float(level))
+            step = summarize(records, elapsed, mode='open', rate=float(level))
+        steps.append(step)
+        print(json.dumps({k: v for k, v in step.items() if k not in ('errors', 'decoding_rungs')}))
+
+    report = {
+        'label': args.label,
+        'url': args.url,
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'samples': [s['name'] for s in samples],
+        'options': {k: v for k, v in vars(args).items() if k not in ('api_key',)},
+        'steps': steps
+    }
+    with open(args.output, 'w', encoding='utf-8') as fh:
+        json.dump(report, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The server and scripts import asr_engine from the ASR directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,60 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from asr_engine.block_reader import iter_chunks
+
+HOURS = 2
+
+
+def write_long_wav(path, seconds, sr):
+    """A synthetic recording written block by block, so the test itself stays small"""
+    rng = np.random.default_rng(0)
+    block = sr * 60
+    with sf.SoundFile(path, mode='w', samplerate=sr, channels=1, subtype='PCM_16') as out:
+        for start in range(0, int(seconds * sr), block):
+            t = np.arange(start, start + block)
+            out.write((0.3 * np.sin(2 * np.pi * 220 * t / sr) + 0.01 * rng.standard_normal(block)).astype(np.float32))
+
+
+def chunk_peak(path, chunk_seconds=30, overlap_seconds=2):
+    """(chunks, samples covered, tracemalloc peak) for streaming the whole file through iter_chunks"""
+    chunks, end = 0, 0
+    tracemalloc.start()
+    try:
+        for start, window in iter_chunks(str(path), chunk_seconds, overlap_seconds):
+            chunks += 1
+            end = start + len(window)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return chunks, end, peak
+
+
+@pytest.mark.parametrize('source_sr', [16000, 8000])
+def test_multi_hour_file_streams_in_bounded_memory(tmp_path, source_sr):
+    if source_sr != 16000:
+        pytest.importorskip('soxr')
+    seconds = HOURS * 3600
+    path = tmp_path / 'long.wav'
+    write_long_wav(path, seconds, source_sr)
+    chunks, end, peak = chunk_peak(path)
+    assert abs(end - seconds * 16000) <= 16000
+    assert chunks == pytest.approx(seconds / 28, abs=2)
+    # The decoded signal alone would be HOURS * 3600 * 16000 * 4 bytes (460 MB for two hours)
+    assert peak < 16 * 1024 * 1024
+
+
+def test_chunks_match_slicing_the_loaded_signal(tmp_path):
+    sr = 16000
+    path = tmp_path / 'short.wav'
+    audio = np.random.default_rng(1).uniform(-0.5, 0.5, sr * 95).astype(np.float32)
+    sf.write(str(path), audio, sr, subtype='FLOAT')
+    chunks = list(iter_chunks(str(path), 30, 2, block_seconds=7))
+    starts = [s for s, _ in chunks]
+    assert starts == list(range(0, len(audio), 28 * sr))[:len(starts)]
+    for start, window in chunks:
+        np.testing.assert_array_equal(window, audio[start:start + 30 * sr])
+    assert chunks[-1][0] + len(chunks[-1][1]) == len(audio)
@@ -0,0 +1,59 @@
+import time
+import socket
+
+import pytest
+
+from asr_engine.cancellation import CancelToken, DisconnectWatcher, RequestCancelled
+
+
+def wait_cancelled(token, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not token.cancelled and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return token.cancelled
+
+
+@pytest.fixture
+def pair():
+    server, client = socket.socketpair()
+    yield server, client
+    server.close()
+    client.close()
+
+
+def test_clean_close_cancels_the_token(pair):
+    server, client = pair
+    watcher = DisconnectWatcher(interval=0.05)
+    token = CancelToken()
+    with watcher.watch({'werkzeug.socket': server}, token):
+        client.close()
+        assert wait_cancelled(token)
+    assert token.reason == 'client disconnected'
+    assert watcher.stats()['disconnects'] == 1
+    with pytest.raises(RequestCancelled):
+        token.check()
+
+
+def test_open_connection_is_not_cancelled(pair):
+    server, client = pair
+    watcher = DisconnectWatcher(interval=0.05)
+    token = CancelToken()
+    with watcher.watch({'werkzeug.socket': server}, token):
+        client.sendall(b'pipelined')
+        assert not wait_cancelled(token, timeout=0.3)
+
+
+def test_half_close_is_ignored_when_eof_is_off(pair):
+    server, client = pair
+    watcher = DisconnectWatcher(interval=0.05, eof=False)
+    token = CancelToken()
+    with watcher.watch({'werkzeug.socket': server}, token):
+        client.shutdown(socket.SHUT_WR)
+        assert not wait_cancelled(token, timeout=0.3)
+
+
+def test_requests_without_a_socket_are_not_watched():
+    watcher = DisconnectWatcher()
+    token = CancelToken()
+    with watcher.watch({}, token):
+        assert watcher.stats()['watching'] == 0
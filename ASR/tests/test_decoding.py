@@ -0,0 +1,17 @@
+from asr_engine.decoding import decoding_cfg, uses_beta
+
+
+def test_resident_lm_beam_ignores_beta():
+    cfg, lm_path = decoding_cfg('beam', 8, 'lm.bin', alpha=0.7, beta=3.0)
+    assert lm_path == 'lm.bin'
+    assert cfg['beam']['search_type'] == 'maes'
+    assert cfg['beam']['ngram_lm_alpha'] == 0.7
+    assert 3.0 not in cfg['beam'].values()
+    assert not uses_beta('beam')
+
+
+def test_lm_search_strategies_apply_beta():
+    cfg, lm_path = decoding_cfg('knelm_beam', 8, 'lm.bin', alpha=0.7, beta=3.0)
+    assert lm_path is None
+    assert cfg['beam']['lm_beta'] == 3.0
+    assert uses_beta('knelm_beam') and uses_beta('flashlight_beam')
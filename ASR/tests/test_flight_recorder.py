@@ -0,0 +1,67 @@
+import os
+
+from asr_engine.flight_recorder import FlightRecorder
+
+
+def recorder(tmp_path, **kwargs):
+    return FlightRecorder(threshold=1.0, neighbours=2, output_dir=str(tmp_path), **kwargs)
+
+
+def finish(rec, trace_id, latency):
+    rec.begin(trace_id)
+    return rec.end(trace_id, latency=latency)
+
+
+def read_only_dump(rec):
+    dumps = rec.list_dumps()
+    assert len(dumps) == 1
+    return rec.read_dump(dumps[0]['name'])
+
+
+def test_slow_request_is_dumped_with_its_neighbours(tmp_path):
+    rec = recorder(tmp_path)
+    for i in range(3):
+        finish(rec, f'fast{i}', 0.1)
+    finish(rec, 'slow', 5.0)
+    finish(rec, 'after0', 0.1)
+    assert rec.list_dumps() == []  # still waiting for the second neighbour
+    finish(rec, 'after1', 0.1)
+    dump = read_only_dump(rec)
+    assert dump['trace_id'] == 'slow'
+    assert [r['trace_id'] for r in dump['before']] == ['fast1', 'fast2']
+    assert [r['trace_id'] for r in dump['after']] == ['after0', 'after1']
+    assert rec.stats()['pending_dumps'] == 0
+
+
+def test_first_request_has_no_before_neighbours(tmp_path):
+    rec = recorder(tmp_path)
+    finish(rec, 'slow', 2.0)
+    rec.flush(force=True)
+    dump = read_only_dump(rec)
+    assert dump['before'] == []
+    assert dump['after'] == []
+
+
+def test_overlapping_requests_are_recorded(tmp_path):
+    rec = recorder(tmp_path)
+    rec.begin('a')
+    rec.begin('b')
+    rec.begin('c')
+    b = rec.end('b', latency=0.1)
+    a = rec.end('a', latency=0.1)
+    c = rec.end('c', latency=0.1)
+    assert a['overlapped'] == ['b', 'c']
+    assert b['overlapped'] == ['a', 'c']
+    assert c['overlapped'] == ['a', 'b']
+
+
+def test_old_dumps_are_pruned(tmp_path):
+    rec = recorder(tmp_path, max_dumps=2)
+    for i in range(4):
+        # Dumps are ordered by mtime; age the earlier ones so the order is unambiguous
+        for entry in rec.list_dumps():
+            path = os.path.join(str(tmp_path), entry['name'])
+            os.utime(path, (entry['created_at'] - 10, entry['created_at'] - 10))
+        finish(rec, f'slow{i}', 3.0)
+        rec.flush(force=True)
+    assert [rec.read_dump(e['name'])['trace_id'] for e in rec.list_dumps()] == ['slow3', 'slow2']
@@ -0,0 +1,70 @@
+from asr_engine.overload import LADDER, OverloadController
+
+
+def controller(**kwargs):
+    kwargs.setdefault('degrade_hold', 0.0)
+    kwargs.setdefault('recover_hold', 0.0)
+    return OverloadController(queue_high=8, queue_low=2, rtf_high=0.5, rtf_low=0.25, **kwargs)
+
+
+def test_degrades_one_rung_per_update_and_recovers():
+    oc = controller()
+    assert oc.update(8)['direction'] == 'degrade'
+    assert oc.update(9)['to'] == 2
+    assert oc.update(1)['direction'] == 'recover'
+    assert oc.level == 1
+    assert oc.transitions == {'degrade': 2, 'recover': 1}
+
+
+def test_no_change_between_the_thresholds():
+    oc = controller()
+    oc.update(10)
+    for depth in (3, 5, 7):
+        assert oc.update(depth) is None
+    assert oc.level == 1
+
+
+def test_rtf_keeps_it_degraded_until_both_are_low():
+    oc = controller()
+    oc.record_rtf(6.0, 10.0)  # rtf 0.6
+    assert oc.update(0)['direction'] == 'degrade'
+    assert oc.update(0)['direction'] == 'degrade'  # queue is empty, rtf still high
+    oc.rtf = 0.3  # below high, above low
+    assert oc.update(0) is None
+    oc.rtf = 0.2
+    assert oc.update(0)['direction'] == 'recover'
+
+
+def test_hold_times_prevent_flapping():
+    oc = controller(degrade_hold=60.0, recover_hold=60.0)
+    oc._changed_at -= 61
+    assert oc.update(10)['direction'] == 'degrade'
+    assert oc.update(10) is None
+    assert oc.update(0) is None
+    oc._changed_at -= 61
+    assert oc.update(0)['direction'] == 'recover'
+
+
+def test_level_stops_at_the_last_rung():
+    oc = controller()
+    for _ in range(10):
+        oc.update(100)
+    assert oc.level == len(LADDER) - 1
+    assert oc.decoding_for('beam', 4, '/lm.bin') == ('greedy', {'strategy': 'greedy', 'beam_size': 0, 'lm': False})
+
+
+def test_level_is_bounded_by_the_configured_decoding():
+    oc = controller()
+    for _ in range(3):
+        oc.update(100)
+    oc.set_decoding('beam', 4, None)  # plain beam: only small_beam and greedy below it
+    assert oc.max_level == 2
+    assert oc.level == 2
+    assert oc.update(100) is None
+    assert oc.decoding_for('beam', 4, None)[0] == 'greedy'
+
+
+def test_disabled_never_moves():
+    oc = controller(enabled=False)
+    assert oc.update(100) is None
+    assert oc.decoding_for('beam', 4, None) == ('beam', None)
@@ -0,0 +1,31 @@
+import os
+import signal
+import time
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from asr_engine.pipeline import PreprocessPool, _noop
+
+
+@pytest.fixture
+def pool():
+    pool = PreprocessPool(workers=1).start()
+    yield pool
+    pool.shutdown()
+
+
+def test_broken_pool_runs_inline_and_recreates_from_forkserver(pool, tmp_path):
+    src = str(tmp_path / 'in.wav')
+    sf.write(src, np.zeros(16000, dtype='float32'), 16000)
+    assert pool._mp_context.get_start_method() == 'fork'
+
+    os.kill(pool._get_executor().submit(_noop).result(), signal.SIGKILL)
+    time.sleep(0.2)
+    assert pool.prepare(src, str(tmp_path / 'a.wav')) == pytest.approx(1.0)
+    assert pool._mp_context.get_start_method() == 'forkserver'
+
+    assert pool.prepare(src, str(tmp_path / 'b.wav')) == pytest.approx(1.0)
+    assert pool._get_executor().submit(_noop).result() != os.getpid()
+    assert pool.stats()['failures'] == 0
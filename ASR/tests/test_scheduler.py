@@ -0,0 +1,91 @@
+import time
+
+from asr_engine.scheduler import InferenceScheduler, Job
+
+
+def make_scheduler(**kwargs):
+    classes = {'interactive': {'rank': 0, 'max_wait': 10.0}, 'batch': {'rank': 1, 'max_wait': 120.0}}
+    return InferenceScheduler(classes=classes, **kwargs)
+
+
+def queue(scheduler, name, priority='batch', duration=None, waited=0.0, group=None):
+    """Put a job on the pending list directly (no workers), as if it had waited `waited` seconds"""
+    job = Job(name, priority, duration, group=group)
+    job.enqueued_at = time.monotonic() - waited
+    job.seq = next(scheduler._seq)
+    scheduler._pending.append(job)
+    return job
+
+
+def drain(scheduler):
+    order = []
+    while scheduler._pending:
+        order.append(scheduler._select().fn)
+    return order
+
+
+def test_shortest_expected_duration_runs_first():
+    s = make_scheduler(aging_rate=0.0)
+    queue(s, 'long', duration=300)
+    queue(s, 'short', duration=5)
+    queue(s, 'medium', duration=60)
+    assert drain(s) == ['short', 'medium', 'long']
+
+
+def test_ties_keep_arrival_order():
+    s = make_scheduler(aging_rate=0.0)
+    queue(s, 'first', duration=10)
+    queue(s, 'second', duration=10)
+    assert drain(s) == ['first', 'second']
+
+
+def test_unknown_duration_costs_the_default():
+    s = make_scheduler(aging_rate=0.0)
+    queue(s, 'unknown', duration=None)
+    queue(s, 'known', duration=30)
+    queue(s, 'longer', duration=90)
+    assert drain(s) == ['known', 'unknown', 'longer']
+
+
+def test_class_rank_beats_duration():
+    s = make_scheduler(aging_rate=0.0)
+    queue(s, 'batch-short', priority='batch', duration=1)
+    queue(s, 'interactive-long', priority='interactive', duration=500)
+    assert drain(s) == ['interactive-long', 'batch-short']
+
+
+def test_aging_lets_a_long_job_overtake():
+    s = make_scheduler(aging_rate=0.5)
+    queue(s, 'long-waiting', duration=100, waited=100)  # cost 100 - 50 = 50
+    queue(s, 'new-medium', duration=60)
+    assert drain(s) == ['long-waiting', 'new-medium']
+
+
+def test_starved_job_is_promoted_across_classes():
+    s = make_scheduler(aging_rate=0.0)
+    queue(s, 'interactive', priority='interactive', duration=1)
+    queue(s, 'starved-batch', priority='batch', duration=1000, waited=121)
+    assert drain(s) == ['starved-batch', 'interactive']
+    assert s._promoted['batch'] == 1
+
+
+def test_oldest_starved_job_goes_first():
+    s = make_scheduler(aging_rate=0.0)
+    queue(s, 'starved-newer', priority='interactive', duration=1, waited=11)
+    queue(s, 'starved-older', priority='interactive', duration=50, waited=30)
+    assert drain(s) == ['starved-older', 'starved-newer']
+
+
+def test_fifo_fairness_ages_chunks_from_their_job_start():
+    s = make_scheduler(aging_rate=0.5, fairness='fifo')
+    old_group, new_group = s.new_group(), s.new_group()
+    old_group.started -= 100
+    queue(s, 'new-job-chunk', duration=30, group=new_group)
+    queue(s, 'old-job-chunk', duration=30, group=old_group)
+    assert drain(s) == ['old-job-chunk', 'new-job-chunk']
+
+
+def test_submit_runs_jobs_and_counts_them():
+    s = make_scheduler()
+    assert s.run(lambda: 42, priority='interactive') == 42
+    assert s.stats()['classes']['interactive']['completed'] == 1
@@ -0,0 +1,97 @@
+import time
+import threading
+
+import pytest
+
+from asr_engine.cancellation import RequestCancelled
+from asr_engine.singleflight import SingleFlight
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+def follow(sf, key, fn):
+    """Run sf.do(key, fn) on a thread; returns (thread, outcome dict)"""
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = sf.do(key, fn)
+        except BaseException as e:
+            outcome['error'] = e
+    t = threading.Thread(target=run)
+    t.start()
+    return t, outcome
+
+
+def test_followers_share_the_leader_result():
+    sf = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def leader_fn():
+        calls.append('leader')
+        release.wait(5)
+        return {'text': 'hello'}
+    t, leader = follow(sf, 'k', leader_fn)
+    wait_for(lambda: sf.stats()['in_flight'] == 1)
+    f, follower = follow(sf, 'k', lambda: calls.append('follower'))
+    wait_for(lambda: sf.coalesced == 1)
+    release.set()
+    t.join(5)
+    f.join(5)
+    assert leader['result'] == ({'text': 'hello'}, False)
+    assert follower['result'] == ({'text': 'hello'}, True)
+    assert follower['result'][0] is not leader['result'][0]
+    assert calls == ['leader']
+    assert sf.stats()['in_flight'] == 0
+
+
+def test_followers_inherit_other_failures():
+    sf = SingleFlight(retry_on=(RequestCancelled,))
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise ValueError('bad audio')
+    t, leader = follow(sf, 'k', failing)
+    wait_for(lambda: sf.stats()['in_flight'] == 1)
+    f, follower = follow(sf, 'k', lambda: 'unused')
+    wait_for(lambda: sf.coalesced == 1)
+    release.set()
+    t.join(5)
+    f.join(5)
+    assert isinstance(leader['error'], ValueError)
+    assert isinstance(follower['error'], ValueError)
+
+
+def test_follower_retries_when_the_leader_is_cancelled():
+    sf = SingleFlight(retry_on=(RequestCancelled,))
+    release = threading.Event()
+
+    def cancelled():
+        release.wait(5)
+        raise RequestCancelled('client disconnected')
+    t, leader = follow(sf, 'k', cancelled)
+    wait_for(lambda: sf.stats()['in_flight'] == 1)
+    f, follower = follow(sf, 'k', lambda: 'transcript')
+    wait_for(lambda: sf.coalesced == 1)
+    release.set()
+    t.join(5)
+    f.join(5)
+    assert isinstance(leader['error'], RequestCancelled)
+    # The follower became the new leader and ran its own fn
+    assert follower['result'] == ('transcript', False)
+    assert sf.leaders == 2
+    assert sf.stats()['in_flight'] == 0
+
+
+def test_disabled_always_runs():
+    sf = SingleFlight(enabled=False)
+    assert sf.do('k', lambda: 1) == (1, False)
+    with pytest.raises(KeyError):
+        sf.do('k', lambda: {}['missing'])
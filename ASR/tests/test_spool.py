@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from asr_engine.spool import SpoolManager, SpoolQuotaError
+
+
+def write(path, size):
+    with open(path, 'wb') as fh:
+        fh.write(b'\0' * size)
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return SpoolManager(str(tmp_path / 'spool'), quota_bytes=1000, sweep_interval=0)
+
+
+def test_file_is_deleted_after_the_last_release(spool):
+    path = spool.new_file('a.wav', 100)
+    write(path, 100)
+    spool.acquire(path)
+    spool.release(path)
+    assert os.path.exists(path)
+    assert spool.stats()['live_files'] == 1
+    spool.release(path)
+    assert not os.path.exists(path)
+    assert spool.stats()['live_files'] == 0
+    assert spool.stats()['used_bytes'] == 0
+
+
+def test_acquire_of_a_released_file_fails(spool):
+    path = spool.new_file('a.wav')
+    spool.release(path)
+    with pytest.raises(KeyError):
+        spool.acquire(path)
+    spool.release(path)  # releasing twice is harmless
+
+
+def test_reservations_count_against_the_quota(spool):
+    first = spool.new_file('a.wav', 600)
+    with pytest.raises(SpoolQuotaError):
+        spool.new_file('b.wav', 500)
+    assert spool.stats()['quota_rejections'] == 1
+    spool.release(first)
+    spool.new_file('b.wav', 500)
+    assert spool.stats()['used_bytes'] == 500
+
+
+def test_commit_accounts_the_real_size(spool):
+    path = spool.new_file('a.wav', 10)
+    write(path, 400)
+    assert spool.commit(path) == 400
+    assert spool.stats()['used_bytes'] == 400
+    assert spool.stats()['peak_bytes'] == 400
+
+
+def test_commit_over_quota_is_rejected(spool):
+    path = spool.new_file('a.wav', 10)
+    write(path, 1500)
+    with pytest.raises(SpoolQuotaError):
+        spool.commit(path)
+    spool.release(path)
+    assert spool.stats()['used_bytes'] == 0
+
+
+def test_session_releases_its_files_on_error(spool):
+    with pytest.raises(RuntimeError):
+        with spool.session() as files:
+            path = files.new_file('a.wav', 100)
+            write(path, 100)
+            raise RuntimeError('request failed')
+    assert not os.path.exists(path)
+    assert spool.stats()['live_files'] == 0
+
+
+def test_startup_sweep_removes_own_untracked_files(spool):
+    leftover = os.path.join(spool.root, f"{os.getpid()}_999_old.wav")
+    write(leftover, 10)
+    live = spool.new_file('live.wav')
+    write(live, 10)
+    assert spool.sweep(startup=True) == 1
+    assert not os.path.exists(leftover)
+    assert os.path.exists(live)
@@ -0,0 +1,46 @@
+from asr_engine.text_normalizer import normalize_text
+from asr_engine.word_timestamps import extract_words, merge_chunk_words
+
+
+def word(text, start, end):
+    return {'word': text, 'start': start, 'end': end}
+
+
+def test_words_inside_the_overlap_are_dropped():
+    merged = [word('the', 0.0, 0.3), word('quick', 0.4, 0.8), word('brown', 9.6, 9.9)]
+    nxt = [word('brown', 9.6, 9.9), word('fox', 10.1, 10.4)]
+    merge_chunk_words(merged, nxt)
+    assert [w['word'] for w in merged] == ['the', 'quick', 'brown', 'fox']
+
+
+def test_word_starting_at_the_last_end_is_kept():
+    merged = [word('a', 0.0, 1.0)]
+    merge_chunk_words(merged, [word('b', 1.0, 1.5)])
+    assert [w['word'] for w in merged] == ['a', 'b']
+
+
+def test_first_chunk_is_taken_whole():
+    words = [word('a', 0.0, 0.5), word('b', 0.2, 0.7)]
+    assert merge_chunk_words([], words) == words
+
+
+def test_empty_chunk_changes_nothing():
+    merged = [word('a', 0.0, 0.5)]
+    assert merge_chunk_words(merged, []) == [word('a', 0.0, 0.5)]
+
+
+class Hypothesis:
+    def __init__(self, words, confidence=None):
+        self.timestamp = {'word': words}
+        self.word_confidence = confidence
+
+
+def test_extracted_words_are_normalized_like_the_text():
+    words = [{'word': w, 'start_offset': i * 2, 'end_offset': i * 2 + 1}
+             for i, w in enumerate(['Mikael', 'haer', 'oeron', '⁇', 'anaeroba', 'AWR'])]
+    out = extract_words(Hypothesis(words, confidence=[0.9] * 6), seconds_per_frame=0.08, offset=10.0)
+    assert [w['word'] for w in out] == ['Mikael', 'här', 'öron', 'anaeroba', 'ÅR']
+    assert ' '.join(w['word'] for w in out) == normalize_text('Mikael haer oeron ⁇ anaeroba AWR').replace('  ', ' ')
+    assert out[2] == {'word': 'öron', 'start': 10.32, 'end': 10.4, 'confidence': 0.9}
+    # The dropped '⁇' keeps its neighbours' confidence aligned
+    assert out[3]['start'] == 10.64
@@ -3,16 +3,15 @@
 # Notes:
 #   - Defaults to the first .nemo model you provided (hard-coded).
 #   - Writes transcripts to ./test-data/gt and CSV to ./single_model_results.csv.
-#   - Decoding strategy mirrors app.py.
+#   - Runs on asr_engine.model.NeMoASRModel, the servers' engine; files are transcribed in
+#     batches of --batch-size (shortest first).
 import os
 import argparse
 import csv
-import tempfile
-import torch
-import librosa
-import soundfile as sf
-import nemo.collections.asr as nemo_asr
-from omegaconf import DictConfig
+
+from asr_engine.model import NeMoASRModel
+from asr_engine.audio import convert_to_temp_wav
+from asr_engine.decoding import SUPPORTED_STRATEGIES
 
 DEFAULT_FIRST_MODEL_PATH = \
     "/home/harinder.bedi/BENCHMARK/MODELS_COPIED/Speech_To_Text_Finetuning.nemo"
@@ -38,35 +37,6 @@ def find_gt_in_dir(gt_dir, stem):
             return ''
     return ''
 
-def convert_to_wav(input_path):
-    audio, sr = librosa.load(input_path, sr=16000, mono=True)
-    f = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
-    f.close()
-    sf.write(f.name, audio, sr)
-    return f.name
-
-def extract_text(transcription):
-    try:
-        if isinstance(transcription, list):
-            if len(transcription) > 0:
-                result = transcription[0]
-                if hasattr(result, 'item'):
-                    return str(result.item())
-                elif hasattr(result, 'text'):
-                    return str(result.text)
-                else:
-                    return str(result)
-            else:
-                return ''
-        elif isinstance(transcription, torch.Tensor):
-            return str(transcription.item()) if transcription.numel() == 1 else str(transcription.tolist())
-        elif hasattr(transcription, 'text'):
-            return str(transcription.text)
-        else:
-            return str(transcription)
-    except Exception:
-        return str(transcription)
-
 def pick_first_model(model_dir):
     candidates = []
     def collect(d):
@@ -88,127 +58,35 @@ def pick_first_model(model_dir):
         raise FileNotFoundError('No model found')
     return candidates[0]
 
-def set_decoding_strategy(model, strategy='greedy', beam_size=4, lm_path=None, alpha=0.5, beta=1.0):
-    if strategy == 'greedy':
-        cfg = DictConfig({
-            'strategy': 'greedy',
-            'greedy': {
-                'max_symbols_per_step': 10,
-                'preserve_alignments': False,
-                'preserve_frame_confidence': False,
-                'loop_labels': True,
-                'use_cuda_graph_decoder': True
-            },
-            'compute_hypothesis_token_set': False,
-            'preserve_alignments': False
-        })
-    elif strategy == 'beam':
-        cfg = DictConfig({
-            'strategy': 'beam',
-            'beam': {
-                'beam_size': beam_size,
-                'search_type': 'default',
-                'score_norm': True,
-                'return_best_hypothesis': True,
-                'softmax_temperature': 1.0,
-                'preserve_alignments': False
-            },
-            'compute_hypothesis_token_set': False,
-            'preserve_alignments': False
-        })
-    elif strategy == 'knelm_beam':
-        cfg = DictConfig({
-            'strategy': 'beam',
-            'beam': {
-                'beam_size': beam_size,
-                'search_type': 'kenlm',
-                'score_norm': True,
-                'return_best_hypothesis': True,
-                'softmax_temperature': 1.0,
-                'preserve_alignments': False,
-                'lm_path': lm_path,
-                'lm_alpha': alpha,
-                'lm_beta': beta,
-                'use_knelm': True,
-                'knelm_k': 10,
-                'knelm_lambda': 0.1
-            },
-            'compute_hypothesis_token_set': False,
-            'preserve_alignments': False
-        })
-    elif strategy == 'flashlight_beam':
-        cfg = DictConfig({
-            'strategy': 'beam',
-            'beam': {
-                'beam_size': beam_size,
-                'search_type': 'flashlight',
-                'flashlight_cfg': {
-                    'lexicon_path': None,
-                    'lm_path': lm_path,
-                    'lm_weight': alpha,
-                    'word_score': beta,
-                    'unk_score': -float('inf'),
-                    'sil_score': 0.0,
-                    'log_add': False,
-                    'criterion_type': 'ctc'
-                },
-                'return_best_hypothesis': True,
-                'preserve_alignments': False
-            },
-            'compute_hypothesis_token_set': False,
-            'preserve_alignments': False
-        })
-    elif strategy == 'maes':
-        cfg = DictConfig({
-            'strategy': 'maes',
-            'maes': {
-                'return_best_hypothesis': True
-            },
-            'compute_hypothesis_token_set': False,
-            'preserve_alignments': False
-        })
-    else:
-        cfg = DictConfig({
-            'strategy': 'greedy',
-            'greedy': {
-                'max_symbols_per_step': 10,
-                'preserve_alignments': False,
-                'preserve_frame_confidence': False,
-                'loop_labels': True,
-                'use_cuda_graph_decoder': True
-            },
-            'compute_hypothesis_token_set': False,
-            'preserve_alignments': False
-        })
-    model.change_decoding_strategy(cfg)
-
-def run(samples_dir, model_dir, output_csv, gt_dir=None, strategy='greedy', beam_size=4, lm_path=None, alpha=0.5, beta=1.0, model_path=None):
+def run(samples_dir, model_dir, output_csv, gt_dir=None, strategy='greedy', beam_size=4, lm_path=None, alpha=0.5, beta=1.0, model_path=None, precision=None, batch_size=8):
     if not model_path:
         if os.path.isfile(DEFAULT_FIRST_MODEL_PATH):
             model_path = DEFAULT_FIRST_MODEL_PATH
         else:
             model_path = pick_first_model(model_dir)
-    if model_path.endswith('.ckpt'):
-        model = nemo_asr.models.ASRModel.load_from_checkpoint(model_path)
-    else:
-        model = nemo_asr.models.ASRModel.restore_from(model_path)
-    model = model.half()
-    set_decoding_strategy(model, strategy=strategy, beam_size=beam_size, lm_path=lm_path, alpha=alpha, beta=beta)
+    model = NeMoASRModel(model_path, decoding_strategy='greedy', lm_path=lm_path, precision=precision, verbose=False)
+    if strategy != 'greedy':
+        model.set_decoding_strategy(strategy, beam_size=beam_size, lm_path=lm_path, alpha=alpha, beta=beta)
     audio_files = list_audio_files(samples_dir)
     headers = ['slno', 'sample', 'gt', 'transcript']
     rows = []
-    slno = 1
     if gt_dir:
         os.makedirs(gt_dir, exist_ok=True)
-    for ap in audio_files:
+    prep_paths = []
+    try:
+        for ap in audio_files:
+            prep_paths.append(ap if ap.lower().endswith('.wav') else convert_to_temp_wav(ap))
+        texts = model.transcribe_batch(prep_paths, batch_size=batch_size)
+    finally:
+        for ap, prep_path in zip(audio_files, prep_paths):
+            try:
+                if prep_path != ap and os.path.exists(prep_path):
+                    os.remove(prep_path)
+            except Exception:
+                pass
+    for slno, (ap, text) in enumerate(zip(audio_files, texts), start=1):
         stem = os.path.splitext(os.path.basename(ap))[0]
         gt = find_gt_in_dir(gt_dir if gt_dir else os.path.dirname(ap), stem)
-        prep_path = ap
-        if not ap.lower().endswith('.wav'):
-            prep_path = convert_to_wav(ap)
-        with torch.no_grad():
-            result = model.transcribe([prep_path], batch_size=1)
-        text = extract_text(result)
         if gt_dir:
             out_txt = os.path.join(gt_dir, f"{stem}.txt")
             try:
@@ -217,12 +95,6 @@ def run(samples_dir, model_dir, output_csv, gt_dir=None, strategy='greedy', beam
             except Exception:
                 pass
         rows.append([slno, stem, gt, text])
-        slno += 1
-        try:
-            if prep_path != ap and os.path.exists(prep_path):
-                os.remove(prep_path)
-        except Exception:
-            pass
     with open(output_csv, 'w', newline='', encoding='utf-8') as fh:
         w = csv.writer(fh)
         w.writerow(headers)
@@ -236,11 +108,13 @@ def main():
     parser.add_argument('--model-path', type=str, default=DEFAULT_FIRST_MODEL_PATH)
     parser.add_argument('--output', type=str, default='single_model_results.csv')
     parser.add_argument('--gt-dir', type=str, default=None)
-    parser.add_argument('--strategy', type=str, default='greedy', choices=['greedy', 'beam', 'knelm_beam', 'flashlight_beam', 'maes'])
+    parser.add_argument('--strategy', type=str, default='greedy', choices=[s for s in SUPPORTED_STRATEGIES if s != 'auto'])
     parser.add_argument('--beam-size', type=int, default=4)
     parser.add_argument('--lm-path', type=str, default=None)
     parser.add_argument('--alpha', type=float, default=0.5)
     parser.add_argument('--beta', type=float, default=1.0)
+    parser.add_argument('--precision', type=str, default='auto', choices=['auto', 'fp32', 'bf16', 'fp16'])
+    parser.add_argument('--batch-size', type=int, default=8)
     args = parser.parse_args()
     samples_dir = args.samples_dir
     if not samples_dir or not os.path.isdir(samples_dir):
@@ -261,7 +135,7 @@ def main():
             os.path.join('parakeet', 'model')
         ]
         model_dir = next((p for p in candidates if os.path.isdir(p)), 'models')
-    run(samples_dir, model_dir, args.output, gt_dir, args.strategy, args.beam_size, args.lm_path, args.alpha, args.beta, args.model_path)
+    run(samples_dir, model_dir, args.output, gt_dir, args.strategy, args.beam_size, args.lm_path, args.alpha, args.beta, args.model_path, args.precision, args.batch_size)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file